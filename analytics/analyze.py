@@ -15,9 +15,11 @@ import csv
 import datetime
 import html
 import math
+import mmap
 import os
 import struct
 import sys
+from array import array
 from collections import Counter, defaultdict
 from statistics import pstdev, mean
 
@@ -26,79 +28,256 @@ from statistics import pstdev, mean
 _SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 BASE = os.environ.get('TOTALIZATOR_DATA') or (sys.argv[1] if len(sys.argv) > 1 else _SCRIPT_DIR)
 
+# Классификация ставок — общая с ботом (scoring_utils.py в корне репозитория, тоже только stdlib).
+# Ищется рядом со скриптом, затем в корне репозитория.
+if _SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, _SCRIPT_DIR)
+sys.path.insert(1, os.path.dirname(_SCRIPT_DIR))
+import scoring_utils  # noqa: E402
+
 
 # ----------------------------------------------------------------------------
-# 1. BSON-парсер на чистом stdlib
+# 1. BSON-парсер: pymongo bson (C), если установлен, иначе свой на чистом stdlib
 # ----------------------------------------------------------------------------
 
-def _rd_cstring(b, i):
-    j = b.index(0, i)
-    return b[i:j].decode('utf-8', 'replace'), j + 1
+# Дамп отдаётся по одному документу: память не растёт с размером дампа.
+# Проекция fields — какие поля декодировать: {ключ: True} — поле целиком, {ключ: {...}} — вложенная
+# проекция для документа (или для каждого документа-элемента массива); None — декодировать всё.
+# Оба декодера отдают одно и то же: dict/list/str/int/float/bool/None, naive UTC datetime, bytes,
+# ObjectId как строка 'OID:<hex>'.
+
+# Поля, которые реально читает load_season: полные массивы ставок со всеми служебными полями
+# в память не попадают.
+EVENT_FIELDS = {'uuid': True, 'team_1': True, 'team_2': True, 'time': True, 'result': True}
+BET_FIELDS = {'event_uuid': True, 'team_1_scores': True, 'team_2_scores': True,
+              'team_1_will_go_through': True, 'created_at': True}
+USER_FIELDS = {'username': True, 'first_name': True, 'last_name': True, 'scores': True, 'bets': BET_FIELDS}
+
+# Декодер: auto — C-расширение bson из pymongo, если оно есть, иначе python.
+BSON_DECODER = os.environ.get('TOTALIZATOR_BSON_DECODER', 'auto')
+
+try:
+    import bson as _bson
+    from bson.codec_options import CodecOptions as _CodecOptions, TypeDecoder as _TypeDecoder, \
+        TypeRegistry as _TypeRegistry
+    _BSON_C = _bson.has_c()
+except ImportError:
+    _bson = None
+    _BSON_C = False
+
+# ---- python: mmap + предкомпилированные Struct + таблица разбора по типу ----
+
+_INT32 = struct.Struct('<i')
+_INT64 = struct.Struct('<q')
+_DOUBLE = struct.Struct('<d')
+_EPOCH = datetime.datetime(1970, 1, 1)
+# Размер значений фиксированной длины — для пропуска без разбора.
+_FIXED_SIZES = {0x01: 8, 0x07: 12, 0x08: 1, 0x09: 8, 0x0A: 0, 0x10: 4, 0x11: 8, 0x12: 8, 0x13: 16}
+
+
+def _rd_double(b, i, fields):
+    return _DOUBLE.unpack_from(b, i)[0], i + 8
+
+
+def _rd_string(b, i, fields):
+    ln = _INT32.unpack_from(b, i)[0]
+    return b[i + 4:i + 3 + ln].decode('utf-8', 'replace'), i + 4 + ln
+
+
+def _rd_binary(b, i, fields):
+    ln = _INT32.unpack_from(b, i)[0]
+    return bytes(b[i + 5:i + 5 + ln]), i + 5 + ln
+
+
+def _rd_object_id(b, i, fields):
+    return 'OID:' + b[i:i + 12].hex(), i + 12
+
+
+def _rd_bool(b, i, fields):
+    return b[i] != 0, i + 1
+
+
+def _rd_datetime(b, i, fields):
+    ms = _INT64.unpack_from(b, i)[0]
+    return _EPOCH + datetime.timedelta(milliseconds=ms), i + 8
+
+
+def _rd_null(b, i, fields):
+    return None, i
 
 
-def _rd_doc(b, i):
-    start = i
-    size = struct.unpack_from('<i', b, i)[0]
+def _rd_int32(b, i, fields):
+    return _INT32.unpack_from(b, i)[0], i + 4
+
+
+def _rd_int64(b, i, fields):
+    return _INT64.unpack_from(b, i)[0], i + 8
+
+
+def _rd_doc(b, i, fields=None):
+    # b — bytes одного документа верхнего уровня (индексация bytes заметно быстрее, чем mmap).
+    # Самые частые в дампах типы (строка, int32, дата) разобраны на месте, без вызова из таблицы.
+    end = i + _INT32.unpack_from(b, i)[0]
     i += 4
     out = {}
+    remaining = None if fields is None else len(fields)
+    readers = _READERS
+    unpack_int32 = _INT32.unpack_from
     while b[i] != 0:
-        t = b[i];
-        i += 1
-        key, i = _rd_cstring(b, i)
-        if t == 0x01:  # double
-            out[key] = struct.unpack_from('<d', b, i)[0];
-            i += 8
-        elif t == 0x02:  # string
-            ln = struct.unpack_from('<i', b, i)[0];
-            i += 4
-            out[key] = b[i:i + ln - 1].decode('utf-8', 'replace');
-            i += ln
-        elif t == 0x03:  # embedded doc
-            out[key], i = _rd_doc(b, i)
-        elif t == 0x04:  # array
-            arr, i = _rd_doc(b, i)
-            out[key] = [arr[k] for k in arr]
-        elif t == 0x05:  # binary
-            ln = struct.unpack_from('<i', b, i)[0];
-            i += 4;
-            i += 1
-            out[key] = b[i:i + ln];
-            i += ln
-        elif t == 0x07:  # ObjectId
-            out[key] = 'OID:' + b[i:i + 12].hex();
-            i += 12
-        elif t == 0x08:  # bool
-            out[key] = bool(b[i]);
-            i += 1
-        elif t == 0x09:  # UTC datetime (ms)
-            ms = struct.unpack_from('<q', b, i)[0];
-            i += 8
-            out[key] = datetime.datetime.utcfromtimestamp(ms / 1000)
-        elif t == 0x0A:  # null
-            out[key] = None
-        elif t == 0x10:  # int32
-            out[key] = struct.unpack_from('<i', b, i)[0];
+        if remaining == 0:
+            return out, end  # все нужные поля уже прочитаны — хвост документа не трогаем
+        t = b[i]
+        j = b.index(0, i + 1)
+        key = b[i + 1:j].decode('utf-8', 'replace')
+        i = j + 1
+        if fields is None:
+            sub = None
+        else:
+            sub = fields.get(key)
+            if sub is None:
+                i = _skip_value(b, t, i)
+                continue
+            remaining -= 1
+            if sub is True:
+                sub = None
+        if t == 0x02:
+            j = i + 4 + unpack_int32(b, i)[0]
+            out[key] = b[i + 4:j - 1].decode('utf-8', 'replace')
+            i = j
+        elif t == 0x10:
+            out[key] = unpack_int32(b, i)[0]
             i += 4
-        elif t == 0x12:  # int64
-            out[key] = struct.unpack_from('<q', b, i)[0];
+        elif t == 0x09:
+            out[key] = _EPOCH + datetime.timedelta(milliseconds=_INT64.unpack_from(b, i)[0])
             i += 8
         else:
-            raise ValueError(f'Неизвестный BSON-тип {t:#x} для ключа {key}')
-    return out, start + size
+            reader = readers.get(t)
+            if reader is None:
+                raise ValueError(f'Неизвестный BSON-тип {t:#x} для ключа {key}')
+            out[key], i = reader(b, i, sub)
+    return out, end
+
+
+def _rd_array(b, i, fields):
+    # Проекция относится к каждому элементу; ключи массива ('0', '1', ...) не нужны.
+    end = i + _INT32.unpack_from(b, i)[0]
+    i += 4
+    out = []
+    readers = _READERS
+    while b[i] != 0:
+        t = b[i]
+        i = b.index(0, i + 1) + 1
+        reader = readers.get(t)
+        if reader is None:
+            raise ValueError(f'Неизвестный BSON-тип {t:#x} в массиве')
+        value, i = reader(b, i, fields)
+        out.append(value)
+    return out, end
+
+
+_READERS = {
+    0x01: _rd_double,
+    0x02: _rd_string,
+    0x03: _rd_doc,
+    0x04: _rd_array,
+    0x05: _rd_binary,
+    0x07: _rd_object_id,
+    0x08: _rd_bool,
+    0x09: _rd_datetime,
+    0x0A: _rd_null,
+    0x10: _rd_int32,
+    0x12: _rd_int64,
+}
+
+
+def _skip_value(b, t, i):
+    size = _FIXED_SIZES.get(t)
+    if size is not None:
+        return i + size
+    if t in (0x02, 0x0D, 0x0E):  # string, JS-код, символ: int32 длина + байты с \0
+        return i + 4 + _INT32.unpack_from(b, i)[0]
+    if t in (0x03, 0x04):  # документ/массив: int32 полный размер
+        return i + _INT32.unpack_from(b, i)[0]
+    if t == 0x05:  # binary: int32 длина + подтип + байты
+        return i + 5 + _INT32.unpack_from(b, i)[0]
+    if t == 0x0B:  # regex: две cstring
+        i = b.index(0, i) + 1
+        return b.index(0, i) + 1
+    raise ValueError(f'Неизвестный BSON-тип {t:#x}')
+
+
+def _iter_bson_python(path, fields):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return  # mmap пустого файла не создаётся
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            i = 0
+            while i < len(m):
+                end = i + _INT32.unpack_from(m, i)[0]
+                d, _ = _rd_doc(m[i:end], 0, fields)  # копия одного документа, не всего дампа
+                yield d
+                i = end
 
 
-def read_bson(path):
-    b = open(path, 'rb').read()
-    i = 0
-    docs = []
-    while i < len(b):
-        d, i = _rd_doc(b, i)
-        docs.append(d)
-    return docs
+# ---- C: bson.decode_file_iter читает файл по документу; ObjectId приводится декодером типа, ----
+# ---- проекция — уже по готовому dict (C-разбор всего документа всё равно быстрее python)     ----
+
+if _bson is not None:
+    class _ObjectIdAsString(_TypeDecoder):
+        bson_type = _bson.ObjectId
+
+        def transform_bson(self, value):
+            return 'OID:' + value.binary.hex()
+
+    _C_OPTIONS = _CodecOptions(type_registry=_TypeRegistry([_ObjectIdAsString()]),
+                               unicode_decode_error_handler='replace')
+
+
+def _project(doc, fields):
+    out = {}
+    for key, sub in fields.items():
+        if key not in doc:
+            continue
+        value = doc[key]
+        if sub is not True:
+            if isinstance(value, dict):
+                value = _project(value, sub)
+            elif isinstance(value, list):
+                value = [_project(x, sub) if isinstance(x, dict) else x for x in value]
+        out[key] = value
+    return out
+
+
+def _iter_bson_c(path, fields):
+    with open(path, 'rb') as f:
+        for d in _bson.decode_file_iter(f, codec_options=_C_OPTIONS):
+            yield d if fields is None else _project(d, fields)
+
+
+def get_bson_decoder(name=None):
+    name = name or BSON_DECODER
+    if name == 'auto':
+        name = 'c' if _BSON_C else 'python'
+    if name == 'c':
+        if _bson is None:
+            raise ValueError('Декодер c требует pymongo (pip install pymongo)')
+        return _iter_bson_c
+    if name == 'python':
+        return _iter_bson_python
+    raise ValueError(f'Неизвестный BSON-декодер {name}: auto | c | python')
+
+
+def iter_bson(path, fields=None, decoder=None):
+    """Документы дампа по одному (без чтения файла целиком)."""
+    return get_bson_decoder(decoder)(path, fields)
+
+
+def read_bson(path, fields=None, decoder=None):
+    return list(iter_bson(path, fields, decoder))
 
 
 # ----------------------------------------------------------------------------
-# 2. Движок очков — точная копия логики бота (main.py:1191-1264)
+# 2. Движок очков — общий с ботом (scoring_utils.py), веса — по сезонам
 # ----------------------------------------------------------------------------
 
 # Веса очков ОТЛИЧАЮТСЯ по сезонам (восстановлено из сохранённых тоталов):
@@ -115,51 +294,26 @@ CAT_RU = {'exact': 'Точный счёт', 'diff': 'Разница мячей',
           'winner': 'Победитель', None: 'Мимо'}
 
 
+# Коды категорий (= индексы CATS) и near-miss — из scoring_utils, как в боте.
+CATS = scoring_utils.CATEGORY_NAMES
+CAT_EXACT, CAT_DIFF, CAT_DRAW, CAT_WINNER, CAT_MISS = (
+    scoring_utils.EXACT_SCORE, scoring_utils.GOAL_DIFFERENCE, scoring_utils.DRAW, scoring_utils.WINNER,
+    scoring_utils.MISS)
+
+
 def category(rt1, rt2, bt1, bt2):
     """Каскад как в боте: exact > draw > diff > winner."""
-    if rt1 == bt1 and rt2 == bt2:
-        return 'exact'
-    if rt1 == rt2 and bt1 == bt2:
-        return 'draw'
-    if rt1 - rt2 == bt1 - bt2:
-        return 'diff'
-    if rt1 > rt2:
-        w = bt1 > bt2
-    elif rt1 < rt2:
-        w = bt1 < bt2
-    else:
-        w = (bt1 == bt2)
-    return 'winner' if w else None
-
-
-def is_same_winner(rt1, rt2, bt1, bt2):
-    if rt1 > rt2:
-        return bt1 > bt2
-    if rt1 < rt2:
-        return bt1 < bt2
-    return bt1 == bt2
+    return CATS[scoring_utils.classify(rt1, rt2, bt1, bt2).category]
 
 
 def near_miss_winner(rt1, rt2, bt1, bt2):
     """В одном мяче от точного счёта с учётом исхода (bot: ..._winner_consider)."""
-    if not is_same_winner(rt1, rt2, bt1, bt2):
-        return False
-    if rt1 == bt1:
-        return bt2 in (rt2 - 1, rt2 + 1)
-    if rt2 == bt2:
-        return bt1 in (rt1 - 1, rt1 + 1)
-    return False
+    return scoring_utils.classify(rt1, rt2, bt1, bt2).near_miss_winner
 
 
 def near_miss_other(rt1, rt2, bt1, bt2):
     """В одном мяче от ТС в иных случаях, матчи с 2+ голами (bot)."""
-    if rt1 + rt2 < 2:
-        return False
-    if rt1 == bt1:
-        return bt2 in (rt2 - 1, rt2 + 1)
-    if rt2 == bt2:
-        return bt1 in (rt1 - 1, rt1 + 1)
-    return False
+    return scoring_utils.classify(rt1, rt2, bt1, bt2).near_miss_other
 
 
 # ----------------------------------------------------------------------------
@@ -177,11 +331,8 @@ def phase_of(dt):
 
 
 def load_season(year):
-    raw_events = read_bson(os.path.join(BASE, year, 'events.bson'))
-    raw_users = read_bson(os.path.join(BASE, year, 'users.bson'))
-
     events = {}  # uuid -> event dict
-    for e in raw_events:
+    for e in iter_bson(os.path.join(BASE, year, 'events.bson'), EVENT_FIELDS):
         if not has_result(e):
             continue
         r = e['result']
@@ -197,17 +348,15 @@ def load_season(year):
         }
 
     players = {}
-    for u in raw_users:
+    player_bets = {}  # username -> {uuid: (t1, t2, through)}; только на время загрузки
+    for u in iter_bson(os.path.join(BASE, year, 'users.bson'), USER_FIELDS):
         bets = {}
         for be in u.get('bets', []):
             uuid = be['event_uuid']
             if uuid not in events:
                 continue
-            bets[uuid] = {  # последняя ставка по событию
-                't1': be['team_1_scores'], 't2': be['team_2_scores'],
-                'through': be.get('team_1_will_go_through'),
-                'created_at': be.get('created_at'),
-            }
+            # последняя ставка по событию
+            bets[uuid] = (be['team_1_scores'], be['team_2_scores'], be.get('team_1_will_go_through'))
         name = (u.get('first_name') or '').strip()
         if u.get('last_name'):
             name = (name + ' ' + u['last_name']).strip()
@@ -215,17 +364,98 @@ def load_season(year):
             'username': u['username'],
             'name': name or u['username'],
             'stored_scores': u.get('scores', 0),
-            'bets': bets,
+            'n_bets': len(bets),
         }
-    return {'year': year, 'events': events, 'players': players, 'W': WEIGHTS[year]}
+        player_bets[u['username']] = bets
+    cols = build_columns(events, player_bets)
+    return {'year': year, 'events': events, 'players': players, 'W': WEIGHTS[year], 'cols': cols}
 
 
 # ----------------------------------------------------------------------------
-# 4. Пер-матчевый расчёт очков для игрока
+# 4. Колоночная модель сезона: категория и near-miss каждой ставки считаются один раз
 # ----------------------------------------------------------------------------
 
+# Колонка cat — коды CATS; near-miss: A — «с учётом исхода», B — иной.
+NM_NONE, NM_A, NM_B = 0, 1, 2
+# through (ставка и результат): -1 — не указан, 0/1 — прошла team_2/team_1.
+_THROUGH_CODE = {None: -1, False: 0, True: 1}
+
+
+def build_columns(events, player_bets):
+    """Параллельные массивы: события (rt1, rt2, decisive) и ставки (player, event, bt1, bt2, through).
+    Ставки игрока p — непрерывный отрезок offsets[p]:offsets[p + 1] в хронологическом порядке."""
+    event_uuids = list(events)
+    event_index = {uuid: i for i, uuid in enumerate(event_uuids)}
+    ev_list = [events[uuid] for uuid in event_uuids]
+    cols = {
+        'event_uuids': event_uuids,
+        'event_index': event_index,
+        'rt1': array('h', (e['rt1'] for e in ev_list)),
+        'rt2': array('h', (e['rt2'] for e in ev_list)),
+        'decisive': array('b', (e['decisive'] for e in ev_list)),
+        'ev_through': array('b', (_THROUGH_CODE[e['through']] for e in ev_list)),
+        'usernames': list(player_bets),
+        'player_index': {u: i for i, u in enumerate(player_bets)},
+        'offsets': array('i', [0]),
+        'player': array('i'), 'event': array('i'),
+        'bt1': array('h'), 'bt2': array('h'), 'through': array('b'),
+        'points': {},  # кэш очков ставок по набору весов, см. bet_points
+    }
+    for p, bets in enumerate(player_bets.values()):
+        # хронологически; при равном времени — в порядке ставок в дампе (сортировка устойчива)
+        for uuid, (t1, t2, through) in sorted(
+                bets.items(), key=lambda x: events[x[0]]['time'] or datetime.datetime.min):
+            cols['player'].append(p)
+            cols['event'].append(event_index[uuid])
+            cols['bt1'].append(t1)
+            cols['bt2'].append(t2)
+            cols['through'].append(_THROUGH_CODE[through])
+        cols['offsets'].append(len(cols['player']))
+    _classify_bets(cols)
+    return cols
+
+
+def _classify_bets(cols):
+    # Один проход по всем ставкам сезона: категория, угаданный проход, near-miss — всё, что
+    # не зависит от весов. Очки по весам — bet_points.
+    rt1, rt2, decisive, ev_through = cols['rt1'], cols['rt2'], cols['decisive'], cols['ev_through']
+    cat, adv_hit, nm = array('b'), array('b'), array('b')
+    classify = scoring_utils.classify
+    for e, b1, b2, th in zip(cols['event'], cols['bt1'], cols['bt2'], cols['through']):
+        r = classify(rt1[e], rt2[e], b1, b2)
+        cat.append(r.category)
+        adv_hit.append(decisive[e] and th != -1 and ev_through[e] != -1 and th == ev_through[e])
+        if r.category == CAT_EXACT:
+            nm.append(NM_NONE)  # у точного счёта near-miss не считается
+        elif r.near_miss_winner:
+            nm.append(NM_A)  # как в боте: A приоритетнее B
+        elif r.near_miss_other:
+            nm.append(NM_B)
+        else:
+            nm.append(NM_NONE)
+    cols['cat'], cols['adv_hit'], cols['nm'] = cat, adv_hit, nm
+
+
+def bet_points(cols, W):
+    """Очки каждой ставки (счёт + проход) при весах W; массив считается один раз на набор весов."""
+    key = tuple(W[c] for c in CATS) + (W['adv'],)
+    points = cols['points'].get(key)
+    if points is None:
+        table, adv = key[:-1], key[-1]
+        points = array('h', (table[c] + adv * a for c, a in zip(cols['cat'], cols['adv_hit'])))
+        cols['points'][key] = points
+    return points
+
+
+def player_slice(season, username):
+    cols = season['cols']
+    p = cols['player_index'][username]
+    return cols['offsets'][p], cols['offsets'][p + 1]
+
+
 def score_bet(ev, bet, W):
-    """Возвращает (cat, score_pts, adv_pts, total) при наборе весов W."""
+    """Возвращает (cat, score_pts, adv_pts, total) при наборе весов W. Для проверки одной ставки;
+    отчёт берёт те же числа из колонок (_classify_bets + bet_points)."""
     cat = category(ev['rt1'], ev['rt2'], bet['t1'], bet['t2'])
     score_pts = W[cat]
     adv = 0
@@ -236,20 +466,25 @@ def score_bet(ev, bet, W):
 
 
 def per_match(season, username, W=None):
-    """Список записей по каждому сыгранному матчу, где игрок ставил."""
+    """Список записей по каждому сыгранному матчу, где игрок ставил (хронологически).
+    Метрики его не используют — читают колонки напрямую; удобно для отладки одного игрока."""
     W = W or season['W']
-    pl = season['players'][username]
+    cols = season['cols']
+    points = bet_points(cols, W)
+    lo, hi = player_slice(season, username)
     rows = []
-    for uuid, bet in pl['bets'].items():
+    for k in range(lo, hi):
+        uuid = cols['event_uuids'][cols['event'][k]]
         ev = season['events'][uuid]
-        cat, sp, adv, tot = score_bet(ev, bet, W)
+        bet = {'t1': cols['bt1'][k], 't2': cols['bt2'][k], 'through': (None, False, True)[cols['through'][k] + 1]}
+        cat = CATS[cols['cat'][k]]
         rows.append({
             'uuid': uuid, 'ev': ev, 'bet': bet,
-            'cat': cat, 'score_pts': sp, 'adv': adv, 'total': tot,
+            'cat': cat, 'score_pts': W[cat], 'adv': points[k] - W[cat], 'total': points[k],
+            # оба признака независимо (колонка nm хранит только приоритетный)
             'nm_winner': near_miss_winner(ev['rt1'], ev['rt2'], bet['t1'], bet['t2']),
             'nm_other': near_miss_other(ev['rt1'], ev['rt2'], bet['t1'], bet['t2']),
         })
-    rows.sort(key=lambda r: (r['ev']['time'] or datetime.datetime.min))
     return rows
 
 
@@ -259,40 +494,45 @@ def per_match(season, username, W=None):
 
 def analyze_player(season, username, W=None):
     W = W or season['W']
-    rows = per_match(season, username, W)
-    n = len(rows)
-    total = sum(r['total'] for r in rows)
-    score_total = sum(r['score_pts'] for r in rows)
-    adv_total = sum(r['adv'] for r in rows)
-
-    cats = Counter(r['cat'] for r in rows)
-    decisive_rows = [r for r in rows if r['ev']['decisive']]
-    adv_hits = sum(1 for r in rows if r['adv'] > 0)
+    cols = season['cols']
+    lo, hi = player_slice(season, username)
+    n = hi - lo
+    pts_seq = bet_points(cols, W)[lo:hi].tolist()
+    cat = cols['cat'][lo:hi]
+    bt1 = cols['bt1'][lo:hi]
+    bt2 = cols['bt2'][lo:hi]
+    ev_idx = cols['event'][lo:hi]
+    table = [W[c] for c in CATS]
+    total = sum(pts_seq)
+    score_total = sum(table[c] for c in cat)
+    adv_hits = sum(cols['adv_hit'][lo:hi]) if W['adv'] > 0 else 0
+    adv_total = adv_hits * W['adv']
+
+    cats = Counter(CATS[c] for c in cat)
+    decisive_n = sum(cols['decisive'][e] for e in ev_idx)
 
     # near-miss (как в боте: A приоритетнее B); «недобор» = до точного счёта
-    nm_a = 0;
-    nm_b = 0;
-    foregone = 0
-    for r in rows:
-        if r['cat'] == 'exact':
-            continue
-        if r['nm_winner']:
+    nm_a = nm_b = foregone = 0
+    for c, m in zip(cat, cols['nm'][lo:hi]):
+        if m == NM_A:
             nm_a += 1
-            foregone += (W['exact'] - r['score_pts'])
-        elif r['nm_other']:
+        elif m == NM_B:
             nm_b += 1
-            foregone += (W['exact'] - r['score_pts'])
+        else:
+            continue
+        foregone += W['exact'] - table[c]
 
     # ставки на ничьи и «квирк» правила (ничья учитывается раньше разницы)
-    draw_bets = sum(1 for r in rows if r['bet']['t1'] == r['bet']['t2'])
-    correct_draws = sum(1 for r in rows if r['cat'] == 'draw')
+    draw_bets = sum(1 for a, b in zip(bt1, bt2) if a == b)
+    correct_draws = cats.get('draw', 0)
     draw_rule_loss = correct_draws * max(0, W['diff'] - W['draw'])  # 2025: 0, 2026: 1/шт
 
     # стиль
-    bet_totals = [r['bet']['t1'] + r['bet']['t2'] for r in rows]
-    act_totals = [r['ev']['rt1'] + r['ev']['rt2'] for r in rows]
-    bet_margin = [r['bet']['t1'] - r['bet']['t2'] for r in rows]
-    scoreline_counter = Counter((r['bet']['t1'], r['bet']['t2']) for r in rows)
+    rt1, rt2 = cols['rt1'], cols['rt2']
+    bet_totals = [a + b for a, b in zip(bt1, bt2)]
+    act_totals = [rt1[e] + rt2[e] for e in ev_idx]
+    bet_margin = [a - b for a, b in zip(bt1, bt2)]
+    scoreline_counter = Counter(zip(bt1, bt2))
 
     # энтропия счетов
     ent = 0.0
@@ -301,20 +541,18 @@ def analyze_player(season, username, W=None):
         ent -= p * math.log2(p)
 
     # серии (по матчам, где ставил, хронологически)
-    pts_seq = [r['total'] for r in rows]
     hot = cur = 0
     cold = curc = 0
     for p in pts_seq:
         if p > 0:
-            cur += 1;
-            hot = max(hot, cur);
+            cur += 1
+            hot = max(hot, cur)
             curc = 0
         else:
-            curc += 1;
-            cold = max(cold, curc);
+            curc += 1
+            cold = max(cold, curc)
             cur = 0
 
-    per_match_pts = pts_seq[:]
     return {
         'username': username,
         'name': season['players'][username]['name'],
@@ -330,10 +568,10 @@ def analyze_player(season, username, W=None):
         'draw': cats.get('draw', 0),
         'winner': cats.get('winner', 0),
         'miss': cats.get(None, 0),
-        'scored_rate': sum(1 for r in rows if r['total'] > 0) / n if n else 0,
-        'decisive_n': len(decisive_rows),
+        'scored_rate': sum(1 for p in pts_seq if p > 0) / n if n else 0,
+        'decisive_n': decisive_n,
         'adv_hits': adv_hits,
-        'adv_rate': adv_hits / len(decisive_rows) if decisive_rows else 0,
+        'adv_rate': adv_hits / decisive_n if decisive_n else 0,
         'nm_a': nm_a, 'nm_b': nm_b, 'nm_total': nm_a + nm_b, 'foregone': foregone,
         'draw_bets': draw_bets, 'correct_draws': correct_draws, 'draw_rule_loss': draw_rule_loss,
         'avg_bet_total': mean(bet_totals) if bet_totals else 0,
@@ -342,9 +580,8 @@ def analyze_player(season, username, W=None):
         'fav_scoreline': scoreline_counter.most_common(1)[0] if scoreline_counter else None,
         'distinct_scorelines': len(scoreline_counter),
         'entropy': ent,
-        'pts_std': pstdev(per_match_pts) if n > 1 else 0,
+        'pts_std': pstdev(pts_seq) if n > 1 else 0,
         'hot_streak': hot, 'cold_streak': cold,
-        'rows': rows,
     }
 
 
@@ -361,16 +598,28 @@ def analyze_all_players(season, min_bets=1):
 # 6. Социальная аналитика (H2H, близнецы, контрарность, матчи)
 # ----------------------------------------------------------------------------
 
+def collect_match_bets(season, active, W=None):
+    """uuid -> {username: (t1, t2)} и uuid -> {username: очки} по ставкам игроков active.
+    Матчи — в порядке первого появления при обходе active и ставок каждого хронологически."""
+    cols = season['cols']
+    points = bet_points(cols, W or season['W'])
+    event_uuids, event, bt1, bt2 = cols['event_uuids'], cols['event'], cols['bt1'], cols['bt2']
+    match_bets = defaultdict(dict)
+    pmpts = defaultdict(dict)
+    for uname in active:
+        lo, hi = player_slice(season, uname)
+        for k in range(lo, hi):
+            uuid = event_uuids[event[k]]
+            match_bets[uuid][uname] = (bt1[k], bt2[k])
+            pmpts[uuid][uname] = points[k]
+    return match_bets, pmpts
+
+
 def analyze_social(season, active):
     """active = список username с достаточным числом ставок."""
     ev = season['events']
-    # все ставки по матчу
-    match_bets = defaultdict(dict)  # uuid -> {username: bet}
-    pmpts = defaultdict(dict)  # uuid -> {username: total pts}
-    for uname in active:
-        for r in per_match(season, uname):
-            match_bets[r['uuid']][uname] = r['bet']
-            pmpts[r['uuid']][uname] = r['total']
+    # все ставки по матчу: uuid -> {username: (t1, t2)}, uuid -> {username: total pts}
+    match_bets, pmpts = collect_match_bets(season, active)
 
     # H2H
     h2h = {a: {b: [0, 0, 0] for b in active if b != a} for a in active}  # [wins,losses,ties]
@@ -393,11 +642,11 @@ def analyze_social(season, active):
     for ai in range(len(active)):
         for bi in range(ai + 1, len(active)):
             a, b = active[ai], active[bi]
-            ds = [];
+            ds = []
             ident = 0
             for uuid, mb in match_bets.items():
                 if a in mb and b in mb:
-                    d = abs(mb[a]['t1'] - mb[b]['t1']) + abs(mb[a]['t2'] - mb[b]['t2'])
+                    d = abs(mb[a][0] - mb[b][0]) + abs(mb[a][1] - mb[b][1])
                     ds.append(d)
                     if d == 0:
                         ident += 1
@@ -414,9 +663,9 @@ def analyze_social(season, active):
             others = [v for k, v in mb.items() if k != uname]
             if not others:
                 continue
-            m1 = mean(o['t1'] for o in others)
-            m2 = mean(o['t2'] for o in others)
-            devs.append(abs(mb[uname]['t1'] - m1) + abs(mb[uname]['t2'] - m2))
+            m1 = mean(o[0] for o in others)
+            m2 = mean(o[1] for o in others)
+            devs.append(abs(mb[uname][0] - m1) + abs(mb[uname][1] - m2))
         contrarian[uname] = mean(devs) if devs else 0
 
     # сложность матчей: доля набравших очки, средние очки
@@ -437,8 +686,8 @@ def analyze_social(season, active):
     for uuid, mb in match_bets.items():
         if not mb:
             continue
-        m1 = mean(v['t1'] for v in mb.values())
-        m2 = mean(v['t2'] for v in mb.values())
+        m1 = mean(v[0] for v in mb.values())
+        m2 = mean(v[1] for v in mb.values())
         e = ev[uuid]
         upsets[uuid] = {
             'dist': abs(e['rt1'] - m1) + abs(e['rt2'] - m2),
@@ -478,29 +727,25 @@ def analyze_club_bias(season, active, min_matches=4):
         club_matches[e['t1']].append((uuid, 1))
         club_matches[e['t2']].append((uuid, 2))
 
-    bets_by = {u: {r['uuid']: r['bet'] for r in per_match(season, u)} for u in active}
+    match_bets, _ = collect_match_bets(season, active)
 
     result = defaultdict(dict)  # username -> {club: bias}
-    club_strength = {}
     for club, lst in club_matches.items():
         if len(lst) < min_matches:
             continue
         # консенсус-lean по каждому матчу (среди тех, кто ставил)
         per_player_lean = defaultdict(list)
-        group_lean_per_match = {}
         for uuid, side in lst:
-            leans = []
+            mb = match_bets.get(uuid)
+            if not mb:
+                continue
             pl_lean = {}
             for u in active:
-                b = bets_by[u].get(uuid)
-                if not b:
+                b = mb.get(u)
+                if b is None:
                     continue
-                lean = (b['t1'] - b['t2']) if side == 1 else (b['t2'] - b['t1'])
-                pl_lean[u] = lean
-                leans.append(lean)
-            if not leans:
-                continue
-            g = mean(leans)
+                pl_lean[u] = (b[0] - b[1]) if side == 1 else (b[1] - b[0])
+            g = mean(pl_lean.values())
             for u, lv in pl_lean.items():
                 per_player_lean[u].append(lv - g)
         for u, devs in per_player_lean.items():
@@ -599,7 +844,7 @@ def build():
     # активные = >=30 ставок
     def active_of(season):
         return [u for u in season['players']
-                if len(season['players'][u]['bets']) >= 30]
+                if season['players'][u]['n_bets'] >= 30]
 
     act25 = active_of(s25)
     act26 = active_of(s26)
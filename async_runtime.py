@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+# Параллельно обрабатываемых апдейтов (разных чатов). У telebot в threaded-режиме по умолчанию 2 потока.
+HANDLER_WORKERS = 8
+LONG_POLLING_TIMEOUT_SECONDS = 20
+POLLING_RETRY_SECONDS = 3
+
+
+# Альтернативный рантайм (BOT_RUNTIME=asyncio): один event loop ведёт long polling, плановые задачи
+# и раздачу апдейтов обработчикам. Обработчики и задачи остаются синхронными (telebot + pymongo) и
+# выполняются в пулах потоков, поэтому медленный запрос к football-data.org или рассылка на всех
+# участников не задерживают нажатия кнопок, а каждая плановая задача идёт по своему расписанию.
+
+def get_update_chat_key(update) -> int | None:
+    # Апдейты одного чата обрабатываются строго по очереди (ставка текстом идёт после нажатия кнопки).
+    if update.message is not None:
+        return update.message.chat.id
+    if update.callback_query is not None:
+        return update.callback_query.from_user.id
+    chat_member = getattr(update, 'chat_member', None)
+    if chat_member is not None:
+        return chat_member.chat.id
+    return None
+
+
+class UpdateDispatcher:
+    def __init__(self, bot, executor: ThreadPoolExecutor):
+        self._bot = bot
+        self._executor = executor
+        self._tails = {}  # ключ чата -> последняя задача этого чата
+        self._pending = set()
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def dispatch(self, update):
+        key = get_update_chat_key(update)
+        previous = self._tails.get(key) if key is not None else None
+        task = asyncio.create_task(self._process(update, previous))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        if key is not None:
+            self._tails[key] = task
+            task.add_done_callback(lambda x: self._forget_tail(key, x))
+
+    async def wait_idle(self):
+        while len(self._pending) > 0:
+            await asyncio.wait(list(self._pending))
+
+    async def _process(self, update, previous: asyncio.Task | None):
+        if previous is not None:
+            await asyncio.wait([previous])  # исключение предыдущего апдейта уже залогировано
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._bot.process_new_updates, [update])
+        except Exception as e:
+            logging.exception(e)
+
+    def _forget_tail(self, key: int, task: asyncio.Task):
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+
+async def poll_updates(bot, dispatcher: UpdateDispatcher, allowed_updates: list[str] | None = None):
+    offset = None
+    while True:
+        try:
+            updates = await asyncio.to_thread(
+                bot.get_updates,
+                offset=offset,
+                timeout=LONG_POLLING_TIMEOUT_SECONDS + 10,
+                long_polling_timeout=LONG_POLLING_TIMEOUT_SECONDS,
+                allowed_updates=allowed_updates,
+            )
+        except Exception as e:
+            logging.exception(e)
+            await asyncio.sleep(POLLING_RETRY_SECONDS)
+            continue
+        for update in updates:
+            offset = update.update_id + 1
+            dispatcher.dispatch(update)
+
+
+async def run_periodic(interval_seconds: float, task: Callable, run_at_start: bool = False):
+    # Тики выровнены по сетке интервала. Если задача шла дольше интервала, пропущенные тики не догоняем.
+    loop = asyncio.get_running_loop()
+    next_run = loop.time() if run_at_start else loop.time() + interval_seconds
+    while True:
+        await asyncio.sleep(max(0.0, next_run - loop.time()))
+        try:
+            await asyncio.to_thread(task)
+        except Exception as e:
+            logging.exception(e)
+        next_run += interval_seconds
+        while next_run < loop.time():
+            next_run += interval_seconds
+
+
+async def serve(
+        bot,
+        jobs: list[tuple[float, Callable, bool]],
+        handler_workers: int = HANDLER_WORKERS,
+        allowed_updates: list[str] | None = None,
+):
+    # jobs: (интервал в секундах, задача, запустить сразу при старте).
+    with ThreadPoolExecutor(max_workers=handler_workers, thread_name_prefix='handler') as executor:
+        dispatcher = UpdateDispatcher(bot=bot, executor=executor)
+        coroutines = [poll_updates(bot=bot, dispatcher=dispatcher, allowed_updates=allowed_updates)]
+        coroutines += [run_periodic(interval, task, run_at_start) for interval, task, run_at_start in jobs]
+        await asyncio.gather(*coroutines)
+
+
+def run(
+        bot,
+        jobs: list[tuple[float, Callable, bool]],
+        handler_workers: int = HANDLER_WORKERS,
+        allowed_updates: list[str] | None = None,
+):
+    # Обработчики выполняются в нашем пуле, собственный пул потоков telebot не нужен.
+    bot.threaded = False
+    asyncio.run(serve(bot=bot, jobs=jobs, handler_workers=handler_workers, allowed_updates=allowed_updates))
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# Скорость чтения дампов analytics/analyze.py: исходный декодер (read() целиком + struct.unpack_from на
+# каждое поле) против нового python-пути (mmap, предкомпилированные Struct, таблица по типу) и
+# C-расширения bson из pymongo — с проекцией load_season и без неё. Дамп синтетический, пишется
+# во временную папку:
+#   python3 benchmarks/bson_decoder.py [пользователей] [ставок на пользователя]
+import datetime
+import importlib.util
+import os
+import struct
+import sys
+import tempfile
+import time
+
+import bson
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USERS = 400
+BETS_PER_USER = 300
+REPEATS = 3
+
+
+def load_analyze():
+    spec = importlib.util.spec_from_file_location('analyze', os.path.join(ROOT, 'analytics', 'analyze.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Декодер analyze.py до перехода на потоковое чтение — точка отсчёта.
+def legacy_rd_doc(b, i):
+    start = i
+    size = struct.unpack_from('<i', b, i)[0]
+    i += 4
+    out = {}
+    while b[i] != 0:
+        t = b[i]
+        i += 1
+        j = b.index(0, i)
+        key = b[i:j].decode('utf-8', 'replace')
+        i = j + 1
+        if t == 0x01:
+            out[key] = struct.unpack_from('<d', b, i)[0]
+            i += 8
+        elif t == 0x02:
+            ln = struct.unpack_from('<i', b, i)[0]
+            i += 4
+            out[key] = b[i:i + ln - 1].decode('utf-8', 'replace')
+            i += ln
+        elif t == 0x03:
+            out[key], i = legacy_rd_doc(b, i)
+        elif t == 0x04:
+            arr, i = legacy_rd_doc(b, i)
+            out[key] = [arr[k] for k in arr]
+        elif t == 0x05:
+            ln = struct.unpack_from('<i', b, i)[0]
+            i += 5
+            out[key] = b[i:i + ln]
+            i += ln
+        elif t == 0x07:
+            out[key] = 'OID:' + b[i:i + 12].hex()
+            i += 12
+        elif t == 0x08:
+            out[key] = bool(b[i])
+            i += 1
+        elif t == 0x09:
+            ms = struct.unpack_from('<q', b, i)[0]
+            i += 8
+            out[key] = datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=ms)
+        elif t == 0x0A:
+            out[key] = None
+        elif t == 0x10:
+            out[key] = struct.unpack_from('<i', b, i)[0]
+            i += 4
+        elif t == 0x12:
+            out[key] = struct.unpack_from('<q', b, i)[0]
+            i += 8
+        else:
+            raise ValueError(f'Неизвестный BSON-тип {t:#x} для ключа {key}')
+    return out, start + size
+
+
+def legacy_read_bson(path):
+    b = open(path, 'rb').read()
+    i = 0
+    docs = []
+    while i < len(b):
+        d, i = legacy_rd_doc(b, i)
+        docs.append(d)
+    return docs
+
+
+def write_dump(path, users, bets_per_user):
+    now = datetime.datetime(2026, 3, 1, 20, 0)
+    with open(path, 'wb') as f:
+        for user_id in range(users):
+            f.write(bson.encode({
+                '_id': user_id,
+                'username': f'user{user_id}',
+                'first_name': f'Игрок {user_id}',
+                'last_name': 'Тестовый',
+                'last_interaction': now,
+                'created_at': now,
+                'scores': user_id * 3,
+                'statistic': {'exact': 1, 'diff': 2, 'draw': 3, 'winner': 4},
+                'bets': [{
+                    'event_uuid': f'{bet:08d}-0000-4000-8000-{user_id:012d}',
+                    'team_1_scores': bet % 4,
+                    'team_2_scores': bet % 3,
+                    'team_1_will_go_through': None if bet % 5 else True,
+                    'created_at': now,
+                    'is_joker': bet % 17 == 0,
+                    'source': 'text',
+                } for bet in range(bets_per_user)],
+            }))
+
+
+def measure(function) -> tuple[float, int]:
+    best = None
+    count = 0
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        count = sum(1 for _ in function())
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else USERS
+    bets_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else BETS_PER_USER
+    analyze = load_analyze()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'users.bson')
+        write_dump(path, users, bets_per_user)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f'Дамп: {users} пользователей x {bets_per_user} ставок, {size_mb:.1f} МБ; лучшее из {REPEATS}')
+        scenarios = [
+            ('исходный (read + unpack_from)', lambda: legacy_read_bson(path)),
+            ('python, все поля', lambda: analyze.iter_bson(path, decoder='python')),
+            ('python, USER_FIELDS', lambda: analyze.iter_bson(path, analyze.USER_FIELDS, decoder='python')),
+        ]
+        if analyze._BSON_C:
+            scenarios += [
+                ('bson C, все поля', lambda: analyze.iter_bson(path, decoder='c')),
+                ('bson C, USER_FIELDS', lambda: analyze.iter_bson(path, analyze.USER_FIELDS, decoder='c')),
+            ]
+        else:
+            print('C-расширение bson недоступно — строки bson C пропущены')
+        baseline = None
+        for name, function in scenarios:
+            elapsed, count = measure(function)
+            baseline = baseline or elapsed
+            print(f'{name:32} {elapsed * 1000:8.0f} мс  {size_mb / elapsed:6.1f} МБ/с  x{baseline / elapsed:4.1f}'
+                  f'  ({count} документов)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
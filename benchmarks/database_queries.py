@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# Сколько запросов к Mongo делает Database на типовых путях обработчиков main.py.
+# Считает команды драйвера через pymongo.monitoring, поэтому нужен локальный mongod (как и боту).
+# Сценарии пользуются только методами, которые были у Database и до рефакторинга, — скрипт можно
+# запустить на двух ревизиях и сравнить числа «до/после»:
+#   DATABASE_NAME=totalizator_bench python3 benchmarks/database_queries.py
+# База DATABASE_NAME дропается в начале и в конце прогона — не указывай боевую!
+import os
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from pymongo import monitoring
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USERS = 30
+EVENTS = 64
+BETS_PER_USER = 40
+# Служебные команды драйвера (handshake, heartbeat, сессии) запросами не считаем.
+IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'endSessions', 'buildInfo', 'dropDatabase'}
+
+
+class QueryCounter(monitoring.CommandListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.commands = Counter()
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        with self._lock:
+            self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self) -> Counter:
+        with self._lock:
+            result = self.commands
+            self.commands = Counter()
+        return result
+
+
+def seed(database):
+    from models import Bet, Event, EventType
+    import utils
+    now = datetime.now(timezone.utc)
+    events = []
+    for index in range(EVENTS):
+        event = Event(
+            uuid=utils.generate_uuid(),
+            team_1=f'Команда {index}-1',
+            team_2=f'Команда {index}-2',
+            time=now + timedelta(hours=index - EVENTS // 2),
+            event_type=EventType.GROUP_STAGE,
+        )
+        database.add_event(event)
+        events.append(event)
+    for user_id in range(1, USERS + 1):
+        database.register_user_if_required(user_id=user_id, username=f'user{user_id}',
+                                           first_name=f'User {user_id}', last_name='')
+        for event in events[:BETS_PER_USER]:
+            database.add_bet(user_id=user_id, bet=Bet(
+                user_id=user_id,
+                event_uuid=event.uuid,
+                team_1_scores=1,
+                team_2_scores=0,
+                team_1_will_go_through=None,
+                created_at=now,
+            ))
+    return events
+
+
+def build_scenarios(database, events):
+    user_id = 1
+    event = events[0]
+    free_event = events[-1]  # на него ставки нет
+
+    def interaction():
+        # main.save_user_or_update_interaction
+        if not database.register_user_if_required(user_id=user_id, username='user1', first_name='User 1',
+                                                  last_name=''):
+            database.update_last_interaction(user_id=user_id)
+
+    def make_bet_callback():
+        interaction()
+        database.get_event_by_uuid(uuid=free_event.uuid)
+        database.save_current_event_to_user(user_id=user_id, event_uuid=free_event.uuid)
+
+    def text_bet():
+        interaction()
+        current = database.get_current_event_for_user(user_id=user_id)
+        database.get_event_by_uuid(uuid=current)
+        database.find_bet(user_id=user_id, event_uuid=current)
+        database.clear_current_event_for_user(user_id=user_id)
+
+    def my_bets_pairs():
+        # main.get_user_bets_with_events
+        for bet in database.get_all_user_bets(user_id=user_id):
+            database.get_event_by_uuid(uuid=bet.event_uuid)
+
+    def settle_one_event():
+        # main.calculate_scores_after_finished_event: find_bet на каждого + начисление угадавшим
+        for user_model in database.get_all_users():
+            if database.find_bet(user_id=user_model.id, event_uuid=event.uuid) is not None:
+                database.add_scores_to_user(user_id=user_model.id, amount=0)
+
+    def coming_soon_warning():
+        # main.send_event_will_start_soon_warning
+        for user_model in database.get_all_users():
+            database.find_bet(user_id=user_model.id, event_uuid=free_event.uuid)
+
+    return [
+        ('get_user_scores', lambda: database.get_user_scores(user_id=user_id)),
+        ('find_bet', lambda: database.find_bet(user_id=user_id, event_uuid=event.uuid)),
+        ('add_scores_to_user', lambda: database.add_scores_to_user(user_id=user_id, amount=0)),
+        ('save_user_or_update_interaction', interaction),
+        ('callback: make bet', make_bet_callback),
+        ('text: bet message (до add_bet)', text_bet),
+        ('get_user_bets_with_events', my_bets_pairs),
+        ('get_all_events x3', lambda: [database.get_all_events() for _ in range(3)]),
+        (f'settle event ({USERS} users)', settle_one_event),
+        (f'coming soon warning ({USERS} users)', coming_soon_warning),
+    ]
+
+
+def main():
+    if not os.environ.get('DATABASE_NAME'):
+        print('Укажи DATABASE_NAME отдельной тестовой базы.')
+        return 1
+    counter = QueryCounter()
+    monitoring.register(counter)
+    from database import Database
+    database = Database()
+    database.client.drop_database(database.db.name)
+    try:
+        events = seed(database)
+        print(f'{"Сценарий":45} запросов  (по командам)')
+        for name, scenario in build_scenarios(database, events):
+            scenario()  # прогрев: первый вызов может заполнить кэши
+            counter.reset()
+            scenario()
+            commands = counter.reset()
+            details = ', '.join(f'{command}={count}' for command, count in sorted(commands.items()))
+            print(f'{name:45} {sum(commands.values()):8}  ({details})')
+    finally:
+        database.client.drop_database(database.db.name)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
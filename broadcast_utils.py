@@ -0,0 +1,229 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+from telebot.apihelper import ApiTelegramException
+
+# Лимиты Telegram Bot API: ~30 сообщений в секунду на бота, 1 в секунду в один личный чат,
+# 20 в минуту в одну группу. Глобальный держим с запасом.
+GLOBAL_MESSAGES_PER_SECOND = 25
+PRIVATE_CHAT_MESSAGES_PER_SECOND = 1
+GROUP_CHAT_MESSAGES_PER_MINUTE = 20
+GROUP_CHAT_BURST = 3
+BROADCAST_WORKERS = 4
+MAX_ATTEMPTS = 3
+NETWORK_RETRY_SECONDS = 2
+TOO_MANY_REQUESTS = 429
+# Как часто выбрасывать вёдра чатов, которые успели наполниться (неотличимы от новых).
+CHAT_BUCKET_EVICTION_SECONDS = 60
+
+
+class TokenBucket:
+    # Не потокобезопасен — синхронизацию обеспечивает Broadcaster.
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    def reserve(self) -> float:
+        # Забирает токен (при необходимости в долг) и возвращает, сколько секунд подождать перед отправкой.
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+    def is_full(self) -> bool:
+        # Полное ведро ведёт себя как только что созданное — его можно выбросить без потери лимита.
+        return self._tokens + (self._clock() - self._updated) * self.rate >= self.capacity
+
+
+@dataclass
+class BroadcastOutcome:
+    index: int  # позиция сообщения в переданном списке
+    chat_id: int
+    delivered: bool
+    attempts: int
+    error: str | None = None
+    retryable: bool = False  # имеет ли смысл повторить позже (сеть, 429), а не 400/403
+
+
+class Broadcast:
+    # Одна рассылка: исходы по получателям копятся по мере доставки; по завершении пишется сводка в лог.
+    def __init__(self, name: str, total: int, on_complete: Callable[['Broadcast'], None] | None = None):
+        self.name = name
+        self.total = total
+        self.outcomes = []
+        self._on_complete = on_complete
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        if total == 0:
+            self._done.set()
+
+    @property
+    def delivered_count(self) -> int:
+        return sum(1 for x in self.outcomes if x.delivered)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+    def is_done(self) -> bool:
+        return self._done.is_set()
+
+    def _record(self, outcome: BroadcastOutcome):
+        with self._lock:
+            self.outcomes.append(outcome)
+            if len(self.outcomes) < self.total:
+                return
+        failed = [x for x in self.outcomes if not x.delivered]
+        if len(failed) == 0:
+            logging.info(f'Broadcast {self.name}: delivered {self.total}/{self.total}')
+        else:
+            details = ', '.join(f'{x.chat_id}: {x.error}' for x in failed)
+            logging.warning(f'Broadcast {self.name}: delivered {self.total - len(failed)}/{self.total}, '
+                            f'failed: {details}')
+        if self._on_complete is not None:
+            try:
+                self._on_complete(self)
+            except Exception as e:
+                logging.exception(e)
+        self._done.set()
+
+
+class Broadcaster:
+    # Рассылка через ограниченный пул потоков: вызывающий (тик планировщика, обработчик) только ставит
+    # сообщения в очередь и сразу возвращается. Перед каждой отправкой берётся токен из глобального
+    # ведра и ведра чата; ответ 429 приостанавливает все отправки на retry_after. Ошибка одного
+    # получателя (заблокировал бота, не открыл личный чат) не влияет на остальных.
+    def __init__(
+            self,
+            send: Callable[[int, str], object],
+            workers: int = BROADCAST_WORKERS,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = time.sleep,
+    ):
+        self._send = send
+        self._workers = workers
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._executor = None
+        self._global_bucket = TokenBucket(GLOBAL_MESSAGES_PER_SECOND, GLOBAL_MESSAGES_PER_SECOND, clock)
+        self._chat_buckets = {}
+        self._chat_buckets_evicted_at = clock()
+        self._paused_until = 0.0
+        self._active = set()
+
+    def broadcast(
+            self,
+            name: str,
+            messages: list[tuple[int, str]],
+            on_complete: Callable[[Broadcast], None] | None = None,
+    ) -> Broadcast:
+        # on_complete вызывается в потоке пула, когда известны исходы по всем получателям.
+        broadcast = Broadcast(name=name, total=len(messages), on_complete=on_complete)
+        if len(messages) == 0:
+            if on_complete is not None:
+                on_complete(broadcast)
+            return broadcast
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='broadcast')
+            self._active.add(broadcast)
+            executor = self._executor
+        for index, (chat_id, text) in enumerate(messages):
+            executor.submit(self._deliver, broadcast, index, chat_id, text)
+        return broadcast
+
+    def join(self, timeout: float | None = None) -> bool:
+        # Дождаться всех начатых рассылок (для остановки процесса и тестов).
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._lock:
+            active = list(self._active)
+        for broadcast in active:
+            remaining = None if deadline is None else max(0.0, deadline - self._clock())
+            if not broadcast.wait(remaining):
+                return False
+        return True
+
+    def _deliver(self, broadcast: Broadcast, index: int, chat_id: int, text: str):
+        attempts = 0
+        error = None
+        retryable = False
+        while attempts < MAX_ATTEMPTS:
+            attempts += 1
+            self._wait_for_slot(chat_id)
+            try:
+                self._send(chat_id, text)
+                error = None
+                break
+            except ApiTelegramException as e:
+                error = f'{e.error_code} {e.description}'
+                retryable = e.error_code == TOO_MANY_REQUESTS
+                if not retryable:
+                    break  # 400/403: получатель недоступен, повтор не поможет
+                self._pause(get_retry_after(e))
+            except Exception as e:
+                error = repr(e)
+                retryable = True
+                self._sleep(NETWORK_RETRY_SECONDS * attempts)
+        self._finish(broadcast, BroadcastOutcome(
+            index=index,
+            chat_id=chat_id,
+            delivered=error is None,
+            attempts=attempts,
+            error=error,
+            retryable=error is not None and retryable,
+        ))
+
+    def _finish(self, broadcast: Broadcast, outcome: BroadcastOutcome):
+        broadcast._record(outcome)
+        if broadcast.is_done():
+            with self._lock:
+                self._active.discard(broadcast)
+
+    def _wait_for_slot(self, chat_id: int):
+        with self._lock:
+            delay = max(
+                self._get_chat_bucket(chat_id).reserve(),
+                self._global_bucket.reserve(),
+                self._paused_until - self._clock(),
+            )
+        if delay > 0:
+            self._sleep(delay)
+
+    def _pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def _get_chat_bucket(self, chat_id: int) -> TokenBucket:
+        self._evict_full_chat_buckets()
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:  # группы и каналы
+                bucket = TokenBucket(GROUP_CHAT_MESSAGES_PER_MINUTE / 60, GROUP_CHAT_BURST, self._clock)
+            else:
+                bucket = TokenBucket(PRIVATE_CHAT_MESSAGES_PER_SECOND, 1, self._clock)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _evict_full_chat_buckets(self):
+        # Без этого словарь копит ведро на каждый чат, куда бот писал за жизнь процесса.
+        now = self._clock()
+        if now - self._chat_buckets_evicted_at < CHAT_BUCKET_EVICTION_SECONDS:
+            return
+        self._chat_buckets_evicted_at = now
+        for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items() if bucket.is_full()]:
+            del self._chat_buckets[chat_id]
+
+
+def get_retry_after(e: ApiTelegramException) -> float:
+    parameters = (e.result_json or {}).get('parameters') or {}
+    return float(parameters.get('retry_after', 1))
@@ -0,0 +1,53 @@
+import threading
+from typing import Callable
+
+_MISSING = object()
+
+
+class CollectionCache:
+    # Разобранный снимок одной коллекции в памяти процесса. Читатели получают снимок без похода в Mongo,
+    # писатели (методы Database) сбрасывают его через invalidate(). Снимок грузится вне лока, поэтому
+    # долгий find() не блокирует остальные потоки; номер версии защищает от гонки «загрузка vs запись»:
+    # если во время загрузки пришла инвалидация, устаревший результат не попадёт в кэш.
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._value = _MISSING
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self._listeners = []
+
+    @property
+    def version(self) -> int:
+        # Растёт при каждой инвалидации — по нему зависимые структуры понимают, что коллекция менялась.
+        return self._version
+
+    def get(self, loader: Callable):
+        with self._lock:
+            if self._value is not _MISSING:
+                self.hits += 1
+                return self._value
+            self.misses += 1
+            version = self._version
+        value = loader()
+        with self._lock:
+            if self._version == version:
+                self._value = value
+        return value
+
+    def peek(self):
+        # Текущий снимок без загрузки; None, если его нет. Для write-through правок на месте.
+        with self._lock:
+            return None if self._value is _MISSING else self._value
+
+    def subscribe(self, listener: Callable[[], None]):
+        # listener() вызывается после каждой инвалидации в потоке писателя — должен быть быстрым.
+        self._listeners.append(listener)
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._value = _MISSING
+        for listener in self._listeners:
+            listener()
@@ -5,6 +5,22 @@ ENV_MAINTAINER_IDS = 'TELEGRAM_MAINTAINER_IDS'
 ENV_DATABASE_NAME = 'DATABASE_NAME'
 # Токен football-data.org для авто-завершения матчей. Пустой/отсутствует — фича выключена.
 ENV_FOOTBALL_DATA_TOKEN = 'FOOTBALL_DATA_API_TOKEN'
+# Где хранятся ставки: 'embedded' (по умолчанию, массив users.bets) или 'collection' (отдельная коллекция bets
+# с индексами по (user_id, event_uuid) и event_uuid). При первом старте в режиме 'collection' ставки переносятся.
+ENV_BETS_STORAGE = 'BETS_STORAGE'
+BETS_STORAGE_EMBEDDED = 'embedded'
+BETS_STORAGE_COLLECTION = 'collection'
+# Рантайм бота: 'threads' (по умолчанию, infinity_polling + поток планировщика) или 'asyncio' (async_runtime:
+# один event loop для polling и плановых задач, обработчики — в пуле потоков).
+ENV_BOT_RUNTIME = 'BOT_RUNTIME'
+# TTL кэша участия в общем чате (секунды): для участников и для «не участник». Пусто — значения по умолчанию
+# из membership_utils.
+ENV_MEMBERSHIP_TTL = 'MEMBERSHIP_TTL_SECONDS'
+ENV_MEMBERSHIP_NEGATIVE_TTL = 'MEMBERSHIP_NEGATIVE_TTL_SECONDS'
+# Порт локального (127.0.0.1) HTTP-эндпоинта /metrics в текстовом формате Prometheus. Пусто — не поднимается.
+ENV_METRICS_PORT = 'METRICS_PORT'
+BOT_RUNTIME_THREADS = 'threads'
+BOT_RUNTIME_ASYNCIO = 'asyncio'
 
 # Один активный турнир за раз — singleton-документ в коллекции 'tournament'.
 ACTIVE_TOURNAMENT_ID = 'active'
@@ -1,26 +1,90 @@
+import copy
+import logging
 import os
-from datetime import datetime
-from pymongo import MongoClient
+import threading
+from datetime import datetime, timedelta, timezone
+from pymongo import MongoClient, ASCENDING, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from typing import Any
 
 import constants
 import mapper
-from models import Event, Bet, Tournament
+from cache_utils import CollectionCache
+from leaderboard_utils import Leaderboard
+from models import Event, Bet, Tournament, UserModel
+
+# Поля документа пользователя, которые попадают в UserModel. Запись остальных полей (current_event,
+# спецставки) не меняет разобранный снимок users, поэтому кэш из-за неё не сбрасываем.
+USER_MODEL_FIELDS = (
+    'username', 'first_name', 'last_name', 'last_interaction', 'created_at', 'scores', 'bets', 'statistic',
+)
+# Поля, от которых зависит таблица лидеров (имя и очки). Их произвольная запись сбрасывает Leaderboard.
+LEADERBOARD_FIELDS = ('first_name', 'last_name', 'scores')
+# Маркер в joker_reminders: перенос ставок из users.bets в коллекцию bets уже выполнен.
+BETS_MIGRATION_MARKER = 'migration:bets_to_collection'
+# Маркер в joker_reminders: users.statistic собрана по всем завершённым матчам.
+USER_STATISTIC_MARKER = 'migration:user_statistic'
+# Статусы: сообщения в outbox и напоминания в joker_reminders, поставленного через outbox.
+OUTBOX_PENDING = 'pending'
+OUTBOX_SENT = 'sent'
+OUTBOX_FAILED = 'failed'
+REMINDER_QUEUED = 'queued'
+REMINDER_SENT = 'sent'
+# Код OperationFailure, которым standalone-mongod отвечает на попытку открыть транзакцию.
+ILLEGAL_OPERATION_CODE = 20
+
+# Индексы, которые ensure_indexes поднимает на каждом старте: (коллекция, ключи, опции create_index).
+# joker_reminders и tournament ищутся только по _id — им хватает встроенного индекса.
+INDEXES = (
+    ('events', [('uuid', ASCENDING)], {'name': 'uuid_unique', 'unique': True}),
+    ('events', [('team_1', ASCENDING), ('team_2', ASCENDING), ('time', ASCENDING)],
+     {'name': 'teams_time_unique', 'unique': True}),
+    ('events', [('time', ASCENDING)], {'name': 'time'}),
+    ('outbox', [('status', ASCENDING), ('next_attempt_at', ASCENDING)], {'name': 'status_next_attempt'}),
+    ('outbox', [('key', ASCENDING), ('status', ASCENDING)], {'name': 'key_status'}),
+)
+# Зависят от режима хранения ставок (BETS_STORAGE).
+EMBEDDED_BETS_INDEXES = (
+    ('users', [('bets.event_uuid', ASCENDING)], {'name': 'bets_event_uuid'}),
+)
+COLLECTION_BETS_INDEXES = (
+    ('bets', [('user_id', ASCENDING), ('event_uuid', ASCENDING)], {'name': 'user_event_unique', 'unique': True}),
+    ('bets', [('event_uuid', ASCENDING)], {'name': 'event_uuid'}),
+)
 
 
 # Полностью дропнуть БД перед стартом нового турнира: mongosh --eval 'db.getSiblingDB("totalizator").dropDatabase()'
 
 class Database:
-    def __init__(self):
-        self.client = MongoClient('localhost', 27017)
+    def __init__(self, event_listeners: list | None = None):
+        # event_listeners — слушатели команд pymongo (metrics_utils.DbCommandCounter).
+        self.client = MongoClient('localhost', 27017, event_listeners=event_listeners or [])
         self.db = self.client[os.environ[constants.ENV_DATABASE_NAME]]
         self.user_collection = self.db['users']
         self.event_collection = self.db['events']
         self.reminder_collection = self.db['joker_reminders']
         self.tournament_collection = self.db['tournament']
+        self.bet_collection = self.db['bets']
+        self.outbox_collection = self.db['outbox']
+        bets_storage = os.environ.get(constants.ENV_BETS_STORAGE, '').strip() or constants.BETS_STORAGE_EMBEDDED
+        if bets_storage not in (constants.BETS_STORAGE_EMBEDDED, constants.BETS_STORAGE_COLLECTION):
+            raise ValueError(f'Unknown {constants.ENV_BETS_STORAGE} value: {bets_storage}')
+        self.bets_in_collection = bets_storage == constants.BETS_STORAGE_COLLECTION
+        # Write-through кэш полных выборок: почти каждый обработчик по нескольку раз зовёт
+        # get_all_events/get_all_users. Все записи идут через методы ниже и сбрасывают свою коллекцию.
+        self.events_cache = CollectionCache('events')
+        self.users_cache = CollectionCache('users')
+        self.tournament_cache = CollectionCache('tournament')
+        # Материализованная таблица лидеров: строится из снимка users один раз, дальше очки правятся
+        # точечно при начислениях. None — не построена или сброшена; читается и меняется под локом.
+        self._leaderboard = None
+        self._leaderboard_lock = threading.Lock()
+
+    # Каждая операция над пользователем — один запрос с проекцией. «Пользователь не найден»
+    # определяется по самому результату (None / matched_count == 0), без предварительного find_one.
 
     def check_if_user_exists(self, user_id: int, raise_error: bool = False) -> bool:
-        result = self.get_user(user_id=user_id)
+        result = self.user_collection.find_one({'_id': user_id}, {'_id': 1})
         if result is None and raise_error:
             raise ValueError(f'User with ID={user_id} does not exist')
         return result is not None
@@ -31,8 +95,19 @@ class Database:
             raise ValueError(f'Event does not exist')
         return result is not None
 
-    def get_all_users(self):
+    def get_all_users(self) -> list[UserModel]:
+        # UserModel из снимка общие для всех потоков — только для чтения, менять через методы Database.
+        return list(self.users_cache.get(self._load_all_users))
+
+    def _load_all_users(self) -> list[UserModel]:
         result = list(self.user_collection.find())
+        if self.bets_in_collection:
+            # UserModel.bets собираем из коллекции bets одним запросом, а не из устаревшего users.bets.
+            bets_by_user = {}
+            for bet_dict in self.bet_collection.find():
+                bets_by_user.setdefault(bet_dict['user_id'], []).append(bet_dict)
+            for user_dict in result:
+                user_dict['bets'] = bets_by_user.get(user_dict['_id'], [])
         result = list(map(lambda x: mapper.parse_user(x), result))
         result.sort(key=lambda x: x.scores, reverse=True)
         return result
@@ -47,89 +122,374 @@ class Database:
             first_name: str,
             last_name: str,
     ) -> bool:
-        if self.check_if_user_exists(user_id=user_id, raise_error=False):
-            # Trying to insert record with _id that already contains in database will raise Error
-            return False
-
+        # Один upsert вместо find_one + insert_one: поля пишутся только при вставке, существующий
+        # пользователь не меняется. Заодно нет гонки двух первых нажатий одного пользователя.
+        now = datetime.now()
         user_dict = {
-            '_id': user_id,
             'username': username,
             'first_name': first_name,
             'last_name': last_name,
-            'last_interaction': datetime.now(),
-            'created_at': datetime.now(),
+            'last_interaction': now,
+            'created_at': now,
             'scores': 0,
             'bets': [],
         }
-        self.user_collection.insert_one(user_dict)
+        result = self.user_collection.update_one({'_id': user_id}, {'$setOnInsert': user_dict}, upsert=True)
+        if result.upserted_id is None:
+            return False
+        self.users_cache.invalidate()
+        user_dict['_id'] = user_id
+        user_model = mapper.parse_user(user_dict)
+        self._update_leaderboard(lambda x: x.upsert(user_id=user_id, name=user_model.get_full_name(), score=0))
         return True
 
     def get_user_last_interaction(self, user_id: int) -> datetime:
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
         return self.get_user_attribute(user_id, "last_interaction")
 
     def update_last_interaction(self, user_id: int):
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
-        self.set_user_attribute(user_id=user_id, key='last_interaction', value=datetime.now())
+        now = datetime.now()
+        result = self.user_collection.update_one({'_id': user_id}, {'$set': {'last_interaction': now}})
+        _raise_if_user_not_matched(user_id, result)
+        # Пишется на каждое нажатие кнопки: правим снимок на месте, а не сбрасываем весь кэш users.
+        users = self.users_cache.peek()
+        if users is not None:
+            user_model = next((x for x in users if x.id == user_id), None)
+            if user_model is not None:
+                user_model.last_interaction = now
+
+    def update_last_interactions(self, interactions: dict[int, datetime]):
+        # Пачка от InteractionTracker — один bulk_write. $max: запоздавший сброс не откатит более
+        # свежее значение, записанное другим путём (регистрация, update_last_interaction).
+        if len(interactions) == 0:
+            return
+        self.user_collection.bulk_write(
+            [UpdateOne({'_id': user_id}, {'$max': {'last_interaction': moment}})
+             for user_id, moment in interactions.items()],
+            ordered=False,
+        )
+        users = self.users_cache.peek()
+        if users is not None:
+            for user_model in users:
+                moment = interactions.get(user_model.id)
+                if moment is not None:
+                    user_model.last_interaction = moment
 
     def get_user_scores(self, user_id: int) -> int:
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
         return self.get_user_attribute(user_id=user_id, key='scores')
 
     def add_scores_to_user(self, user_id: int, amount: int):
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
-        current_value = self.get_user_attribute(user_id=user_id, key='scores')
-        new_value = max(current_value + amount, 0)
-        self.set_user_attribute(user_id=user_id, key='scores', value=new_value)
+        # Update-пайплайн: сложение и отсечение по нулю выполняются на стороне Mongo одной атомарной записью.
+        # Новое значение возвращается тем же запросом — по нему правим таблицу лидеров.
+        user_dict = self.user_collection.find_one_and_update(
+            {'_id': user_id},
+            [{'$set': {'scores': {'$max': [{'$add': ['$scores', amount]}, 0]}}}],
+            projection={'scores': 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        self.users_cache.invalidate()
+        if user_dict is None:
+            raise ValueError(f'User with ID={user_id} does not exist')
+        self._update_leaderboard(lambda x: x.set_score(user_id=user_id, score=user_dict['scores']))
+
+    def settle_event(
+            self,
+            event: Event,
+            scores_by_user: dict[int, int],
+            statistic_by_user: dict[int, dict[str, int]] | None = None,
+    ) -> bool:
+        # Результат матча и все начисления за него (очки и счётчики users.statistic) — одной multi-document
+        # транзакцией: читатели видят лидерборд либо до матча, либо после, но не наполовину посчитанный.
+        # Standalone-Mongo транзакций не умеет — тогда те же записи по очереди: сначала начисления
+        # (идемпотентно по settled_events), затем результат, так что прерванный расчёт можно повторить.
+        # False — матч уже был завершён.
+        try:
+            with self.client.start_session() as session:
+                settled = session.with_transaction(
+                    lambda s: self._settle_event(event, scores_by_user, statistic_by_user or {}, session=s)
+                )
+        except OperationFailure as e:
+            if e.code != ILLEGAL_OPERATION_CODE:
+                raise
+            logging.warning(f'Transactions are not supported, settling event {event.uuid} without one: {e}')
+            settled = self._settle_event(event, scores_by_user, statistic_by_user or {}, session=None)
+        # Сбрасываем только после коммита: иначе параллельный читатель успеет закэшировать старый снимок.
+        self.events_cache.invalidate()
+        self.users_cache.invalidate()
+        if settled and len(scores_by_user) > 0:
+            # Итоговые очки затронутых участников — одним запросом; абсолютные значения, а не дельты,
+            # остаются верными и после частично выполненного ранее расчёта.
+            new_scores = {
+                x['_id']: x['scores']
+                for x in self.user_collection.find({'_id': {'$in': list(scores_by_user)}}, {'scores': 1})
+            }
+            self._update_leaderboard(lambda x: _set_leaderboard_scores(x, new_scores))
+        return settled
+
+    def _settle_event(
+            self,
+            event: Event,
+            scores_by_user: dict[int, int],
+            statistic_by_user: dict[int, dict[str, int]],
+            session,
+    ) -> bool:
+        # Маркер settled_events в том же атомарном обновлении документа делает начисление идемпотентным
+        # по (event_uuid, user_id): уже получившие очки участники не совпадут с фильтром.
+        operations = []
+        for user_id in scores_by_user.keys() | statistic_by_user.keys():
+            increments = {f'statistic.{key}': value for key, value in statistic_by_user.get(user_id, {}).items()}
+            if scores_by_user.get(user_id, 0) != 0:
+                increments['scores'] = scores_by_user[user_id]
+            if len(increments) == 0:
+                continue
+            operations.append(UpdateOne(
+                {'_id': user_id, 'settled_events': {'$ne': event.uuid}},
+                {'$inc': increments, '$push': {'settled_events': event.uuid}},
+            ))
+        if len(operations) > 0:
+            self.user_collection.bulk_write(operations, ordered=False, session=session)
+        # У незавершённого матча result — пустой документ (см. mapper.event_to_dict).
+        result = self.event_collection.update_one(
+            {'uuid': event.uuid, 'result': {'$in': [None, {}]}},
+            {'$set': mapper.event_to_dict(event)},
+            session=session,
+        )
+        return result.matched_count == 1
+
+    # Ставки меняются одним запросом с операторами массивов ($push/$pull/bets.$/arrayFilters), без
+    # чтения и перезаписи всего bets: так не гоняем массив туда-обратно и не теряем параллельные записи
+    # из потока telebot и потока планировщика. В режиме BETS_STORAGE=collection ставка — отдельный
+    # документ коллекции bets, уникальный по (user_id, event_uuid).
 
     def add_bet(self, user_id: int, bet: Bet):
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
         bet_dict = mapper.bet_to_dict(bet)
-        current_bets = self.get_user_attribute(user_id=user_id, key='bets')
-        current_bets.append(bet_dict)
-        self.set_user_attribute(user_id=user_id, key='bets', value=current_bets)
+        if self.bets_in_collection:
+            try:
+                self.bet_collection.insert_one(bet_dict)
+            except DuplicateKeyError:
+                raise ValueError('Bet already exists')
+            finally:
+                self.users_cache.invalidate()
+            return
+        result = self.user_collection.update_one(
+            {'_id': user_id, 'bets.event_uuid': {'$ne': bet.event_uuid}},
+            {'$push': {'bets': bet_dict}},
+        )
+        self.users_cache.invalidate()
+        if result.matched_count == 0:
+            self.check_if_user_exists(user_id=user_id, raise_error=True)
+            raise ValueError('Bet already exists')
 
     def update_bet(self, user_id: int, bet: Bet):
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
-        existing_bet = self.find_bet(user_id=user_id, event_uuid=bet.event_uuid)
-        if existing_bet is None:
-            raise ValueError('Unable to update bet as it does not exist')
         new_bet_dict = mapper.bet_to_dict(bet)
-        current_bets = self.get_user_attribute(user_id=user_id, key='bets')
-        for i, bet in enumerate(current_bets):
-            if bet['event_uuid'] == new_bet_dict['event_uuid']:
-                current_bets[i] = new_bet_dict
-                break
-        self.set_user_attribute(user_id=user_id, key='bets', value=current_bets)
+        if self.bets_in_collection:
+            result = self.bet_collection.update_one(
+                {'user_id': user_id, 'event_uuid': bet.event_uuid},
+                {'$set': new_bet_dict},
+            )
+        else:
+            result = self.user_collection.update_one(
+                {'_id': user_id, 'bets.event_uuid': bet.event_uuid},
+                {'$set': {'bets.$': new_bet_dict}},
+            )
+        self.users_cache.invalidate()
+        if result.matched_count == 0:
+            raise ValueError('Unable to update bet as it does not exist')
+
+    def set_bet_attribute(self, user_id: int, event_uuid: str, key: str, value: Any):
+        # Правка одного поля ставки: параллельная правка другого поля той же ставки не затирается.
+        if self.bets_in_collection:
+            result = self.bet_collection.update_one(
+                {'user_id': user_id, 'event_uuid': event_uuid},
+                {'$set': {key: value}},
+            )
+        else:
+            result = self.user_collection.update_one(
+                {'_id': user_id, 'bets.event_uuid': event_uuid},
+                {'$set': {f'bets.$.{key}': value}},
+            )
+        self.users_cache.invalidate()
+        if result.matched_count == 0:
+            raise ValueError('Unable to update bet as it does not exist')
+
+    def set_bet_joker(self, user_id: int, event_uuid: str, is_joker: bool) -> bool:
+        # Условная запись: меняем флаг, только если он ещё не такой. False — ставки нет
+        # или флаг уже выставлен параллельным запросом (повторное нажатие кнопки).
+        if self.bets_in_collection:
+            result = self.bet_collection.update_one(
+                {'user_id': user_id, 'event_uuid': event_uuid, 'is_joker': {'$ne': is_joker}},
+                {'$set': {'is_joker': is_joker}},
+            )
+        else:
+            result = self.user_collection.update_one(
+                {'_id': user_id},
+                {'$set': {'bets.$[bet].is_joker': is_joker}},
+                array_filters=[{'bet.event_uuid': event_uuid, 'bet.is_joker': {'$ne': is_joker}}],
+            )
+        self.users_cache.invalidate()
+        return result.modified_count == 1
 
     def delete_bet(self, user_id: int, event_uuid: str):
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
-        current_bets = self.get_user_attribute(user_id=user_id, key='bets')
-        new_bets = [x for x in current_bets if x['event_uuid'] != event_uuid]
-        self.set_user_attribute(user_id=user_id, key='bets', value=new_bets)
+        if self.bets_in_collection:
+            self.bet_collection.delete_one({'user_id': user_id, 'event_uuid': event_uuid})
+            self.users_cache.invalidate()
+            return
+        result = self.user_collection.update_one(
+            {'_id': user_id},
+            {'$pull': {'bets': {'event_uuid': event_uuid}}},
+        )
+        self.users_cache.invalidate()
+        _raise_if_user_not_matched(user_id, result)
 
     def get_all_user_bets(self, user_id: int) -> list:
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
-        result = self.get_user_attribute(user_id=user_id, key='bets')
+        if self.bets_in_collection:
+            result = list(self.bet_collection.find({'user_id': user_id}))
+        else:
+            result = self.get_user_attribute(user_id=user_id, key='bets')
         result = list(map(lambda x: mapper.parse_bet(x), result))
         result.sort(key=lambda x: x.created_at, reverse=False)
         return result
 
     def find_bet(self, user_id: int, event_uuid: str) -> Bet | None:
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
-        all_bets = self.get_all_user_bets(user_id=user_id)
-        return next((bet for bet in all_bets if bet.event_uuid == event_uuid), None)
+        if self.bets_in_collection:
+            bet_dict = self.bet_collection.find_one({'user_id': user_id, 'event_uuid': event_uuid})
+            return mapper.parse_bet(bet_dict) if bet_dict is not None else None
+        # $elemMatch в проекции: Mongo отдаёт только нужную ставку, а не весь массив bets.
+        user_dict = self.user_collection.find_one(
+            {'_id': user_id},
+            {'bets': {'$elemMatch': {'event_uuid': event_uuid}}},
+        )
+        if user_dict is None:
+            raise ValueError(f'User with ID={user_id} does not exist')
+        bets = user_dict.get('bets') or []
+        if len(bets) == 0:
+            return None
+        return mapper.parse_bet(bets[0])
+
+    def get_bets_for_event(self, event_uuid: str) -> list[Bet]:
+        return self.get_bets_for_events([event_uuid])[event_uuid]
+
+    def get_bets_for_events(self, event_uuids: list[str]) -> dict[str, list[Bet]]:
+        # Все ставки на набор матчей одним запросом: {event_uuid: [Bet]} (ключ есть у каждого uuid).
+        result = {event_uuid: [] for event_uuid in event_uuids}
+        if len(result) == 0:
+            return result
+        uuids = list(result.keys())
+        if self.bets_in_collection:
+            bet_dicts = self.bet_collection.find({'event_uuid': {'$in': uuids}})
+        else:
+            bet_dicts = self.user_collection.aggregate([
+                {'$match': {'bets.event_uuid': {'$in': uuids}}},
+                {'$unwind': '$bets'},
+                {'$match': {'bets.event_uuid': {'$in': uuids}}},
+                {'$replaceRoot': {'newRoot': '$bets'}},
+            ])
+        for bet_dict in bet_dicts:
+            result[bet_dict['event_uuid']].append(mapper.parse_bet(bet_dict))
+        return result
+
+    def get_user_ids_without_bets(self, event_uuids: list[str]) -> dict[str, set[int]]:
+        # Для напоминаний перед матчами: {event_uuid: id участников без ставки} (ключ есть у каждого uuid).
+        # Одна агрегация по users независимо от числа участников и матчей; из базы приходят только id.
+        result = {event_uuid: set() for event_uuid in event_uuids}
+        if len(result) == 0:
+            return result
+        uuids = list(result.keys())
+        pipeline = []
+        if self.bets_in_collection:
+            pipeline.append({'$lookup': {
+                'from': 'bets',
+                'localField': '_id',
+                'foreignField': 'user_id',
+                'pipeline': [{'$match': {'event_uuid': {'$in': uuids}}}, {'$project': {'_id': 0, 'event_uuid': 1}}],
+                'as': 'bets',
+            }})
+        pipeline += [
+            {'$project': {'missing': {'$setDifference': [uuids, {'$ifNull': ['$bets.event_uuid', []]}]}}},
+            {'$unwind': '$missing'},
+            {'$group': {'_id': '$missing', 'user_ids': {'$addToSet': '$_id'}}},
+        ]
+        for group in self.user_collection.aggregate(pipeline):
+            result[group['_id']] = set(group['user_ids'])
+        return result
+
+    def ensure_bets_storage(self):
+        # Вызывается один раз при старте бота, после ensure_indexes. В режиме collection однократно
+        # переносит ставки из users.bets в коллекцию bets. Массивы users.bets не трогаем:
+        # это позволяет откатиться на embedded, но ставки, сделанные после переключения, там не появятся.
+        if not self.bets_in_collection:
+            return
+        if self.reminder_collection.find_one({'_id': BETS_MIGRATION_MARKER}) is not None:
+            return
+        migrated = self.migrate_embedded_bets()
+        self.reminder_collection.update_one(
+            {'_id': BETS_MIGRATION_MARKER},
+            {'$setOnInsert': {'sent_at': datetime.now(), 'migrated_bets': migrated}},
+            upsert=True,
+        )
+
+    def migrate_embedded_bets(self) -> int:
+        # Идемпотентно: upsert по (user_id, event_uuid) с $setOnInsert не перезапишет ставку,
+        # уже изменённую в новой коллекции, поэтому прерванный перенос можно просто запустить снова.
+        operations = []
+        for user_dict in self.user_collection.find({'bets.0': {'$exists': True}}, {'bets': 1}):
+            for bet_dict in user_dict['bets']:
+                bet = mapper.parse_bet(bet_dict)
+                bet.user_id = user_dict['_id']  # владелец — документ, в котором лежала ставка
+                operations.append(UpdateOne(
+                    {'user_id': bet.user_id, 'event_uuid': bet.event_uuid},
+                    {'$setOnInsert': mapper.bet_to_dict(bet)},
+                    upsert=True,
+                ))
+        if len(operations) > 0:
+            self.bet_collection.bulk_write(operations, ordered=False)
+        self.users_cache.invalidate()
+        return len(operations)
+
+    # --- Индексы -------------------------------------------------------------------
+
+    def ensure_indexes(self):
+        # Идемпотентно: create_index для уже существующего индекса с теми же ключами и опциями — no-op.
+        # Ошибка одного индекса (например, дубли в данных мешают unique) не должна мешать старту бота.
+        bets_indexes = COLLECTION_BETS_INDEXES if self.bets_in_collection else EMBEDDED_BETS_INDEXES
+        for collection_name, keys, options in INDEXES + bets_indexes:
+            try:
+                self.db[collection_name].create_index(keys, **options)
+            except OperationFailure as e:
+                logging.error(f'Cannot create index {options["name"]} on {collection_name}: {e}')
+
+    def log_query_plans(self):
+        # Планы горячих запросов в лог при старте: в проде видно, что они идут через IXSCAN, а не COLLSCAN.
+        now = datetime.now(timezone.utc)
+        queries = [
+            ('events', {'uuid': ''}),
+            ('events', {'team_1': '', 'team_2': '', 'time': now}),
+            ('events', {'time': {'$gte': now, '$lt': now + timedelta(days=1)}}),
+        ]
+        if self.bets_in_collection:
+            queries.append(('bets', {'event_uuid': {'$in': ['']}}))
+            queries.append(('bets', {'user_id': 0, 'event_uuid': ''}))
+        else:
+            queries.append(('users', {'bets.event_uuid': {'$in': ['']}}))
+        for collection_name, query in queries:
+            try:
+                explain = self.db[collection_name].find(query).explain()
+            except OperationFailure as e:
+                logging.warning(f'Cannot explain query on {collection_name}: {e}')
+                continue
+            stats = explain.get('executionStats', {})
+            logging.info(f'Query plan {collection_name} {list(query.keys())}: '
+                         f'{" <- ".join(_plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {})))}, '
+                         f'docsExamined={stats.get("totalDocsExamined")}, '
+                         f'keysExamined={stats.get("totalKeysExamined")}, '
+                         f'timeMs={stats.get("executionTimeMillis")}')
 
     def get_current_event_for_user(self, user_id: int) -> str | None:
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
         return self.get_user_attribute(user_id=user_id, key='current_event')
 
     def save_current_event_to_user(self, user_id: int, event_uuid: str):
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
         self.set_user_attribute(user_id=user_id, key='current_event', value=event_uuid)
 
     def clear_current_event_for_user(self, user_id: int):
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
         self.delete_user_attribute(user_id=user_id, key='current_event')
 
     def add_event(self, event: Event):
@@ -138,35 +498,38 @@ class Database:
             raise ValueError('Event already exists')
         event_dict = mapper.event_to_dict(event)
         self.event_collection.insert_one(event_dict)
+        self.events_cache.invalidate()
+
+    # Читатели матчей отдают копии Event: вызывающие правят их (event.result = ...) перед update_event,
+    # и такая правка не должна просочиться в общий снимок до записи в базу.
 
     def get_all_events(self) -> list:
+        return [copy.copy(x) for x in self.events_cache.get(self._load_all_events)]
+
+    def _load_all_events(self) -> list:
         result = list(self.event_collection.find())
         result = list(map(lambda x: mapper.parse_event(x), result))
         result.sort(key=lambda x: x.time, reverse=False)
         return result
 
     def get_event_by_uuid(self, uuid: str) -> Event | None:
-        event_dict = self.event_collection.find_one({'uuid': uuid})
-        if event_dict:
-            return mapper.parse_event(event_dict=dict(event_dict))
-        return None
+        event = next((x for x in self.events_cache.get(self._load_all_events) if x.uuid == uuid), None)
+        return copy.copy(event) if event is not None else None
 
     def find_event(self, team_1: str, team_2: str, time: datetime) -> Event | None:
-        event_dict = self.event_collection.find_one({'team_1': team_1, 'team_2': team_2, 'time': time})
-        if event_dict:
-            return mapper.parse_event(event_dict=dict(event_dict))
-        return None
+        # В базе время наивное UTC с точностью до миллисекунд, на входе бывает aware —
+        # сравниваем моменты так же, как сравнил бы запрос к Mongo.
+        instant = _as_utc(time)
+        instant = instant.replace(microsecond=instant.microsecond // 1000 * 1000)
+        event = next((x for x in self.events_cache.get(self._load_all_events)
+                      if x.team_1 == team_1 and x.team_2 == team_2 and x.get_time_in_utc() == instant), None)
+        return copy.copy(event) if event is not None else None
 
     def find_events_in_time_range(self, from_inclusive: datetime, to_exclusive: datetime) -> list:
-        result = list(self.event_collection.find({
-            'time': {
-                "$gte": from_inclusive,
-                "$lt": to_exclusive
-            }
-        }))
-        result = list(map(lambda x: mapper.parse_event(x), result))
-        result.sort(key=lambda x: x.time, reverse=False)
-        return result
+        from_instant = _as_utc(from_inclusive)
+        to_instant = _as_utc(to_exclusive)
+        return [copy.copy(x) for x in self.events_cache.get(self._load_all_events)
+                if from_instant <= x.get_time_in_utc() < to_instant]
 
     def update_event(self, event: Event):
         self.check_if_event_exists(uuid=event.uuid, raise_error=True)
@@ -175,21 +538,74 @@ class Database:
             {'uuid': event.uuid},
             {'$set': event_dict}
         )
+        self.events_cache.invalidate()
 
     def get_user_attribute(self, user_id: int, key: str):
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
-        user_dict = self.user_collection.find_one({'_id': user_id})
+        user_dict = self.user_collection.find_one({'_id': user_id}, {key: 1})
+        if user_dict is None:
+            raise ValueError(f'User with ID={user_id} does not exist')
         if key not in user_dict:
             return None
         return user_dict[key]
 
     def set_user_attribute(self, user_id: int, key: str, value: Any):
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
-        self.user_collection.update_one({'_id': user_id}, {'$set': {key: value}})
+        result = self.user_collection.update_one({'_id': user_id}, {'$set': {key: value}})
+        self._invalidate_users_if_model_field(key)
+        _raise_if_user_not_matched(user_id, result)
 
     def delete_user_attribute(self, user_id: int, key: str):
-        self.check_if_user_exists(user_id=user_id, raise_error=True)
-        self.user_collection.update_one({'_id': user_id}, {'$unset': {key: ''}})
+        result = self.user_collection.update_one({'_id': user_id}, {'$unset': {key: ''}})
+        self._invalidate_users_if_model_field(key)
+        _raise_if_user_not_matched(user_id, result)
+
+    def _invalidate_users_if_model_field(self, key: str):
+        if key in USER_MODEL_FIELDS:
+            self.users_cache.invalidate()
+        if key in LEADERBOARD_FIELDS:
+            with self._leaderboard_lock:
+                self._leaderboard = None
+
+    # --- Статистика участников ----------------------------------------------------
+
+    def is_users_statistic_built(self) -> bool:
+        return self.reminder_collection.find_one({'_id': USER_STATISTIC_MARKER}) is not None
+
+    def replace_users_statistic(self, statistic_by_user: dict[int, dict[str, int]]):
+        # Полная перезапись users.statistic одним bulk_write (пересборка по всем завершённым матчам).
+        # Участники без ставок на завершённые матчи получают пустые счётчики.
+        operations = [
+            UpdateOne({'_id': user_id}, {'$set': {'statistic': statistic}})
+            for user_id, statistic in statistic_by_user.items()
+        ]
+        operations.append(UpdateMany({'_id': {'$nin': list(statistic_by_user)}}, {'$set': {'statistic': {}}}))
+        self.user_collection.bulk_write(operations, ordered=False)
+        self.users_cache.invalidate()
+        self.reminder_collection.update_one(
+            {'_id': USER_STATISTIC_MARKER},
+            {'$set': {'sent_at': datetime.now()}},
+            upsert=True,
+        )
+
+    # --- Таблица лидеров -----------------------------------------------------------
+
+    def get_leaderboard_snapshot(self, limit: int | None = None) -> dict[int, dict]:
+        # {user_id: {name, score, rank}} в порядке таблицы; первые limit строк — за O(limit).
+        return self._read_leaderboard(lambda x: x.snapshot(limit=limit))
+
+    def get_leaderboard_rank(self, user_id: int) -> int | None:
+        return self._read_leaderboard(lambda x: x.get_rank(user_id))
+
+    def _read_leaderboard(self, reader):
+        with self._leaderboard_lock:
+            if self._leaderboard is None:
+                self._leaderboard = Leaderboard.from_users(self.get_all_users())
+            return reader(self._leaderboard)
+
+    def _update_leaderboard(self, updater):
+        # Таблицы ещё нет — править нечего, она соберётся из свежего снимка users при первом чтении.
+        with self._leaderboard_lock:
+            if self._leaderboard is not None:
+                updater(self._leaderboard)
 
     def claim_reminder(self, key: str) -> bool:
         # Атомарно "застолбить" разовое напоминание по ключу. Возвращает True только первому вызывающему.
@@ -201,9 +617,100 @@ class Database:
         )
         return result.upserted_id is not None
 
+    def is_reminder_claimed(self, key: str) -> bool:
+        return self.reminder_collection.find_one({'_id': key}, {'_id': 1}) is not None
+
+    # --- Outbox плановых уведомлений -----------------------------------------------
+    # Сообщение в outbox — документ с ключом идемпотентности '<ключ напоминания>:<chat_id>'.
+    # Диспетчер (outbox_utils.drain_outbox) доставляет их как минимум один раз; напоминание
+    # в joker_reminders переходит в sent только когда у ключа не осталось недоставленных сообщений.
+
+    def enqueue_reminder(self, key: str, messages: list[tuple[int, str]]) -> bool:
+        # Сначала сообщения, потом ключ: упав между шагами, следующий тик поставит те же сообщения
+        # повторно, а $setOnInsert по _id не создаст дублей. True — ключ застолбили этим вызовом.
+        now = datetime.now()
+        operations = [
+            UpdateOne(
+                {'_id': f'{key}:{chat_id}'},
+                {'$setOnInsert': {
+                    'key': key,
+                    'chat_id': chat_id,
+                    'text': text,
+                    'status': OUTBOX_PENDING,
+                    'attempts': 0,
+                    'next_attempt_at': now,
+                    'created_at': now,
+                }},
+                upsert=True,
+            )
+            for chat_id, text in messages
+        ]
+        if len(operations) > 0:
+            self.outbox_collection.bulk_write(operations, ordered=False)
+            reminder = {'status': REMINDER_QUEUED, 'queued_at': now}
+        else:
+            reminder = {'status': REMINDER_SENT, 'queued_at': now, 'sent_at': now}
+        result = self.reminder_collection.update_one({'_id': key}, {'$setOnInsert': reminder}, upsert=True)
+        return result.upserted_id is not None
+
+    def lease_due_outbox_messages(self, limit: int, lease: timedelta) -> list[dict]:
+        # Забрать пачку сообщений к отправке и отодвинуть их next_attempt_at на время аренды: пока идёт
+        # доставка, следующий проход их не возьмёт, а после падения процесса они вернутся сами.
+        # Каждое сообщение арендуется своим find_one_and_update: поиск и сдвиг атомарны, поэтому два
+        # диспетчера (пересекающиеся drain_outbox или второй процесс) не заберут одно сообщение дважды.
+        now = datetime.now()
+        messages = []
+        while len(messages) < limit:
+            message = self.outbox_collection.find_one_and_update(
+                {'status': OUTBOX_PENDING, 'next_attempt_at': {'$lte': now}},
+                {'$set': {'next_attempt_at': now + lease}},
+                sort=[('next_attempt_at', ASCENDING)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if message is None:
+                break
+            messages.append(message)
+        return messages
+
+    def mark_outbox_delivered(self, message_ids: list[str]):
+        if len(message_ids) == 0:
+            return
+        self.outbox_collection.update_many(
+            {'_id': {'$in': message_ids}},
+            {'$set': {'status': OUTBOX_SENT, 'sent_at': datetime.now()}, '$inc': {'attempts': 1}},
+        )
+
+    def record_outbox_failure(self, message_id: str, error: str, next_attempt_at: datetime | None):
+        # next_attempt_at=None — больше не пытаемся (получатель недоступен или исчерпаны попытки).
+        update = {'last_error': error}
+        if next_attempt_at is None:
+            update['status'] = OUTBOX_FAILED
+        else:
+            update['next_attempt_at'] = next_attempt_at
+        self.outbox_collection.update_one({'_id': message_id}, {'$set': update, '$inc': {'attempts': 1}})
+
+    def complete_reminders(self, keys: list[str]) -> list[str]:
+        # Отметить доставленными напоминания, у которых не осталось сообщений в ожидании.
+        completed = []
+        for key in keys:
+            if self.outbox_collection.find_one({'key': key, 'status': OUTBOX_PENDING}, {'_id': 1}) is not None:
+                continue
+            result = self.reminder_collection.update_one(
+                {'_id': key, 'status': REMINDER_QUEUED},
+                {'$set': {'status': REMINDER_SENT, 'sent_at': datetime.now()}},
+            )
+            if result.modified_count == 1:
+                completed.append(key)
+        return completed
+
     # --- Структура турнира (singleton-документ для спецставок) --------------------
 
     def get_tournament(self) -> Tournament | None:
+        # Копия по той же причине, что у матчей; group_winners/groups вызывающие не правят.
+        tournament = self.tournament_cache.get(self._load_tournament)
+        return copy.copy(tournament) if tournament is not None else None
+
+    def _load_tournament(self) -> Tournament | None:
         tournament_dict = self.tournament_collection.find_one({'_id': constants.ACTIVE_TOURNAMENT_ID})
         if tournament_dict:
             return mapper.parse_tournament(dict(tournament_dict))
@@ -220,12 +727,14 @@ class Database:
             tournament_dict,
             upsert=True,
         )
+        self.tournament_cache.invalidate()
 
     def set_tournament_attribute(self, key: str, value: Any):
         self.tournament_collection.update_one(
             {'_id': constants.ACTIVE_TOURNAMENT_ID},
             {'$set': {key: value}},
         )
+        self.tournament_cache.invalidate()
 
     def set_champion_bet_open(self, is_open: bool):
         self.set_tournament_attribute('champion_bet_open', is_open)
@@ -261,10 +770,48 @@ class Database:
         return self.get_user_attribute(user_id=user_id, key='group_champion_bets') or {}
 
     def set_group_champion_bet(self, user_id: int, group_id: str, team: str):
-        # Read-modify-write словаря, как add_bet для массива bets.
+        # Точечный $set ключа словаря (id группы — обычно буква), без чтения всего словаря.
+        # Id с точкой или '$' в путь поля не подставить — для них прежний read-modify-write.
+        if '.' not in group_id and not group_id.startswith('$'):
+            self.set_user_attribute(user_id=user_id, key=f'group_champion_bets.{group_id}', value=team)
+            return
         current = self.get_user_attribute(user_id=user_id, key='group_champion_bets') or {}
         current[group_id] = team
         self.set_user_attribute(user_id=user_id, key='group_champion_bets', value=current)
 
     def clear_group_champion_bets(self, user_id: int):
         self.delete_user_attribute(user_id=user_id, key='group_champion_bets')
+
+
+def _raise_if_user_not_matched(user_id: int, result):
+    if result.matched_count == 0:
+        raise ValueError(f'User with ID={user_id} does not exist')
+
+
+def _plan_stages(plan: dict) -> list[str]:
+    # Стадии выигравшего плана сверху вниз: ['FETCH', 'IXSCAN uuid_unique']. В новых версиях Mongo
+    # (SBE) план лежит на уровень глубже, в queryPlan.
+    if 'queryPlan' in plan:
+        plan = plan['queryPlan']
+    stage = plan.get('stage', '?')
+    if 'indexName' in plan:
+        stage += f' {plan["indexName"]}'
+    result = [stage]
+    if 'inputStage' in plan:
+        result += _plan_stages(plan['inputStage'])
+    for input_stage in plan.get('inputStages', []):
+        result += _plan_stages(input_stage)
+    return result
+
+
+def _set_leaderboard_scores(leaderboard: Leaderboard, scores_by_user: dict[int, int]):
+    for user_id, score in scores_by_user.items():
+        if user_id in leaderboard:
+            leaderboard.set_score(user_id=user_id, score=score)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Наивное время в проекте — всегда UTC (так его отдаёт pymongo).
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
@@ -1,6 +1,6 @@
 import pytz
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import datetime_utils
 from models import EventType
@@ -9,6 +9,13 @@ from models import EventType
 DATE_FORMAT = '%d.%m.%Y %H:%M'
 MOSCOW_TZ = pytz.timezone('Europe/Moscow')
 
+# Напоминания в общий чат тем, кто не сделал прогноз на матч: (метка, за сколько до начала).
+# Пороговые, как tournament_utils.SPECIAL_BET_REMINDER_THRESHOLDS: срабатывают в момент порога.
+EVENT_REMINDER_THRESHOLDS = (
+    ('soon', timedelta(hours=1, minutes=50)),
+    ('last_call', timedelta(minutes=15)),
+)
+
 # Токены типа события в теле /add_event -> EventType.
 EVENT_TYPE_BY_TOKEN = {
     'group': EventType.GROUP_STAGE,
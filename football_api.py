@@ -1,23 +1,47 @@
 # Клиент football-data.org v4 для авто-завершения матчей ЧМ-2026.
 # Сетевая здесь только fetch_matches; парсинг, сопоставление с нашими Event
 # и построение EventResult — чистые функции, тестируемые без сети и БД.
+# PollState — состояние опроса между вызовами: кэш ответов, бюджет запросов, адаптивный интервал.
+import hashlib
 import logging
+import math
 import requests
+import threading
+import time
+from collections import OrderedDict, deque
 from dataclasses import dataclass
 from datetime import datetime, date, timedelta, timezone
+from typing import Callable
+from urllib3.util.retry import Retry
 
 import team_names
 from models import Event, EventResult, EventType
 
 MATCHES_URL = 'https://api.football-data.org/v4/competitions/WC/matches'
-REQUEST_TIMEOUT_SECONDS = 15
+REQUEST_TIMEOUT_SECONDS = 15  # только для разового requests.get без http_client
 # Статусы, при которых результат окончательный. AWARDED — техническое решение без игры.
 FINAL_STATUSES = ('FINISHED', 'AWARDED')
+# Отказы build_event_result, которые следующий ответ API не исправит: такой матч больше не опрашиваем
+# (PollState.stop_tracking) и ждём ручной /result. Пробелы в данных FINISHED (нет счёта, победителя,
+# противоречия) API обычно заполняет чуть позже — по ним опрос продолжается с обычным интервалом.
+PERMANENT_RESULT_FAILURES = ('second_leg_manual_only', 'orientation_mismatch')
 # Насколько kickoff из API может отличаться от времени нашего события.
 # Дизамбигуирует возможный повтор пары команд (группа vs плей-офф) — те разнесены на дни.
 KICKOFF_TOLERANCE = timedelta(minutes=15)
 # Серии пенальти и доп. время: по правилам тотализатора записываем счёт основного времени.
 EXTENDED_DURATIONS = ('EXTRA_TIME', 'PENALTY_SHOOTOUT')
+# Лимит бесплатного тарифа — 10 запросов в минуту на токен.
+REQUESTS_PER_MINUTE = 10
+# Адаптивный опрос по времени от начала самого «позднего» из идущих матчей: (прошло не меньше, интервал).
+# Первый тайм результата не даст — опрашиваем редко (только чтобы видеть статус в логе). Ближе к
+# финальному свистку (90 минут + перерыв + добавленное) — на каждом тике планировщика.
+POLL_INTERVALS = (
+    (timedelta(minutes=100), timedelta(0)),
+    (timedelta(minutes=45), timedelta(minutes=2)),
+    (timedelta(0), timedelta(minutes=5)),
+)
+# Окно дат сдвигается раз в сутки — больше пары окон одновременно не бывает.
+MAX_CACHED_WINDOWS = 4
 
 
 @dataclass(frozen=True)
@@ -104,47 +128,230 @@ def parse_matches_response(payload) -> list:
     return matches
 
 
-def fetch_matches(token: str, date_from: date, date_to: date) -> list | None:
+@dataclass(frozen=True)
+class CachedMatches:
+    etag: str | None
+    last_modified: str | None
+    body_hash: str
+    matches: list
+
+
+def get_poll_interval(events: list, now: datetime) -> timedelta:
+    # Интервал определяет матч, ближайший к финальному свистку (начавшийся раньше всех).
+    elapsed = max(now - x.get_time_in_utc() for x in events)
+    for min_elapsed, interval in POLL_INTERVALS:
+        if elapsed >= min_elapsed:
+            return interval
+    return POLL_INTERVALS[-1][1]
+
+
+class PollState:
+    # Живёт между опросами в одном процессе. Потокобезопасен: в asyncio-рантайме 30-секундный опрос
+    # и 10-минутный тик идут в разных потоках.
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._windows = OrderedDict()  # (date_from, date_to) -> CachedMatches
+        self._request_times = deque()
+        self._blocked_until = 0.0
+        self._last_poll_at = None
+        self._stopped = set()  # uuid событий, по которым API уже ничего нового не скажет
+        self.requests_available = None
+
+    def stop_tracking(self, event_uuid: str):
+        # Матч в API окончательный, но авто-завершить его нельзя (PERMANENT_RESULT_FAILURES) —
+        # дальше его ради частого опроса не учитываем; ждём ручной /result.
+        with self._lock:
+            self._stopped.add(event_uuid)
+
+    def forget(self, event_uuid: str):
+        with self._lock:
+            self._stopped.discard(event_uuid)
+
+    def is_due(self, events_in_progress: list, now: datetime) -> bool:
+        # False, когда все идущие матчи уже окончательны в API или интервал с прошлого опроса не вышел.
+        with self._lock:
+            tracked = [x for x in events_in_progress if x.uuid not in self._stopped]
+            if len(tracked) == 0:
+                return False
+            if self._last_poll_at is None:
+                return True
+            interval = get_poll_interval(tracked, now)
+            return self._clock() - self._last_poll_at >= interval.total_seconds()
+
+    def try_acquire_request(self) -> bool:
+        # Скользящее окно в минуту плюс блокировка до сброса счётчика, если сервер сказал, что лимит выбран.
+        with self._lock:
+            now = self._clock()
+            if now < self._blocked_until:
+                return False
+            while len(self._request_times) > 0 and self._request_times[0] <= now - 60:
+                self._request_times.popleft()
+            if len(self._request_times) >= REQUESTS_PER_MINUTE:
+                return False
+            self._last_poll_at = now
+            self._request_times.append(now)
+            return True
+
+    def record_retries(self, count: int):
+        # Повторы внутри сессии (http_client.RETRY_TOTAL) — тоже запросы к API: учитываем их в минутном окне
+        # задним числом, следующий опрос подождёт.
+        if count <= 0:
+            return
+        with self._lock:
+            now = self._clock()
+            self._request_times.extend([now] * count)
+
+    def record_response(self, status_code: int, headers):
+        requests_available = _get_requests_available(headers)
+        reset_seconds = headers.get('X-RequestCounter-Reset')
+        reset_seconds = int(reset_seconds) if reset_seconds is not None and reset_seconds.isdigit() else 60
+        if requests_available is not None and requests_available.isdigit():
+            requests_available = int(requests_available)
+        else:
+            requests_available = None  # ответ без счётчика ничего не говорит об исчерпанном лимите
+        with self._lock:
+            self.requests_available = requests_available
+            if status_code == 429 or requests_available == 0:
+                # Минутный лимит выбран (возможно, токен делит кто-то ещё) — молчим до сброса счётчика.
+                self._blocked_until = max(self._blocked_until, self._clock() + reset_seconds)
+
+    def get_cached(self, window: tuple) -> CachedMatches | None:
+        with self._lock:
+            return self._windows.get(window)
+
+    def store(self, window: tuple, cached: CachedMatches):
+        with self._lock:
+            self._windows[window] = cached
+            self._windows.move_to_end(window)
+            while len(self._windows) > MAX_CACHED_WINDOWS:
+                self._windows.popitem(last=False)
+
+
+def _get_requests_available(headers) -> str | None:
+    # Название заголовка в документации и в реальных ответах пишется по-разному — проверяем все варианты.
+    return (headers.get('X-Requests-Available-Minute')
+            or headers.get('X-Requests-Available')
+            or headers.get('X-RequestsAvailable'))
+
+
+def fetch_matches(token: str, date_from: date, date_to: date, state: PollState | None = None,
+                  client=None) -> list | None:
     # None — «не удалось получить данные» (сеть/лимит/не-200): вызывающий просто ждёт следующего тика.
+    # client — http_client.HttpClient с пулом keep-alive соединений; без него — разовый requests.get.
+    # С state: запрос не уходит сверх минутного бюджета; если сервер отдаёт ETag/Last-Modified, запрос
+    # условный, и на 304 (или тот же самый ответ байт в байт) возвращается ранее разобранный список
+    # без повторного парсинга.
+    window = (date_from, date_to)
+    headers = {'X-Auth-Token': token}
+    cached = None
+    if state is not None:
+        if not state.try_acquire_request():
+            logging.info('football-data.org request skipped: request budget is exhausted for this minute')
+            return None
+        cached = state.get_cached(window)
+        if cached is not None and cached.etag is not None:
+            headers['If-None-Match'] = cached.etag
+        if cached is not None and cached.last_modified is not None:
+            headers['If-Modified-Since'] = cached.last_modified
+    params = {'dateFrom': date_from.isoformat(), 'dateTo': date_to.isoformat()}
     try:
-        response = requests.get(
-            MATCHES_URL,
-            headers={'X-Auth-Token': token},
-            params={'dateFrom': date_from.isoformat(), 'dateTo': date_to.isoformat()},
-            timeout=REQUEST_TIMEOUT_SECONDS,
-        )
+        if client is not None:
+            # Таймауты (connect, read) подставляет сам клиент.
+            response = client.get(MATCHES_URL, headers=headers, params=params)
+        else:
+            response = requests.get(MATCHES_URL, headers=headers, params=params, timeout=REQUEST_TIMEOUT_SECONDS)
     except requests.RequestException as e:
         logging.warning(f'football-data.org request failed: {e}')
         return None
     # API просит следить за этими заголовками. При нашем темпе (не больше 3 запросов
     # в минуту против лимита 10/мин) упереться в лимит нельзя, но мониторим как просят.
-    # Название заголовка в документации и в реальных ответах пишется по-разному — проверяем все варианты.
-    requests_available = (response.headers.get('X-Requests-Available-Minute')
-                          or response.headers.get('X-Requests-Available')
-                          or response.headers.get('X-RequestsAvailable'))
+    requests_available = _get_requests_available(response.headers)
     if requests_available is not None and requests_available.isdigit() and int(requests_available) < 3:
         logging.warning(f'football-data.org: only {requests_available} requests available '
                         f'(кто-то ещё использует этот токен?)')
+    if state is not None:
+        state.record_retries(_count_retries(response))
+        state.record_response(status_code=response.status_code, headers=response.headers)
     if response.status_code == 429:
         reset_seconds = response.headers.get('X-RequestCounter-Reset')
         logging.warning(f'football-data.org rate limit hit, resets in {reset_seconds} seconds')
         return None
+    if response.status_code == 304 and cached is not None:
+        return cached.matches
     if response.status_code != 200:
         logging.warning(f'football-data.org returned HTTP {response.status_code}: {response.text[:200]}')
         return None
+    body_hash = None
+    if state is not None:
+        body_hash = hashlib.sha256(response.content).hexdigest()
+        if cached is not None and cached.body_hash == body_hash:
+            _store_response(state, window, response, body_hash, cached.matches)
+            return cached.matches
     try:
         payload = response.json()
     except ValueError as e:
         logging.warning(f'football-data.org returned non-JSON response: {e}')
         return None
-    return parse_matches_response(payload)
+    matches = parse_matches_response(payload)
+    if state is not None:
+        _store_response(state, window, response, body_hash, matches)
+    return matches
+
+
+def _count_retries(response) -> int:
+    # Сколько раз urllib3 повторил запрос до этого ответа (у разового requests.get повторов нет).
+    retries = getattr(response.raw, 'retries', None)
+    return len(retries.history) if isinstance(retries, Retry) else 0
+
+
+def _store_response(state: PollState, window: tuple, response, body_hash: str, matches: list):
+    state.store(window, CachedMatches(
+        etag=response.headers.get('ETag'),
+        last_modified=response.headers.get('Last-Modified'),
+        body_hash=body_hash,
+        matches=matches,
+    ))
+
+
+class ApiMatchIndex:
+    # Индекс разобранного ответа: (ключ команды, корзина kickoff шириной KICKOFF_TOLERANCE) -> позиции
+    # матчей в исходном списке. Строится один раз на опрос; поиск по событию смотрит только матчи с его
+    # командой в соседних корзинах вместо перебора всего окна дат.
+    def __init__(self, api_matches: list, bucket: timedelta = KICKOFF_TOLERANCE):
+        self.api_matches = list(api_matches)
+        self.bucket_seconds = bucket.total_seconds()
+        self._positions = {}
+        for position, api_match in enumerate(self.api_matches):
+            bucket_number = self._get_bucket_number(api_match.utc_date)
+            for key in api_match.home_team_keys | api_match.away_team_keys:
+                self._positions.setdefault((key, bucket_number), []).append(position)
+
+    def __len__(self) -> int:
+        return len(self.api_matches)
+
+    def get_candidates(self, team_keys: frozenset, kickoff: datetime, tolerance: timedelta) -> list:
+        # Все матчи, где есть одна из team_keys и kickoff может быть в пределах tolerance, в исходном
+        # порядке и без повторов (матч находится по нескольким ключам команды). Точную проверку
+        # делает вызывающий.
+        center = self._get_bucket_number(kickoff)
+        spread = math.ceil(tolerance.total_seconds() / self.bucket_seconds)
+        positions = set()
+        for key in team_keys:
+            for bucket_number in range(center - spread, center + spread + 1):
+                positions.update(self._positions.get((key, bucket_number), ()))
+        return [self.api_matches[x] for x in sorted(positions)]
+
+    def _get_bucket_number(self, moment: datetime) -> int:
+        return math.floor(moment.timestamp() / self.bucket_seconds)
 
 
-def find_api_match_for_event(event: Event, api_matches: list,
+def find_api_match_for_event(event: Event, api_matches,
                              tolerance: timedelta = KICKOFF_TOLERANCE) -> tuple:
     # Возвращает (ApiMatch | None, reason). Сопоставление: пара команд без учёта порядка
     # + kickoff в пределах допуска. Пара дизамбигуирует одновременные матчи 3-го тура,
     # время — гипотетический повтор пары в плей-офф.
+    # api_matches — ApiMatchIndex (при поиске нескольких событий по одному ответу) или просто список.
     team_1_keys = team_names.get_api_keys(event.team_1)
     team_2_keys = team_names.get_api_keys(event.team_2)
     if team_1_keys is None:
@@ -152,8 +359,10 @@ def find_api_match_for_event(event: Event, api_matches: list,
     if team_2_keys is None:
         return None, f'unmapped_team:{event.team_2}'
     event_time = event.get_time_in_utc()
+    if not isinstance(api_matches, ApiMatchIndex):
+        api_matches = ApiMatchIndex(api_matches)
     candidates = []
-    for api_match in api_matches:
+    for api_match in api_matches.get_candidates(team_1_keys, event_time, tolerance):
         straight = (team_1_keys & api_match.home_team_keys) and (team_2_keys & api_match.away_team_keys)
         swapped = (team_1_keys & api_match.away_team_keys) and (team_2_keys & api_match.home_team_keys)
         if not straight and not swapped:
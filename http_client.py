@@ -0,0 +1,156 @@
+import bisect
+import logging
+import threading
+import time
+from typing import Callable
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Общий HTTP-клиент для наших прямых запросов (football-data.org, выгрузка файла в Telegram):
+# одна Session с пулом keep-alive соединений вместо нового TCP + TLS на каждый вызов requests.get.
+# Запросы самого telebot сюда не идут — у него свои сессии на поток, тоже с keep-alive.
+
+CONNECT_TIMEOUT_SECONDS = 5
+READ_TIMEOUT_SECONDS = 15
+# Соединений на хост: опрос API, ежечасная проверка незавершённых матчей и команды мейнтейнера могут совпасть.
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 8
+# Повторяем только то, что точно не дошло до обработчика или упало на стороне сервера/прокси.
+# 429 не повторяем: лимит football-data.org учитывает football_api.PollState (повторы 5xx он списывает
+# с минутного бюджета по истории Retry ответа).
+RETRY_TOTAL = 2
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (502, 503, 504)
+# Верхние границы корзин гистограммы задержек, мс. Холодный TLS-хендшейк до football-data.org — сотни мс,
+# запрос по живому соединению — десятки.
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyHistogram:
+    # Не потокобезопасна — синхронизацию обеспечивает HttpClient.
+    def __init__(self, buckets_ms: tuple = LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)  # последняя корзина — больше самой верхней границы
+        self.total_ms = 0.0
+        self.errors = 0
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, elapsed_ms: float, error: bool = False):
+        self.counts[bisect.bisect_left(self.buckets_ms, elapsed_ms)] += 1
+        self.total_ms += elapsed_ms
+        if error:
+            self.errors += 1
+
+    def get_percentile(self, fraction: float) -> float | None:
+        # Верхняя граница корзины, в которую попадает перцентиль; None — наблюдений нет.
+        count = self.count
+        if count == 0:
+            return None
+        rank = fraction * count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets_ms[index] if index < len(self.buckets_ms) else float('inf')
+        return float('inf')
+
+    def copy(self) -> 'LatencyHistogram':
+        result = LatencyHistogram(self.buckets_ms)
+        result.counts = list(self.counts)
+        result.total_ms = self.total_ms
+        result.errors = self.errors
+        return result
+
+
+class HttpClient:
+    # Интерфейс get/post как у модуля requests — можно передать туда, где раньше звался requests.get.
+    # Таймаут по умолчанию подставляется, если вызывающий не указал свой.
+    def __init__(
+            self,
+            session: requests.Session | None = None,
+            timeout: tuple[float, float] = (CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS),
+            clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.session = session or create_session()
+        self.timeout = timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._histograms = {}  # хост -> LatencyHistogram
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        started = self._clock()
+        error = True
+        try:
+            response = self.session.request(method, url, **kwargs)
+            error = response.status_code >= 500
+            return response
+        finally:
+            self._observe(urlsplit(url).hostname or '?', (self._clock() - started) * 1000, error)
+
+    def get_latency_histograms(self) -> dict[str, LatencyHistogram]:
+        with self._lock:
+            return {host: histogram.copy() for host, histogram in self._histograms.items()}
+
+    def close(self):
+        self.session.close()
+
+    def _observe(self, host: str, elapsed_ms: float, error: bool):
+        with self._lock:
+            histogram = self._histograms.get(host)
+            if histogram is None:
+                histogram = LatencyHistogram()
+                self._histograms[host] = histogram
+            histogram.observe(elapsed_ms, error=error)
+        logging.debug(f'HTTP {host}: {elapsed_ms:.0f} ms')
+
+
+def create_session() -> requests.Session:
+    retry = Retry(
+        total=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({'GET', 'HEAD'}),  # POST (выгрузка файла) не идемпотентен
+        raise_on_status=False,
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def format_latency_stats(histograms: dict[str, LatencyHistogram]) -> str:
+    if len(histograms) == 0:
+        return 'HTTP-запросов ещё не было'
+    lines = []
+    for host in sorted(histograms.keys()):
+        histogram = histograms[host]
+        average = histogram.total_ms / histogram.count
+        percentiles = ', '.join(
+            f'p{int(fraction * 100)} ≤ {_format_bound(histogram.get_percentile(fraction))}'
+            for fraction in (0.5, 0.9, 0.99)
+        )
+        lines.append(f'{host}: {histogram.count} запросов, ошибок {histogram.errors}, '
+                     f'среднее {average:.0f} мс, {percentiles}')
+        bucket_labels = [f'≤{x}' for x in histogram.buckets_ms] + [f'>{histogram.buckets_ms[-1]}']
+        lines.append('  ' + ' '.join(f'{label}:{count}' for label, count in zip(bucket_labels, histogram.counts)
+                                     if count > 0))
+    return '\n'.join(lines)
+
+
+def _format_bound(value: float) -> str:
+    return '∞' if value == float('inf') else f'{value} мс'
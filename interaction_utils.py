@@ -0,0 +1,53 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Callable
+
+# Как часто сбрасывать накопленные last_interaction в базу. При падении процесса теряется не больше
+# этого окна — поле нужно только для статистики активности и прогрева кэша участия.
+FLUSH_INTERVAL_SECONDS = 30
+
+
+class InteractionTracker:
+    # Write-behind для users.last_interaction: нажатия и сообщения только отмечаются в памяти,
+    # повторные отметки одного пользователя схлопываются в одну, а запись уходит пачкой по таймеру.
+    # Заодно помнит, кто уже зарегистрирован в этом процессе, чтобы не ходить в базу за проверкой.
+    # Потокобезопасен.
+    def __init__(self, clock: Callable[[], datetime] = datetime.now):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pending = {}  # user_id -> последнее взаимодействие, ещё не записанное в базу
+        self._known = set()
+
+    def is_known(self, user_id: int) -> bool:
+        with self._lock:
+            return user_id in self._known
+
+    def touch(self, user_id: int):
+        now = self._clock()
+        with self._lock:
+            self._known.add(user_id)
+            self._pending[user_id] = max(now, self._pending.get(user_id, now))
+
+    @property
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, write: Callable[[dict[int, datetime]], object]) -> int:
+        # Забираем накопленное под локом, пишем без него. Если запись упала, возвращаем отметки
+        # обратно (не затирая более свежие) — уйдут со следующим сбросом. Возвращает размер пачки.
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        if len(pending) == 0:
+            return 0
+        try:
+            write(pending)
+        except Exception:
+            with self._lock:
+                for user_id, moment in pending.items():
+                    self._pending[user_id] = max(moment, self._pending.get(user_id, moment))
+            raise
+        logging.debug(f'Flushed last_interaction for {len(pending)} users')
+        return len(pending)
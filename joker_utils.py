@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Iterable
+from typing import Iterable, Mapping
 
 from models import Bet, Event, EventType
 
@@ -25,6 +25,15 @@ class JokerStatus:
     playoff_limit: int = PLAYOFF_JOKERS
 
 
+@dataclass(frozen=True)
+class JokerCalendar:
+    # Всё, что статусу джокеров нужно от календаря; считается один раз на весь список участников.
+    playoff_start: datetime | None
+    tournament_end: datetime | None
+    event_uuids: frozenset[str]
+    playoff_event_uuids: frozenset[str]
+
+
 def is_playoff_event(event: Event) -> bool:
     return event.event_type in (
         EventType.PLAY_OFF_SINGLE_MATCH,
@@ -77,20 +86,58 @@ def calculate_remaining_usable_now(playoff_started: bool, remaining_total: int,
     return remaining_total
 
 
+def build_joker_calendar(events: Iterable[Event]) -> JokerCalendar:
+    normalized_events = list(events)
+    return JokerCalendar(
+        playoff_start=get_playoff_start(normalized_events),
+        tournament_end=get_tournament_end(normalized_events),
+        event_uuids=frozenset(event.uuid for event in normalized_events),
+        playoff_event_uuids=frozenset(event.uuid for event in normalized_events if is_playoff_event(event)),
+    )
+
+
 def calculate_joker_status(
         bets_with_events: Iterable[tuple[Bet, Event]],
         events: Iterable[Event],
         now_utc: datetime | None = None,
 ) -> JokerStatus:
-    now = now_utc or datetime.now(timezone.utc)
     normalized_bets_with_events = list(bets_with_events)
-    normalized_events = list(events)
-    playoff_start = get_playoff_start(normalized_events)
-    tournament_end = get_tournament_end(normalized_events)
-    playoff_started = playoff_start is not None and playoff_start <= now
-    used_total = calculate_used_total(normalized_bets_with_events)
-    used_playoff = calculate_used_playoff(normalized_bets_with_events)
-    used_before_playoff = calculate_used_before_playoff(normalized_bets_with_events)
+    return build_joker_status(
+        used_total=calculate_used_total(normalized_bets_with_events),
+        used_playoff=calculate_used_playoff(normalized_bets_with_events),
+        calendar=build_joker_calendar(events),
+        now_utc=now_utc,
+    )
+
+
+def calculate_joker_statuses(
+        bets_by_user: Mapping[int, Iterable[Bet]],
+        events: Iterable[Event],
+        now_utc: datetime | None = None,
+) -> dict[int, JokerStatus]:
+    # Статусы всех участников за один проход по ставкам: календарь (старт плей-офф, конец турнира,
+    # какие матчи — плей-офф) считается один раз, ставки на удалённые матчи не учитываются —
+    # как в calculate_joker_status по парам (ставка, матч).
+    calendar = build_joker_calendar(events)
+    result = {}
+    for user_id, bets in bets_by_user.items():
+        used_total = 0
+        used_playoff = 0
+        for bet in bets:
+            if not bet.is_joker or bet.event_uuid not in calendar.event_uuids:
+                continue
+            used_total += 1
+            if bet.event_uuid in calendar.playoff_event_uuids:
+                used_playoff += 1
+        result[user_id] = build_joker_status(
+            used_total=used_total, used_playoff=used_playoff, calendar=calendar, now_utc=now_utc)
+    return result
+
+
+def build_joker_status(used_total: int, used_playoff: int, calendar: JokerCalendar,
+                       now_utc: datetime | None = None) -> JokerStatus:
+    now = now_utc or datetime.now(timezone.utc)
+    playoff_started = calendar.playoff_start is not None and calendar.playoff_start <= now
     remaining_total = calculate_remaining_total(used_total)
     remaining_playoff = calculate_remaining_playoff(used_playoff)
     will_burn_at_playoff_start = calculate_will_burn_at_playoff_start(
@@ -105,14 +152,14 @@ def calculate_joker_status(
     return JokerStatus(
         used_total=used_total,
         used_playoff=used_playoff,
-        used_before_playoff=used_before_playoff,
+        used_before_playoff=used_total - used_playoff,
         remaining_total=remaining_total,
         remaining_playoff=remaining_playoff,
         will_burn_at_playoff_start=will_burn_at_playoff_start,
         remaining_usable_now=remaining_usable_now,
         playoff_started=playoff_started,
-        playoff_start=playoff_start,
-        tournament_end=tournament_end,
+        playoff_start=calendar.playoff_start,
+        tournament_end=calendar.tournament_end,
     )
 
 
@@ -0,0 +1,82 @@
+import bisect
+
+from models import UserModel
+
+
+class Leaderboard:
+    # Материализованная таблица: очки -> участники, плюс отсортированный список различных значений очков.
+    # Ранг плотный — одинаковые очки делят одно место, так что ранг участника = позиция его очков
+    # в списке различных значений (O(log n) бинарным поиском). Внутри одного значения участники
+    # упорядочены как в текстовой таблице: (имя без учёта регистра, id). Не потокобезопасна —
+    # синхронизацию обеспечивает владелец (Database).
+    def __init__(self):
+        self._entries = {}  # user_id -> (name, score)
+        self._groups = {}  # score -> отсортированный список (name.casefold(), user_id)
+        self._scores = []  # различные значения очков, -score по возрастанию
+
+    @classmethod
+    def from_entries(cls, entries: list[tuple[int, str, int]]) -> 'Leaderboard':
+        leaderboard = cls()
+        for user_id, name, score in entries:
+            leaderboard.upsert(user_id=user_id, name=name, score=score)
+        return leaderboard
+
+    @classmethod
+    def from_users(cls, users: list[UserModel]) -> 'Leaderboard':
+        return cls.from_entries([(x.id, x.get_full_name(), x.scores) for x in users])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def upsert(self, user_id: int, name: str, score: int):
+        if user_id in self._entries:
+            self._detach(user_id)
+        self._entries[user_id] = (name, score)
+        group = self._groups.get(score)
+        if group is None:
+            group = []
+            self._groups[score] = group
+            bisect.insort(self._scores, -score)
+        bisect.insort(group, (name.casefold(), user_id))
+
+    def set_score(self, user_id: int, score: int):
+        name, current_score = self._entries[user_id]
+        if current_score != score:
+            self.upsert(user_id=user_id, name=name, score=score)
+
+    def apply_deltas(self, scores_by_user: dict[int, int]):
+        for user_id, delta in scores_by_user.items():
+            if delta != 0 and user_id in self._entries:
+                self.set_score(user_id=user_id, score=self._entries[user_id][1] + delta)
+
+    def get_rank(self, user_id: int) -> int | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        return bisect.bisect_left(self._scores, -entry[1]) + 1
+
+    def snapshot(self, limit: int | None = None) -> dict[int, dict]:
+        # Формат снимка как у main.build_leaderboard_snapshot: {user_id: {name, score, rank}}.
+        result = {}
+        for rank, negative_score in enumerate(self._scores, start=1):
+            for _, user_id in self._groups[-negative_score]:
+                if limit is not None and len(result) >= limit:
+                    return result
+                result[user_id] = {
+                    'name': self._entries[user_id][0],
+                    'score': -negative_score,
+                    'rank': rank,
+                }
+        return result
+
+    def _detach(self, user_id: int):
+        name, score = self._entries[user_id]
+        group = self._groups[score]
+        index = bisect.bisect_left(group, (name.casefold(), user_id))
+        del group[index]
+        if len(group) == 0:
+            del self._groups[score]
+            del self._scores[bisect.bisect_left(self._scores, -score)]
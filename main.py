@@ -3,36 +3,67 @@ import locale
 import logging
 import os
 import pytz
-import requests
 import schedule
 import telebot
 import threading
 import time
 import traceback
 from datetime import datetime, timezone, timedelta
+from typing import Callable
 from telebot.types import User, InlineKeyboardMarkup, InlineKeyboardButton
 
+import async_runtime
+import broadcast_utils
 import callback_data_utils
 import constants
 import datetime_utils
 import event_utils
 import football_api
+import http_client
+import interaction_utils
 import joker_utils
+import membership_utils
+import metrics_utils
+import outbox_utils
+import reminder_utils
+import scoring_utils
 import strings
 import telegram_utils
 import tournament_utils
 import utils
 from database import Database
+from leaderboard_utils import Leaderboard
 from models import Event, EventResult, Bet, Guessers, GuessedEvent, EventType, DetailedStatistic, UserModel, Tournament
+from models import DETAILED_STATISTIC_COUNTERS
 
 locale.setlocale(locale.LC_TIME, 'ru_RU.UTF-8')
 bot = telebot.TeleBot(os.environ[constants.ENV_BOT_TOKEN])
-database = Database()
+# Длительность, запросы к БД и вызовы Telegram по каждой плановой задаче (/task_stats, METRICS_PORT).
+task_metrics = metrics_utils.TaskMetrics()
+database = Database(event_listeners=[metrics_utils.DbCommandCounter(task_metrics)])
+# Сами записи ставок атомарны (database.set_bet_joker и др.), лок нужен только для проверки лимита
+# джокеров: «лимит не исчерпан» + постановка джокера не должны перемежаться с другой постановкой.
 joker_write_lock = threading.Lock()
 # Завершение матча может прийти из двух потоков: ручной /result (поток telebot)
 # и авто-завершение по API (поток планировщика). Лок делает проверку
 # «результат ещё не записан» + запись + начисление очков атомарными.
 finish_event_lock = threading.Lock()
+# Рассылки (напоминания, алерты мейнтейнерам) — через общий пул с учётом лимитов Telegram.
+# bot берётся в момент отправки, а не при создании.
+broadcaster = broadcast_utils.Broadcaster(send=lambda chat_id, text: bot.send_message(chat_id=chat_id, text=text))
+membership_cache = membership_utils.MembershipCache(
+    ttl_seconds=float(os.environ.get(constants.ENV_MEMBERSHIP_TTL) or membership_utils.DEFAULT_TTL_SECONDS),
+    negative_ttl_seconds=float(
+        os.environ.get(constants.ENV_MEMBERSHIP_NEGATIVE_TTL) or membership_utils.DEFAULT_NEGATIVE_TTL_SECONDS
+    ),
+)
+# Keep-alive соединения к football-data.org и api.telegram.org (выгрузка файлов) и гистограммы задержек.
+shared_http_client = http_client.HttpClient()
+# last_interaction копится в памяти и пишется пачкой раз в FLUSH_INTERVAL_SECONDS.
+interaction_tracker = interaction_utils.InteractionTracker()
+# chat_member нужен для инвалидации membership_cache; Telegram шлёт его, только если запросить явно
+# (и бот — администратор общего чата).
+ALLOWED_UPDATES = ['message', 'callback_query', 'chat_member']
 logging.basicConfig(filename='totalizator.log', encoding='utf-8', level=logging.INFO)
 
 
@@ -187,11 +218,21 @@ def finish_event_and_announce(event: Event, result: EventResult, confirmation_ch
         existing_event = database.get_event_by_uuid(uuid=event.uuid)
         if existing_event is None or existing_event.result is not None:
             return False
-        leaderboard_before = build_leaderboard_snapshot(database.get_all_users())
+        users = database.get_all_users()
+        leaderboard_before = database.get_leaderboard_snapshot()
         existing_event.result = result
-        database.update_event(event=existing_event)
-        guessers = calculate_scores_after_finished_event(event=existing_event)
-        leaderboard_after = build_leaderboard_snapshot(database.get_all_users())
+        bets = database.get_bets_for_event(existing_event.uuid)
+        guessers, scores_by_user = calculate_event_settlement(event=existing_event, users=users, bets=bets)
+        statistic_by_user = {x.user_id: calculate_bet_statistic(event=existing_event, bet=x) for x in bets}
+        # Результат, очки и статистика коммитятся вместе; таблицу «после» считаем из «до» и начислений,
+        # без второго чтения.
+        if not database.settle_event(
+                event=existing_event,
+                scores_by_user=scores_by_user,
+                statistic_by_user=statistic_by_user,
+        ):
+            return False
+        leaderboard_after = apply_scores_to_snapshot(leaderboard_before, scores_by_user)
         leaderboard_facts = build_leaderboard_movement_facts(
             before=leaderboard_before,
             after=leaderboard_after,
@@ -200,6 +241,7 @@ def finish_event_and_announce(event: Event, result: EventResult, confirmation_ch
     # Матч ушёл из in-progress — состояние опроса API больше не нужно. Чистим здесь,
     # чтобы покрыть оба пути завершения: авто и ручной /result.
     api_poll_logged_states.pop(event.uuid, None)
+    api_poll_state.forget(event.uuid)
     event_type = existing_event.event_type
     msg_text = (f'Матч {existing_event.team_1} – {existing_event.team_2} завершился ' +
                 f'({existing_event.result.team_1_scores}:{existing_event.result.team_2_scores}).')
@@ -299,11 +341,10 @@ def finish_event_and_announce(event: Event, result: EventResult, confirmation_ch
         # Очки уже начислены — повторно завершать матч нельзя, но итоги в группу не ушли.
         # Маякнём мейнтейнерам, чтобы запостили вручную.
         logging.exception(e)
-        for user_id in get_maintainer_ids():
-            send_joker_reminder_message(
-                chat_id=user_id,
-                text=f'Матч {existing_event.team_1} – {existing_event.team_2} завершён, '
-                     f'но итоги не отправились в группу. Запости их вручную.')
+        text = (f'Матч {existing_event.team_1} – {existing_event.team_2} завершён, '
+                f'но итоги не отправились в группу. Запости их вручную.')
+        broadcast_messages(name=f'result_not_posted:{existing_event.uuid}',
+                           messages=[(x, text) for x in get_maintainer_ids()])
     return True
 
 
@@ -353,14 +394,14 @@ def export_statistic(message):
         ]
 
         writer.writerow(field)
-        events = database.get_all_events()
+        events = list(filter(lambda x: x.result is not None, database.get_all_events()))
         users = database.get_all_users()
+        bets_by_event = database.get_bets_for_events([event.uuid for event in events])
         for event in events:
             event_result = event.result
-            if event_result is None:
-                continue
+            bets_by_user = {bet.user_id: bet for bet in bets_by_event[event.uuid]}
             for user in users:
-                bet = database.find_bet(user_id=user.id, event_uuid=event.uuid)
+                bet = bets_by_user.get(user.id)
                 if bet is not None:
                     go_through = None
                     if event_result.team_1_has_gone_through is not None:
@@ -394,7 +435,7 @@ def export_statistic(message):
         payload = {
             'chat_id': message.chat.id,
         }
-        response = requests.post(url, data=payload, files=files)
+        response = shared_http_client.post(url, data=payload, files=files)
 
         if response.ok:
             return response.json()['result']['document']['file_id']
@@ -503,6 +544,61 @@ def get_detailed_analytics(message):
     bot.send_message(chat_id=message.chat.id, text=matches_statistic)
 
 
+@bot.chat_member_handler()
+def on_chat_member_updated(update):
+    # Вступление в общий чат или выход из него — сразу обновляем кэш, не дожидаясь TTL.
+    if update.chat.id != get_target_chat_id():
+        return
+    membership_cache.put(
+        user_id=update.new_chat_member.user.id,
+        is_member=telegram_utils.is_member_status(update.new_chat_member.status),
+    )
+
+
+@bot.message_handler(commands=['membership_stats'])
+def get_membership_stats(message):
+    user = message.from_user
+    if not is_maintainer(user=user):
+        return
+    stats = membership_cache.get_stats()
+    lookups = stats['hits'] + stats['misses']
+    hit_rate = stats['hits'] / lookups * 100 if lookups > 0 else 0
+    text = (f'Кэш участия в чате (TTL {membership_cache.ttl_seconds:.0f} с, '
+            f'для не участников {membership_cache.negative_ttl_seconds:.0f} с):\n'
+            f'Попадания: {stats["hits"]}, промахи: {stats["misses"]} ({hit_rate:.0f}% попаданий)\n'
+            f'В кэше: {stats["members"]} участников, {stats["non_members"]} не участников')
+    bot.send_message(chat_id=message.chat.id, text=text)
+
+
+@bot.message_handler(commands=['http_stats'])
+def get_http_stats(message):
+    user = message.from_user
+    if not is_maintainer(user=user):
+        return
+    histograms = shared_http_client.get_latency_histograms()
+    text = 'Задержки HTTP-запросов по хостам:\n' + http_client.format_latency_stats(histograms)
+    bot.send_message(chat_id=message.chat.id, text=text)
+
+
+@bot.message_handler(commands=['task_stats'])
+def get_task_stats(message):
+    user = message.from_user
+    if not is_maintainer(user=user):
+        return
+    text = 'Плановые задачи:\n' + metrics_utils.format_task_stats(task_metrics.get_stats())
+    telegram_utils.safe_send_message(bot=bot, chat_id=message.chat.id, text=text)
+
+
+@bot.message_handler(commands=['rebuild_statistic'])
+def rebuild_statistic(message):
+    user = message.from_user
+    if not is_maintainer(user=user):
+        return
+    save_user_or_update_interaction(user=user)
+    users_count = rebuild_users_statistic()
+    bot.send_message(chat_id=message.chat.id, text=f'Статистика пересобрана: {users_count} участников.')
+
+
 # --- Спецставки: команды мейнтейнера (структура, открытие приёма) -------------------
 # ВАЖНО: эти обработчики команд должны быть зарегистрированы ВЫШЕ catch-all
 # @bot.message_handler(content_types=['text']), иначе многострочные /setup_tournament и
@@ -782,9 +878,10 @@ def set_group_winners(message):
 
 
 def get_user_bets_with_events(user_id: int) -> list[tuple[Bet, Event]]:
+    events_by_uuid = {event.uuid: event for event in database.get_all_events()}
     result = []
     for bet in database.get_all_user_bets(user_id=user_id):
-        event = database.get_event_by_uuid(uuid=bet.event_uuid)
+        event = events_by_uuid.get(bet.event_uuid)
         if event is None:
             continue
         result.append((bet, event))
@@ -939,8 +1036,9 @@ def set_joker_for_event(user: User, chat_id: int, message_id: int, event_uuid: s
         ):
             bot.send_message(chat_id=chat_id, text='На этот матч сейчас нельзя поставить джокер.')
             return False
-        bet.is_joker = True
-        database.update_bet(user_id=user.id, bet=bet)
+        if not database.set_bet_joker(user_id=user.id, event_uuid=event.uuid, is_joker=True):
+            bot.send_message(chat_id=chat_id, text='На этот матч сейчас нельзя поставить джокер.')
+            return False
 
     send_public_joker_set_message(user=user, event=event)
     try:
@@ -959,16 +1057,17 @@ def remove_joker_from_event(user: User, chat_id: int, message_id: int, event_uui
     if event is None:
         bot.send_message(chat_id=chat_id, text=strings.EVENT_NOT_FOUND_ERROR)
         return False
-    with joker_write_lock:
-        bet = database.find_bet(user_id=user.id, event_uuid=event.uuid)
-        if bet is None:
-            bot.send_message(chat_id=chat_id, text='Ставка на этот матч не обнаружена.')
-            return False
-        if not joker_utils.can_remove_joker_from_bet(bet=bet, event=event, now_utc=datetime_utils.get_utc_time()):
-            bot.send_message(chat_id=chat_id, text='С этого матча сейчас нельзя снять джокер.')
-            return False
-        bet.is_joker = False
-        database.update_bet(user_id=user.id, bet=bet)
+    # Снятие лимит не расходует — лок не нужен, от двойного нажатия защищает условная запись.
+    bet = database.find_bet(user_id=user.id, event_uuid=event.uuid)
+    if bet is None:
+        bot.send_message(chat_id=chat_id, text='Ставка на этот матч не обнаружена.')
+        return False
+    if not joker_utils.can_remove_joker_from_bet(bet=bet, event=event, now_utc=datetime_utils.get_utc_time()):
+        bot.send_message(chat_id=chat_id, text='С этого матча сейчас нельзя снять джокер.')
+        return False
+    if not database.set_bet_joker(user_id=user.id, event_uuid=event.uuid, is_joker=False):
+        bot.send_message(chat_id=chat_id, text='С этого матча сейчас нельзя снять джокер.')
+        return False
 
     send_public_joker_removed_message(user=user, event=event)
     try:
@@ -1182,8 +1281,8 @@ def process_who_will_go_through_bet(user_id: int, chat_id: int, message_id: int,
     if bet is None:
         bot.send_message(chat_id=chat_id, text='Что-то пошло не так :/')
         return
-    bet.team_1_will_go_through = team_1_will_go_through
-    database.update_bet(user_id=user_id, bet=bet)
+    database.set_bet_attribute(user_id=user_id, event_uuid=event.uuid, key='team_1_will_go_through',
+                               value=team_1_will_go_through)
     msg = f'OK, {event.team_1} – {event.team_2} {bet.team_1_scores}:{bet.team_2_scores}, проход: '
     if team_1_will_go_through:
         msg += f'{event.team_1}.'
@@ -1606,19 +1705,27 @@ def get_text_messages(message):
 
 
 def is_club_member(user: User) -> bool:
-    return telegram_utils.is_chat_member(bot=bot, chat_id=get_target_chat_id(), user_id=user.id)
+    # Проверка идёт перед каждой командой и нажатием кнопки — без кэша это лишний HTTPS-запрос к Telegram.
+    return membership_cache.get_or_check(
+        user_id=user.id,
+        check=lambda user_id: telegram_utils.is_chat_member(bot=bot, chat_id=get_target_chat_id(), user_id=user_id),
+    )
 
 
 def save_user_or_update_interaction(user: User):
+    # Вызывается на каждое сообщение и нажатие: известный процессу пользователь — ни одного запроса
+    # к базе, только отметка в interaction_tracker. Незнакомый — один upsert регистрации.
+    if interaction_tracker.is_known(user.id):
+        interaction_tracker.touch(user_id=user.id)
+        return
     inserted_new = database.register_user_if_required(
         user_id=user.id,
         username=user.username,
         first_name=user.first_name,
         last_name=user.last_name,
     )
-    if not inserted_new:
-        database.update_last_interaction(user_id=user.id)
-    else:
+    interaction_tracker.touch(user_id=user.id)
+    if inserted_new:
         for user_id in get_maintainer_ids():
             bot.send_message(chat_id=user_id, text=f'New user: {user.full_name} ({user.username})')
 
@@ -1628,8 +1735,7 @@ def handle_exception(e: Exception, user: User, chat_id: int):
     bot.send_message(chat_id=chat_id, text='Что-то пошло не так, произошла ошибка :(')
     from_user = f'{user.full_name} (f{user.username}). '
     error_message = 'Произошла ошибка. ' + ''.join(traceback.TracebackException.from_exception(e).format())
-    for user_id in get_maintainer_ids():
-        bot.send_message(chat_id=user_id, text=from_user + error_message)
+    broadcast_messages(name='handler_error', messages=[(x, from_user + error_message) for x in get_maintainer_ids()])
 
 
 def send_coming_events(user_id: int, chat_id: int, send_error_if_all_bets_already_make: bool = True):
@@ -1682,6 +1788,9 @@ def send_coming_events(user_id: int, chat_id: int, send_error_if_all_bets_alread
 def send_my_bets_message(chat_id: int, user_id: int):
     bets_with_events = get_user_bets_with_events(user_id=user_id)
     status_text = joker_utils.get_joker_status_text(get_joker_status_for_user(user_id=user_id))
+    place_text = get_leaderboard_place_text(user_id=user_id)
+    if place_text is not None:
+        status_text = f'{place_text}\n{status_text}'
     tournament = database.get_tournament()
     special_section = format_special_bets_section(tournament, user_id)
     if len(bets_with_events) == 0:
@@ -1781,21 +1890,23 @@ def send_my_bets_message(chat_id: int, user_id: int):
     bot.send_message(chat_id=chat_id, text=text.strip(), reply_markup=reply_markup)
 
 
-def calculate_scores_after_finished_event(event: Event) -> Guessers:
+def calculate_event_settlement(event: Event, users: list[UserModel], bets: list[Bet]) -> tuple[Guessers, dict[int, int]]:
+    # Чистый расчёт итогов матча: (кто что угадал, {user_id: начисленные очки}) — только ненулевые начисления.
     guessed_total_score = []
     guessed_goal_difference = []
     guessed_draw = []
     guessed_only_winner = []
     guessed_who_has_gone_through = []
     triggered_jokers = []
+    scores_by_user = {}
 
     result = event.result
     if result is None:
         raise ValueError('Event does not have result')
-    users = database.get_all_users()
+    bets_by_user = {bet.user_id: bet for bet in bets}
     for user_model in users:
         user_id = user_model.id
-        bet = database.find_bet(user_id=user_id, event_uuid=event.uuid)
+        bet = bets_by_user.get(user_id)
         if bet is None:
             continue
         guessed_result = calculate_if_user_guessed_result(event_result=result, bet=bet)
@@ -1825,9 +1936,9 @@ def calculate_scores_after_finished_event(event: Event) -> Guessers:
                 guessed_who_has_gone_through.append(user_model)
 
         if scores_earned > 0:
-            database.add_scores_to_user(user_id=user_id, amount=scores_earned)
+            scores_by_user[user_id] = scores_earned
 
-    return Guessers(
+    guessers = Guessers(
         guessed_total_score=guessed_total_score,
         guessed_draw=guessed_draw,
         guessed_goal_difference=guessed_goal_difference,
@@ -1835,99 +1946,49 @@ def calculate_scores_after_finished_event(event: Event) -> Guessers:
         guessed_who_has_gone_through=guessed_who_has_gone_through,
         triggered_jokers=triggered_jokers,
     )
+    return guessers, scores_by_user
 
 
-def convert_guessed_event_to_scores(guessed_event: GuessedEvent) -> int:
-    match guessed_event:
-        case GuessedEvent.WINNER:
-            return 1
-        case GuessedEvent.DRAW:
-            return 2
-        case GuessedEvent.GOAL_DIFFERENCE:
-            return 3
-        case GuessedEvent.EXACT_SCORE:
-            return 4
-        case _:
-            raise ValueError(f'Unknown enum value: {guessed_event}')
-
-
-def calculate_if_user_guessed_result(event_result: EventResult, bet: Bet) -> GuessedEvent | None:
-    if is_exact_score(result=event_result, bet=bet):
-        return GuessedEvent.EXACT_SCORE
-    elif is_guessed_draw(result=event_result, bet=bet):
-        return GuessedEvent.DRAW
-    elif is_same_goal_difference(result=event_result, bet=bet):
-        return GuessedEvent.GOAL_DIFFERENCE
-    elif is_same_winner(result=event_result, bet=bet):
-        return GuessedEvent.WINNER
-    else:
-        return None
+# Категории scoring_utils, за которые начисляются очки, и соответствующий GuessedEvent.
+GUESSED_EVENT_BY_CATEGORY = {
+    scoring_utils.EXACT_SCORE: GuessedEvent.EXACT_SCORE,
+    scoring_utils.GOAL_DIFFERENCE: GuessedEvent.GOAL_DIFFERENCE,
+    scoring_utils.DRAW: GuessedEvent.DRAW,
+    scoring_utils.WINNER: GuessedEvent.WINNER,
+}
+CATEGORY_BY_GUESSED_EVENT = {guessed_event: category for category, guessed_event in GUESSED_EVENT_BY_CATEGORY.items()}
 
 
-def is_exact_score(result: EventResult, bet: Bet) -> bool:
-    return result.team_1_scores == bet.team_1_scores and result.team_2_scores == bet.team_2_scores
-
-
-def is_guessed_draw(result: EventResult, bet: Bet) -> bool:
-    return result.team_1_scores == result.team_2_scores and bet.team_1_scores == bet.team_2_scores
+def convert_guessed_event_to_scores(guessed_event: GuessedEvent) -> int:
+    category = CATEGORY_BY_GUESSED_EVENT.get(guessed_event)
+    if category is None:
+        raise ValueError(f'Unknown enum value: {guessed_event}')
+    return scoring_utils.CATEGORY_POINTS[category]
 
 
-def is_same_goal_difference(result: EventResult, bet: Bet) -> bool:
-    return result.team_1_scores - result.team_2_scores == bet.team_1_scores - bet.team_2_scores
+def classify_bet(event_result: EventResult, bet: Bet) -> scoring_utils.BetClassification:
+    return scoring_utils.classify(
+        event_result.team_1_scores, event_result.team_2_scores, bet.team_1_scores, bet.team_2_scores)
 
 
-def is_same_winner(result: EventResult, bet: Bet) -> bool:
-    if result.team_1_scores > result.team_2_scores:
-        return bet.team_1_scores > bet.team_2_scores
-    if result.team_1_scores < result.team_2_scores:
-        return bet.team_1_scores < bet.team_2_scores
-    return bet.team_1_scores == bet.team_2_scores
+def calculate_if_user_guessed_result(event_result: EventResult, bet: Bet) -> GuessedEvent | None:
+    return GUESSED_EVENT_BY_CATEGORY.get(classify_bet(event_result=event_result, bet=bet).category)
 
 
 def is_guessed_who_has_gone_through(result: EventResult, bet: Bet) -> bool:
-    if result.team_1_has_gone_through is None or bet.team_1_will_go_through is None:
-        return False
-    return result.team_1_has_gone_through == bet.team_1_will_go_through
-
-
-def is_one_goal_from_total_score_winner_consider(event_result: EventResult, bet: Bet) -> bool:
-    if not is_same_winner(event_result, bet):
-        return False
-    elif event_result.team_1_scores == bet.team_1_scores:
-        return bet.team_2_scores in [event_result.team_2_scores - 1, event_result.team_2_scores + 1]
-    elif event_result.team_2_scores == bet.team_2_scores:
-        return bet.team_1_scores in [event_result.team_1_scores - 1, event_result.team_1_scores + 1]
-    else:
-        return False
-
-
-def is_one_goal_from_total_score_with_two_or_more_scores(event_result: EventResult, bet: Bet) -> bool:
-    if event_result.team_1_scores + event_result.team_2_scores < 2:
-        return False
-    if event_result.team_1_scores == bet.team_1_scores:
-        return bet.team_2_scores in [event_result.team_2_scores - 1, event_result.team_2_scores + 1]
-    elif event_result.team_2_scores == bet.team_2_scores:
-        return bet.team_1_scores in [event_result.team_1_scores - 1, event_result.team_1_scores + 1]
-    else:
-        return False
+    return scoring_utils.is_guessed_who_has_gone_through(result.team_1_has_gone_through, bet.team_1_will_go_through)
 
 
 def build_leaderboard_snapshot(users: list[UserModel]) -> dict[int, dict]:
     # Ранг = номер строки в текущем leaderboard: одинаковые очки делят одно место.
-    sorted_users = sorted(users, key=lambda x: (-x.scores, x.get_full_name().casefold(), x.id))
-    result = {}
-    current_rank = 0
-    previous_score = None
-    for user_model in sorted_users:
-        if previous_score is None or user_model.scores != previous_score:
-            current_rank += 1
-            previous_score = user_model.scores
-        result[user_model.id] = {
-            'name': user_model.get_full_name(),
-            'score': user_model.scores,
-            'rank': current_rank,
-        }
-    return result
+    return Leaderboard.from_users(users).snapshot()
+
+
+def apply_scores_to_snapshot(snapshot: dict[int, dict], scores_by_user: dict[int, int]) -> dict[int, dict]:
+    # Таблица после матча = таблица до него плюс начисления; ранги меняются только у затронутых групп очков.
+    leaderboard = Leaderboard.from_entries([(user_id, x['name'], x['score']) for user_id, x in snapshot.items()])
+    leaderboard.apply_deltas(scores_by_user)
+    return leaderboard.snapshot()
 
 
 def format_leaderboard_snapshot(snapshot: dict[int, dict]) -> str:
@@ -2129,41 +2190,26 @@ def plural_ru(value: int, one: str, few: str, many: str) -> str:
 
 
 def get_leaderboard_text() -> str:
-    users = database.get_all_users()
-    users.sort(key=lambda x: x.scores, reverse=True)
-    users_dict = {}
-    for user in users:
-        if user.scores not in users_dict:
-            users_dict[user.scores] = []
-        users_dict[user.scores].append(user)
-    scores_sorted = list(users_dict.keys())
-    scores_sorted.sort(key=lambda x: x, reverse=True)
-    text = ''
-    for score in scores_sorted:
-        current_line = ', '.join(list(map(lambda x: x.get_full_name(), users_dict[score])))
-        current_line += f': {score}'
-        text += current_line.strip()
-        text += '\n'
-    return text.strip()
+    return format_leaderboard_snapshot(database.get_leaderboard_snapshot())
+
+
+def get_leaderboard_place_text(user_id: int) -> str | None:
+    # Место одного участника — бинарный поиск по материализованной таблице, без пересортировки всех.
+    rank = database.get_leaderboard_rank(user_id=user_id)
+    if rank is None:
+        return None
+    return f'Место в таблице: {format_place_to(rank)}'
 
 
 def get_users_detailed_statistic_text() -> str:
-    users = database.get_all_users()
-    users.sort(key=lambda x: x.scores, reverse=True)
-    users_dict = {}
-    for user in users:
-        if user.scores not in users_dict:
-            users_dict[user.scores] = []
-        users_dict[user.scores].append(user)
-    scores_sorted = list(users_dict.keys())
-    scores_sorted.sort(key=lambda x: x, reverse=True)
+    users_by_id = {x.id: x for x in database.get_all_users()}
     text = 'Подробная аналитика по набранным очкам (указывается число матчей):\n\n'
-    for score in scores_sorted:
-        for user in users_dict[score]:
-            user_statistic = get_user_detailed_statistic(user_model=user)
-            user_text = get_user_statistic_formatted_text(statistic=user_statistic)
-            text += user_text
-            text += '\n\n'
+    # Снимок таблицы уже упорядочен по местам.
+    for user_id in database.get_leaderboard_snapshot():
+        user_statistic = get_user_detailed_statistic(user_model=users_by_id[user_id])
+        user_text = get_user_statistic_formatted_text(statistic=user_statistic)
+        text += user_text
+        text += '\n\n'
     return text.strip()
 
 
@@ -2191,60 +2237,66 @@ def get_matches_result_statistic_text() -> str:
 
 
 def get_user_detailed_statistic(user_model: UserModel) -> DetailedStatistic:
-    guessed_total_score_count = 0
-    guessed_goal_difference_count = 0
-    guessed_draw_count = 0
-    guessed_only_winner_count = 0
-    guessed_who_has_gone_through_count = 0
-    one_goal_from_total_score_count_with_winner_consider = 0
-    one_goal_from_total_score_count_exclude_winner = 0
-    triggered_jokers_count = 0
-    joker_bets_count = 0
-    joker_bonus_scores = 0
-    events = database.get_all_events()
-    for event in events:
-        result = event.result
-        if result is None:
-            continue
-        user_bet = database.find_bet(user_id=user_model.id, event_uuid=event.uuid)
-        if user_bet is None:
-            continue
-        is_guessed_event = calculate_if_user_guessed_result(event_result=result, bet=user_bet)
-        if user_bet.is_joker:
-            joker_bets_count += 1
-            if is_guessed_event is not None:
-                triggered_jokers_count += 1
-                joker_bonus_scores += convert_guessed_event_to_scores(is_guessed_event)
-        match is_guessed_event:
-            case GuessedEvent.WINNER:
-                guessed_only_winner_count += 1
-            case GuessedEvent.GOAL_DIFFERENCE:
-                guessed_goal_difference_count += 1
-            case GuessedEvent.DRAW:
-                guessed_draw_count += 1
-            case GuessedEvent.EXACT_SCORE:
-                guessed_total_score_count += 1
-        if event.decides_who_goes_through() and is_guessed_who_has_gone_through(result=result, bet=user_bet):
-            guessed_who_has_gone_through_count += 1
-        if is_one_goal_from_total_score_winner_consider(event_result=result, bet=user_bet):
-            one_goal_from_total_score_count_with_winner_consider += 1
-        elif is_one_goal_from_total_score_with_two_or_more_scores(event_result=result, bet=user_bet):
-            one_goal_from_total_score_count_exclude_winner += 1
+    # Счётчики хранятся в users.statistic: наращиваются при расчёте каждого матча (finish_event_and_announce)
+    # и пересобираются целиком rebuild_users_statistic.
     return DetailedStatistic(
         user_model=user_model,
-        guessed_total_score_count=guessed_total_score_count,
-        guessed_goal_difference_count=guessed_goal_difference_count,
-        guessed_draw_count=guessed_draw_count,
-        guessed_only_winner_count=guessed_only_winner_count,
-        guessed_who_has_gone_through_count=guessed_who_has_gone_through_count,
-        one_goal_from_total_score_count_with_winner_consider=one_goal_from_total_score_count_with_winner_consider,
-        one_goal_from_total_score_count_exclude_winner=one_goal_from_total_score_count_exclude_winner,
-        triggered_jokers_count=triggered_jokers_count,
-        joker_bets_count=joker_bets_count,
-        joker_bonus_scores=joker_bonus_scores,
+        **{key: user_model.statistic.get(key, 0) for key in DETAILED_STATISTIC_COUNTERS},
     )
 
 
+def calculate_bet_statistic(event: Event, bet: Bet) -> dict[str, int]:
+    # Вклад одной ставки на завершённый матч в счётчики DetailedStatistic; только ненулевые.
+    result = event.result
+    if result is None:
+        raise ValueError('Event does not have result')
+    statistic = {}
+
+    def increment(key: str, amount: int = 1):
+        statistic[key] = statistic.get(key, 0) + amount
+
+    classification = classify_bet(event_result=result, bet=bet)
+    is_guessed_event = GUESSED_EVENT_BY_CATEGORY.get(classification.category)
+    if bet.is_joker:
+        increment('joker_bets_count')
+        if is_guessed_event is not None:
+            increment('triggered_jokers_count')
+            increment('joker_bonus_scores', convert_guessed_event_to_scores(is_guessed_event))
+    match is_guessed_event:
+        case GuessedEvent.WINNER:
+            increment('guessed_only_winner_count')
+        case GuessedEvent.GOAL_DIFFERENCE:
+            increment('guessed_goal_difference_count')
+        case GuessedEvent.DRAW:
+            increment('guessed_draw_count')
+        case GuessedEvent.EXACT_SCORE:
+            increment('guessed_total_score_count')
+    if event.decides_who_goes_through() and is_guessed_who_has_gone_through(result=result, bet=bet):
+        increment('guessed_who_has_gone_through_count')
+    if classification.near_miss_winner:
+        increment('one_goal_from_total_score_count_with_winner_consider')
+    elif classification.near_miss_other:
+        increment('one_goal_from_total_score_count_exclude_winner')
+    return statistic
+
+
+def rebuild_users_statistic() -> int:
+    # Пересборка users.statistic по всем завершённым матчам: ставки на них — одним агрегирующим запросом
+    # (get_bets_for_events), счётчики — в памяти, запись — одним bulk_write. Под finish_event_lock,
+    # чтобы не разойтись с параллельным расчётом матча. Возвращает число участников со счётчиками.
+    with finish_event_lock:
+        finished_events = [x for x in database.get_all_events() if x.result is not None]
+        bets_by_event = database.get_bets_for_events([x.uuid for x in finished_events])
+        statistic_by_user = {}
+        for event in finished_events:
+            for bet in bets_by_event[event.uuid]:
+                user_statistic = statistic_by_user.setdefault(bet.user_id, {})
+                for key, value in calculate_bet_statistic(event=event, bet=bet).items():
+                    user_statistic[key] = user_statistic.get(key, 0) + value
+        database.replace_users_statistic(statistic_by_user)
+    return len(statistic_by_user)
+
+
 def get_user_statistic_formatted_text(statistic: DetailedStatistic) -> str:
     text = f'{statistic.user_model.get_full_name()}:\n'
     text += f'Точный счёт: {statistic.guessed_total_score_count}\n'
@@ -2274,14 +2326,29 @@ def get_maintainer_ids() -> list:
     return list(map(lambda x: int(x), value.split(',')))
 
 
+def get_scheduled_jobs() -> list[tuple[int, Callable, bool]]:
+    # (интервал в секундах, задача, запустить сразу при старте) — общий список для обоих рантаймов.
+    # Напоминания по календарю матчей сюда не входят: у них свой поток (reminder_scheduler).
+    # Результаты матчей опрашиваем раз в 30 секунд, чтобы не ждать расчёта после финального свистка.
+    # Худшая минута — 3 запроса (два опроса + ежечасная проверка незавершённых матчей), втрое ниже
+    # лимита football-data.org (10/мин); без идущих матчей check_api_results в сеть не ходит.
+    jobs = [
+        (30, check_api_results, True),
+        # Доставка плановых уведомлений из outbox; при старте — добить недоставленное до рестарта.
+        (10, drain_outbox, True),
+        (interaction_utils.FLUSH_INTERVAL_SECONDS, flush_interactions, False),
+    ]
+    return [
+        (interval, lambda task=task, interval=interval: run_scheduled_task(task, interval_seconds=interval), at_start)
+        for interval, task, at_start in jobs
+    ]
+
+
 def run_scheduler():
-    schedule.every(10).minutes.do(do_every_ten_minutes)
-    # Результаты матчей опрашиваем чаще общего тика, чтобы не ждать расчёта до 10 минут
-    # после финального свистка. Худшая минута — 3 запроса (два опроса + вызов из
-    # 10-минутного тика), втрое ниже лимита football-data.org (10/мин);
-    # без идущих матчей check_api_results в сеть не ходит.
-    schedule.every(30).seconds.do(run_scheduled_task, check_api_results)
-    run_scheduled_task(check_api_results)
+    for interval_seconds, task, run_at_start in get_scheduled_jobs():
+        schedule.every(interval_seconds).seconds.do(task)
+        if run_at_start:
+            task()
     while True:
         try:
             schedule.run_pending()
@@ -2290,40 +2357,105 @@ def run_scheduler():
         time.sleep(1)
 
 
-def run_scheduled_task(task):
+def run_scheduled_task(task: Callable, interval_seconds: float | None = None):
     # Любое исключение из одной плановой задачи не должно срывать остальные проверки тика.
+    # Каждый прогон попадает в task_metrics (длительность, запросы, переборы интервала).
     try:
-        task()
+        task_metrics.run(task.__name__, task, interval_seconds=interval_seconds)
     except Exception as e:
         logging.exception(e)
 
 
-def do_every_ten_minutes():
-    tasks = (
-        send_morning_message_with_games_today,
-        check_coming_soon_events,
-        check_for_night_events,
-        check_api_results,  # основной опрос — раз в 30 секунд в run_scheduler; здесь — чтобы в рамках
-        # тика успеть завершить матч по API до check_for_unfinished_events и не алертить зря
-        check_for_unfinished_events,
-        check_playoff_joker_reminders,
-        check_tournament_end_joker_reminders,
-        check_for_burned_jokers_after_playoff_start,
-        check_special_bets_reminders,
-        check_special_bets_close,
+def create_reminder_scheduler() -> reminder_utils.ReminderScheduler:
+    # (имя, когда в следующий раз пора, задача). Сообщения задач разовые (ключ напоминания + outbox),
+    # поэтому прогон вдогонку при старте и при каждом изменении календаря ничего не дублирует.
+    scheduler = reminder_utils.ReminderScheduler(
+        load_events=lambda: database.get_all_events(),
+        get_calendar_version=lambda: database.events_cache.version,
+        run_task=lambda name, task: task_metrics.run(name, task),
     )
-    for task in tasks:
-        run_scheduled_task(task)
+    scheduler.add('morning_message', plan_morning_message, send_morning_message_with_games_today)
+    scheduler.add('coming_soon_events', plan_coming_soon_events, check_coming_soon_events)
+    scheduler.add('night_events', plan_night_events, check_for_night_events)
+    scheduler.add('unfinished_events', plan_unfinished_events_check, check_api_results_and_unfinished_events)
+    scheduler.add('playoff_joker_reminders', plan_playoff_joker_reminders, check_playoff_joker_reminders)
+    scheduler.add('tournament_end_joker_reminders', plan_tournament_end_joker_reminders,
+                  check_tournament_end_joker_reminders)
+    scheduler.add('burned_jokers', plan_burned_jokers_check, check_for_burned_jokers_after_playoff_start)
+    scheduler.add('special_bets_reminders', plan_special_bets_reminders, check_special_bets_reminders)
+    scheduler.add('special_bets_close', plan_special_bets_close, check_special_bets_close)
+    return scheduler
+
+
+def plan_morning_message(events: list[Event], after: datetime) -> datetime | None:
+    return reminder_utils.get_next_daily_instant(after, hour=9, minute=10)
+
+
+def plan_night_events(events: list[Event], after: datetime) -> datetime | None:
+    return reminder_utils.get_next_daily_instant(after, hour=20, minute=40)
+
+
+def plan_coming_soon_events(events: list[Event], after: datetime) -> datetime | None:
+    offsets = [offset for _, offset in event_utils.EVENT_REMINDER_THRESHOLDS]
+    instants = [reminder_utils.get_next_threshold_instant(x.get_time_in_utc(), offsets, after)
+                for x in events if x.result is None]
+    return min(filter(None, instants), default=None)
+
+
+def plan_unfinished_events_check(events: list[Event], after: datetime) -> datetime | None:
+    # Проверка раз в час (в hh:10), пока есть матчи без результата; раньше двух часов после начала
+    # матч завершения не требует (is_event_requires_finish).
+    start_times = [x.get_time_in_utc() for x in events if x.result is None]
+    if len(start_times) == 0:
+        return None
+    return reminder_utils.get_next_hourly_instant(max(after, min(start_times) + timedelta(hours=2)), minute=10)
+
+
+def plan_playoff_joker_reminders(events: list[Event], after: datetime) -> datetime | None:
+    offsets = [timedelta(hours=x) for x in joker_utils.REMINDER_HOURS]
+    return reminder_utils.get_next_threshold_instant(joker_utils.get_playoff_start(events), offsets, after)
+
+
+def plan_tournament_end_joker_reminders(events: list[Event], after: datetime) -> datetime | None:
+    offsets = [timedelta(hours=x) for x in joker_utils.REMINDER_HOURS]
+    return reminder_utils.get_next_threshold_instant(joker_utils.get_tournament_end(events), offsets, after)
+
+
+def plan_burned_jokers_check(events: list[Event], after: datetime) -> datetime | None:
+    return reminder_utils.get_next_threshold_instant(joker_utils.get_playoff_start(events), [timedelta()], after)
+
+
+def plan_special_bets_reminders(events: list[Event], after: datetime) -> datetime | None:
+    offsets = [offset for _, offset in tournament_utils.SPECIAL_BET_REMINDER_THRESHOLDS]
+    return reminder_utils.get_next_threshold_instant(tournament_utils.get_tournament_start(events), offsets, after)
+
+
+def plan_special_bets_close(events: list[Event], after: datetime) -> datetime | None:
+    return reminder_utils.get_next_threshold_instant(tournament_utils.get_tournament_start(events), [timedelta()], after)
+
+
+def check_api_results_and_unfinished_events():
+    # Сначала опрос API: матч, который уже можно завершить по football-data.org, не должен попасть в алерт.
+    check_api_results()
+    check_for_unfinished_events()
 
 
 def send_morning_message_with_games_today():
     if not is_now_good_time_for_morning_message():
         return
+    # Разово за день: задачу могут прогнать вдогонку после изменения календаря в том же окне.
+    queue_reminder_if_required(
+        key=f'morning_message:{datetime_utils.get_moscow_time().date().isoformat()}',
+        build_messages=build_morning_messages,
+    )
+
+
+def build_morning_messages() -> list[tuple[int, str]]:
     from_time = datetime_utils.get_utc_time()
     to_time = from_time + timedelta(hours=24)
     events_today = database.find_events_in_time_range(from_inclusive=from_time, to_exclusive=to_time)
     if len(events_today) == 0:
-        return
+        return []
     text = 'Доброе утро! Сегодня у нас:\n\n'
     for event in events_today:
         match_time = event.get_time_in_moscow_zone().strftime('%H:%M')
@@ -2342,7 +2474,7 @@ def send_morning_message_with_games_today():
             text += '\n'
     text += '\n-----\n'
     text += get_leaderboard_text()
-    bot.send_message(chat_id=get_target_chat_id(), text=text.strip())
+    return [(get_target_chat_id(), text.strip())]
 
 
 def is_now_good_time_for_morning_message() -> bool:
@@ -2351,23 +2483,40 @@ def is_now_good_time_for_morning_message() -> bool:
 
 
 def check_coming_soon_events():
+    # Пороговые напоминания (event_utils.EVENT_REMINDER_THRESHOLDS): планировщик будит задачу в момент порога,
+    # разовость и доставку дают ключ напоминания и outbox. Пройденные менее срочные пороги гасим, как в
+    # send_joker_threshold_reminder_if_due, чтобы после простоя не слать «скоро начнётся» вслед за LAST CALL.
     now_utc = datetime_utils.get_utc_time()
-    coming_soon_events = database.find_events_in_time_range(
-        from_inclusive=now_utc + timedelta(hours=1, minutes=40),
-        to_exclusive=now_utc + timedelta(hours=1, minutes=50)  # интервал должен быть 10 минут!
-    )
-    for event in coming_soon_events:
-        match_time = event.get_time_in_moscow_zone().strftime('%H:%M')
-        header = f'❗️Матч {event.team_1} – {event.team_2} начнётся в {match_time}, но не все сделали прогноз:'
-        send_event_will_start_soon_warning(event_uuid=event.uuid, header_text=header)
-
-    coming_very_soon_events = database.find_events_in_time_range(
-        from_inclusive=now_utc + timedelta(minutes=5),
-        to_exclusive=now_utc + timedelta(minutes=15)  # интервал должен быть 10 минут!
-    )
-    for event in coming_very_soon_events:
-        header = f'‼️ LAST CALL ‼️'
-        send_event_will_start_soon_warning(event_uuid=event.uuid, header_text=header)
+    longest_offset = max(offset for _, offset in event_utils.EVENT_REMINDER_THRESHOLDS)
+    warnings = []  # (ключ напоминания, uuid матча, заголовок)
+    for event in database.get_all_events():
+        start = event.get_time_in_utc()
+        if event.result is not None or not now_utc < start <= now_utc + longest_offset:
+            continue
+        due_label, crossed = tournament_utils.select_due_threshold(
+            now_utc, start, event_utils.EVENT_REMINDER_THRESHOLDS
+        )
+        for label in crossed:
+            if label != due_label:
+                database.claim_reminder(f'coming_soon:{label}:{event.uuid}:{start.isoformat()}')
+        key = f'coming_soon:{due_label}:{event.uuid}:{start.isoformat()}'
+        if database.is_reminder_claimed(key):
+            continue
+        if due_label == 'last_call':
+            header = f'‼️ LAST CALL ‼️'
+        else:
+            match_time = event.get_time_in_moscow_zone().strftime('%H:%M')
+            header = f'❗️Матч {event.team_1} – {event.team_2} начнётся в {match_time}, но не все сделали прогноз:'
+        warnings.append((key, event.uuid, header))
+    if len(warnings) == 0:
+        return
+    # Матчи с одним временем начала приходят на один порог вместе — кто без ставки, узнаём одним запросом.
+    user_ids_without_bets = database.get_user_ids_without_bets([event_uuid for _, event_uuid, _ in warnings])
+    for key, event_uuid, header in warnings:
+        queue_reminder_if_required(key=key, build_messages=lambda: build_event_will_start_soon_messages(
+            header_text=header,
+            user_ids_without_bets=user_ids_without_bets[event_uuid],
+        ))
 
 
 def check_for_night_events():
@@ -2375,7 +2524,11 @@ def check_for_night_events():
     moscow_time = datetime_utils.get_moscow_time()
     if moscow_time.hour != 20 or moscow_time.minute not in range(40, 50):
         return
+    queue_reminder_if_required(key=f'night_events:{moscow_time.date().isoformat()}',
+                               build_messages=build_night_events_messages)
 
+
+def build_night_events_messages() -> list[tuple[int, str]]:
     # Проверяем все матчи, которые начнутся с 00:40(00:50) до 08:40(08:50).
     event_datetime_utc_start = datetime_utils.get_utc_time() + timedelta(hours=4)
     event_datetime_utc_end = event_datetime_utc_start + timedelta(hours=8)
@@ -2386,16 +2539,15 @@ def check_for_night_events():
     )
 
     if len(coming_soon_night_events) == 0:
-        return
+        return []
 
     all_users = database.get_all_users()
     already_mentioned_users = set()
     text = 'Не забудьте про ночные матчи!\n\n'
 
+    user_ids_without_bets = database.get_user_ids_without_bets([event.uuid for event in coming_soon_night_events])
     for event in coming_soon_night_events:
-        users_without_bets = list(
-            filter(lambda x: database.find_bet(user_id=x.id, event_uuid=event.uuid) is None, all_users)
-        )
+        users_without_bets = [x for x in all_users if x.id in user_ids_without_bets[event.uuid]]
         for user in users_without_bets:
             if user in already_mentioned_users:
                 continue
@@ -2406,15 +2558,17 @@ def check_for_night_events():
                 text += user.first_name
             text += ' '
 
-    if len(already_mentioned_users) > 0:
-        bot.send_message(chat_id=get_target_chat_id(), text=text.strip())
+    if len(already_mentioned_users) == 0:
+        return []
+    return [(get_target_chat_id(), text.strip())]
 
 
-def send_event_will_start_soon_warning(event_uuid: str, header_text: str):
-    all_users = database.get_all_users()
-    without_bets = list(filter(lambda x: database.find_bet(user_id=x.id, event_uuid=event_uuid) is None, all_users))
+def build_event_will_start_soon_messages(header_text: str, user_ids_without_bets: set[int]) -> list[tuple[int, str]]:
+    if len(user_ids_without_bets) == 0:
+        return []
+    without_bets = [x for x in database.get_all_users() if x.id in user_ids_without_bets]
     if len(without_bets) == 0:
-        return
+        return []
     text = header_text
     text += '\n'
     for user in without_bets:
@@ -2423,28 +2577,26 @@ def send_event_will_start_soon_warning(event_uuid: str, header_text: str):
         else:
             text += user.first_name
         text += '\n'
-    bot.send_message(chat_id=get_target_chat_id(), text=text.strip())
+    return [(get_target_chat_id(), text.strip())]
 
 
 def get_all_users_with_joker_status() -> list[tuple[UserModel, joker_utils.JokerStatus]]:
-    all_events = database.get_all_events()
-    now_utc = datetime_utils.get_utc_time()
-    result = []
-    for user_model in database.get_all_users():
-        status = joker_utils.calculate_joker_status(
-            bets_with_events=get_user_bets_with_events(user_id=user_model.id),
-            events=all_events,
-            now_utc=now_utc,
-        )
-        result.append((user_model, status))
-    return result
+    # Ставки берём из снимка участников (users_cache сбрасывается при каждой записи ставки), календарь —
+    # один на всех: без запроса ставок и поиска матча по каждой ставке каждого участника.
+    all_users = database.get_all_users()
+    statuses = joker_utils.calculate_joker_statuses(
+        bets_by_user={user_model.id: user_model.bets for user_model in all_users},
+        events=database.get_all_events(),
+        now_utc=datetime_utils.get_utc_time(),
+    )
+    return [(user_model, statuses[user_model.id]) for user_model in all_users]
 
 
-def send_joker_threshold_reminder_if_due(target_time, now_utc, key_prefix, send_reminder):
+def send_joker_threshold_reminder_if_due(target_time, now_utc, key_prefix, build_messages):
     # Надёжно к дрейфу планировщика: напоминание срабатывает на ПЕРВОМ тике после того, как порог
     # (за 48/24/6 ч до target_time) пройден, а не в узком 10-минутном окне, которое тик может проскочить.
-    # Разовость гарантирует database.claim_reminder (ключ привязан к target_time, поэтому при сдвиге
-    # расписания напоминание корректно переоценивается заново).
+    # Разовость гарантирует ключ напоминания (привязан к target_time, поэтому при сдвиге
+    # расписания напоминание корректно переоценивается заново), доставку — outbox.
     crossed_hours = [
         hours_before for hours_before in joker_utils.REMINDER_HOURS
         if now_utc >= target_time - timedelta(hours=hours_before)
@@ -2452,8 +2604,10 @@ def send_joker_threshold_reminder_if_due(target_time, now_utc, key_prefix, send_
     if len(crossed_hours) == 0:
         return
     most_urgent_hours = min(crossed_hours)
-    if database.claim_reminder(f'{key_prefix}:{most_urgent_hours}:{target_time.isoformat()}'):
-        send_reminder(hours_before=most_urgent_hours)
+    queue_reminder_if_required(
+        key=f'{key_prefix}:{most_urgent_hours}:{target_time.isoformat()}',
+        build_messages=lambda: build_messages(hours_before=most_urgent_hours),
+    )
     # Гасим менее срочные пройденные пороги (например, при старте бота уже после окна 48 ч),
     # чтобы они не сработали отдельным запоздалым сообщением.
     for hours_before in crossed_hours:
@@ -2471,37 +2625,53 @@ def check_playoff_joker_reminders():
         target_time=playoff_start,
         now_utc=now_utc,
         key_prefix='playoff_joker',
-        send_reminder=send_playoff_joker_reminders,
+        build_messages=build_playoff_joker_reminders,
     )
 
 
-def send_joker_reminder_message(chat_id: int, text: str):
-    # Best-effort: пользователь мог заблокировать бота или ни разу не открыть приватный чат
-    # (bot.send_message бросит ApiTelegramException). Один такой получатель не должен прерывать
-    # рассылку остальным и публичное сообщение, тем более что маркер claim_reminder уже записан.
-    try:
-        bot.send_message(chat_id=chat_id, text=text)
-    except Exception as e:
-        logging.exception(e)
+def broadcast_messages(name: str, messages: list[tuple[int, str]]) -> broadcast_utils.Broadcast:
+    # Best-effort рассылка [(chat_id, text)] через общий пул без сохранения в outbox (алерты мейнтейнерам).
+    # Пользователь мог заблокировать бота или ни разу не открыть приватный чат — такой получатель
+    # попадёт в сводку исходов и не помешает остальным.
+    return broadcaster.broadcast(name=name, messages=messages)
+
+
+def queue_reminder_if_required(key: str, build_messages: Callable[[], list[tuple[int, str]]]):
+    # Разовое напоминание через outbox: ключ застолбляется вместе с постановкой сообщений в очередь,
+    # доставленным считается только после отправки (Database.enqueue_reminder, outbox_utils.drain_outbox).
+    # Рестарт процесса или лежащий Telegram больше не теряют напоминание.
+    if database.is_reminder_claimed(key):
+        return
+    database.enqueue_reminder(key=key, messages=build_messages())
 
 
-def send_playoff_joker_reminders(hours_before: int):
+def drain_outbox():
+    outbox_utils.drain_outbox(database=database, broadcaster=broadcaster)
+
+
+def flush_interactions():
+    interaction_tracker.flush(write=database.update_last_interactions)
+
+
+def build_playoff_joker_reminders(hours_before: int) -> list[tuple[int, str]]:
     affected_users = []
+    messages = []
     for user_model, status in get_all_users_with_joker_status():
         if status.will_burn_at_playoff_start <= 0:
             continue
         affected_users.append(user_model)
         text = (f'Напоминание о джокерах: до старта плей-офф меньше {hours_before} часов.\n\n'
                 f'{joker_utils.get_joker_status_text(status)}')
-        send_joker_reminder_message(chat_id=user_model.id, text=text)
+        messages.append((user_model.id, text))
 
     if len(affected_users) == 0:
-        return
+        return messages
 
     mentions = ' '.join(map(get_user_mention, affected_users))
     text = (f'Напоминание о джокерах перед плей-офф:\n{mentions}\n'
             f'Если не потратить джокеры на матчи группового этапа, часть сгорит к старту плей-офф.')
-    send_joker_reminder_message(chat_id=get_target_chat_id(), text=text)
+    messages.append((get_target_chat_id(), text))
+    return messages
 
 
 def check_tournament_end_joker_reminders():
@@ -2514,27 +2684,29 @@ def check_tournament_end_joker_reminders():
         target_time=tournament_end,
         now_utc=now_utc,
         key_prefix='tournament_end_joker',
-        send_reminder=send_tournament_end_joker_reminders,
+        build_messages=build_tournament_end_joker_reminders,
     )
 
 
-def send_tournament_end_joker_reminders(hours_before: int):
+def build_tournament_end_joker_reminders(hours_before: int) -> list[tuple[int, str]]:
     affected_users = []
+    messages = []
     for user_model, status in get_all_users_with_joker_status():
         if status.remaining_usable_now <= 0:
             continue
         affected_users.append(user_model)
         text = (f'Напоминание о джокерах: до конца турнира меньше {hours_before} часов.\n\n'
                 f'{joker_utils.get_joker_status_text(status)}')
-        send_joker_reminder_message(chat_id=user_model.id, text=text)
+        messages.append((user_model.id, text))
 
     if len(affected_users) == 0:
-        return
+        return messages
 
     mentions = ' '.join(map(get_user_mention, affected_users))
     text = (f'Напоминание о джокерах перед концом турнира:\n{mentions}\n'
             f'У вас остались неиспользованные джокеры.')
-    send_joker_reminder_message(chat_id=get_target_chat_id(), text=text)
+    messages.append((get_target_chat_id(), text))
+    return messages
 
 
 def check_for_burned_jokers_after_playoff_start():
@@ -2543,10 +2715,15 @@ def check_for_burned_jokers_after_playoff_start():
     now_utc = datetime_utils.get_utc_time()
     if playoff_start is None or now_utc < playoff_start:
         return
-    # Срабатывает на первом тике после старта плей-офф и ровно один раз (claim_reminder),
+    # Срабатывает на первом тике после старта плей-офф и ровно один раз (ключ напоминания),
     # без узкого окна, которое дрейф планировщика мог проскочить и потерять сообщение навсегда.
-    if not database.claim_reminder(f'burned_at_playoff_start:{playoff_start.isoformat()}'):
-        return
+    queue_reminder_if_required(
+        key=f'burned_at_playoff_start:{playoff_start.isoformat()}',
+        build_messages=build_burned_jokers_message,
+    )
+
+
+def build_burned_jokers_message() -> list[tuple[int, str]]:
     # Одно сообщение в общий чат с упоминанием всех, у кого сгорели джокеры, и числом сгоревших.
     lines = []
     for user_model, status in get_all_users_with_joker_status():
@@ -2554,19 +2731,18 @@ def check_for_burned_jokers_after_playoff_start():
             continue
         lines.append(f'{get_user_mention(user_model)} — {status.will_burn_at_playoff_start}')
     if len(lines) == 0:
-        return
+        return []
     text = 'Стартовал плей-офф, сгорели неиспользованные джокеры:\n' + '\n'.join(lines)
-    send_joker_reminder_message(chat_id=get_target_chat_id(), text=text)
+    return [(get_target_chat_id(), text)]
 
 
-def send_special_bet_reminder(header: str, users_without_bet: list[UserModel]):
+def build_special_bet_reminder(header: str, users_without_bet: list[UserModel]) -> list[tuple[int, str]]:
     # Публичное напоминание в общий чат с упоминанием только тех, кто ещё не сделал ставку.
-    # Маркер claim_reminder ставится вызывающим ДО построения списка, поэтому при пустом списке
-    # просто ничего не шлём (но порог уже погашен) — как в check_special_bets_close.
+    # При пустом списке ничего не шлём, но порог всё равно гасится — как в check_special_bets_close.
     if len(users_without_bet) == 0:
-        return
+        return []
     mentions = '\n'.join(map(get_user_mention, users_without_bet))
-    send_joker_reminder_message(chat_id=get_target_chat_id(), text=f'{header}\n{mentions}')
+    return [(get_target_chat_id(), f'{header}\n{mentions}')]
 
 
 def check_special_bets_reminders():
@@ -2594,22 +2770,27 @@ def check_special_bets_reminders():
         return
 
     if tournament.champion_bet_open:
-        if database.claim_reminder(f'special_remind:champion:{due_label}:{start.isoformat()}'):
-            without_bet = [u for u in database.get_all_users() if not database.get_champion_bet(u.id)]
-            send_special_bet_reminder(strings.CHAMPION_REMINDER_HEADERS[due_label], without_bet)
+        queue_reminder_if_required(
+            key=f'special_remind:champion:{due_label}:{start.isoformat()}',
+            build_messages=lambda: build_special_bet_reminder(
+                strings.CHAMPION_REMINDER_HEADERS[due_label],
+                [u for u in database.get_all_users() if not database.get_champion_bet(u.id)],
+            ),
+        )
         # Гасим менее срочные пройденные пороги, чтобы они не выстрелили запоздалым сообщением.
         for label in crossed:
             if label != due_label:
                 database.claim_reminder(f'special_remind:champion:{label}:{start.isoformat()}')
 
     if tournament.group_bet_open:
-        if database.claim_reminder(f'special_remind:group:{due_label}:{start.isoformat()}'):
-            group_ids = [group.id for group in tournament.groups]
-            without_bet = [
+        group_ids = [group.id for group in tournament.groups]
+        queue_reminder_if_required(
+            key=f'special_remind:group:{due_label}:{start.isoformat()}',
+            build_messages=lambda: build_special_bet_reminder(strings.GROUP_REMINDER_HEADERS[due_label], [
                 u for u in database.get_all_users()
                 if tournament_utils.missing_group_ids(database.get_group_champion_bets(u.id), group_ids)
-            ]
-            send_special_bet_reminder(strings.GROUP_REMINDER_HEADERS[due_label], without_bet)
+            ]),
+        )
         for label in crossed:
             if label != due_label:
                 database.claim_reminder(f'special_remind:group:{label}:{start.isoformat()}')
@@ -2618,7 +2799,7 @@ def check_special_bets_reminders():
 def check_special_bets_close():
     # Авто-закрытие спецставок при старте первого матча: разовое «вы опоздали» тем,
     # кто не сделал открытую ставку. Сам приём закрывается «по часам» (is_betting_closed),
-    # здесь только разовая рассылка. Идемпотентно через claim_reminder (как burned-at-playoff).
+    # здесь только разовая рассылка. Идемпотентно через ключ напоминания и outbox (как burned-at-playoff).
     events = database.get_all_events()
     if len(events) == 0:
         return
@@ -2628,14 +2809,16 @@ def check_special_bets_close():
     tournament = database.get_tournament()
     if tournament is None:
         return
-    if tournament.champion_bet_open and database.claim_reminder(f'special_bet_late:champion:{start.isoformat()}'):
-        for user_model in database.get_all_users():
-            if not database.get_champion_bet(user_model.id):
-                send_joker_reminder_message(chat_id=user_model.id, text=strings.CHAMPION_BET_MISSED)
-    if tournament.group_bet_open and database.claim_reminder(f'special_bet_late:group:{start.isoformat()}'):
-        for user_model in database.get_all_users():
-            if not database.get_group_champion_bets(user_model.id):
-                send_joker_reminder_message(chat_id=user_model.id, text=strings.GROUP_BET_MISSED)
+    if tournament.champion_bet_open:
+        queue_reminder_if_required(key=f'special_bet_late:champion:{start.isoformat()}', build_messages=lambda: [
+            (user_model.id, strings.CHAMPION_BET_MISSED)
+            for user_model in database.get_all_users() if not database.get_champion_bet(user_model.id)
+        ])
+    if tournament.group_bet_open:
+        queue_reminder_if_required(key=f'special_bet_late:group:{start.isoformat()}', build_messages=lambda: [
+            (user_model.id, strings.GROUP_BET_MISSED)
+            for user_model in database.get_all_users() if not database.get_group_champion_bets(user_model.id)
+        ])
 
 
 api_token_missing_logged = False  # чтобы предупредить об отсутствии токена один раз, а не на каждом опросе
@@ -2643,6 +2826,8 @@ api_token_missing_logged = False  # чтобы предупредить об о
 # При опросе раз в 30 секунд неизменное состояние матча засоряло бы лог сотнями повторов —
 # запоминаем последнюю залогированную строку по событию и пишем только переходы.
 api_poll_logged_states = {}
+# Кэш ответов football-data.org, минутный бюджет запросов и адаптивный интервал опроса.
+api_poll_state = football_api.PollState()
 
 
 def log_api_poll_state_change(event: Event, message: str, level: int = logging.INFO):
@@ -2652,8 +2837,9 @@ def log_api_poll_state_change(event: Event, message: str, level: int = logging.I
     logging.log(level, message)
 
 
-# Авто-завершение матчей: пока идёт хотя бы один матч, раз в 30 секунд спрашиваем у football-data.org
-# завершённые матчи и закрываем наши события тем же путём, что и ручной /result.
+# Авто-завершение матчей: пока идёт хотя бы один матч, спрашиваем у football-data.org
+# завершённые матчи и закрываем наши события тем же путём, что и ручной /result. Тик — 30 секунд,
+# но в первом тайме запрос уходит раз в несколько минут (football_api.POLL_INTERVALS).
 # Любая ошибка здесь не должна сорвать остальные проверки тика, поэтому всё в try/except.
 def check_api_results():
     global api_token_missing_logged
@@ -2669,16 +2855,21 @@ def check_api_results():
         if len(events_in_progress) == 0:
             logging.info('football-data.org auto-finish skipped: no events in progress')
             return
+        if not api_poll_state.is_due(events_in_progress, now=datetime_utils.get_utc_time()):
+            return  # до финального свистка далеко или по всем матчам API уже сказал последнее слово
         # Окно от даты самого раннего идущего матча до завтра: ночные матчи могут
         # начаться до полуночи UTC, а закончиться после.
         date_from = min(map(lambda x: x.get_time_in_utc(), events_in_progress)).date()
         date_to = (datetime_utils.get_utc_time() + timedelta(days=1)).date()
         logging.info(f'Checking football-data.org for {len(events_in_progress)} event(s) in progress '
                      f'from {date_from.isoformat()} to {date_to.isoformat()}')
-        api_matches = football_api.fetch_matches(token=token, date_from=date_from, date_to=date_to)
+        api_matches = football_api.fetch_matches(token=token, date_from=date_from, date_to=date_to,
+                                                 state=api_poll_state, client=shared_http_client)
         if api_matches is None:
             return  # причина уже в логе; сработает обычный алерт о незавершённых матчах
         logging.info(f'football-data.org returned {len(api_matches)} parsed match(es)')
+        # Индекс строится раз на опрос — поиск по каждому идущему матчу не перебирает всё окно дат.
+        api_matches = football_api.ApiMatchIndex(api_matches)
         for event in events_in_progress:
             try:
                 settle_event_from_api(event=event, api_matches=api_matches)
@@ -2688,7 +2879,7 @@ def check_api_results():
         logging.exception(e)
 
 
-def settle_event_from_api(event: Event, api_matches: list):
+def settle_event_from_api(event: Event, api_matches: football_api.ApiMatchIndex):
     api_match, reason = football_api.find_api_match_for_event(event=event, api_matches=api_matches)
     if api_match is None:
         if reason.startswith('unmapped_team') and database.claim_reminder(f'api_unmapped:{event.uuid}'):
@@ -2697,8 +2888,7 @@ def settle_event_from_api(event: Event, api_matches: list):
             msg = strings.API_UNMAPPED_EVENT % (event.team_1, event.team_2)
             msg += '\n'
             msg += event.uuid
-            for user_id in get_maintainer_ids():
-                send_joker_reminder_message(chat_id=user_id, text=msg)
+            broadcast_messages(name=f'api_unmapped:{event.uuid}', messages=[(x, msg) for x in get_maintainer_ids()])
         else:
             # not_found/ambiguous — возможно транзиентно; часовой алерт прикроет.
             log_api_poll_state_change(event, f'No API match for event {event.uuid} '
@@ -2714,6 +2904,8 @@ def settle_event_from_api(event: Event, api_matches: list):
                                          f'({event.team_1} – {event.team_2}) from API match '
                                          f'{api_match.home_team} – {api_match.away_team}: {reason}',
                                   level=logging.WARNING)
+        if reason in football_api.PERMANENT_RESULT_FAILURES:
+            api_poll_state.stop_tracking(event.uuid)
         return
     if finish_event_and_announce(event=event, result=result):
         logging.info(f'Auto-finished event {event.uuid} ({event.team_1} – {event.team_2}) '
@@ -2727,17 +2919,21 @@ def check_for_unfinished_events():
     all_events = database.get_all_events()
     events_on_progress = list(filter(lambda x: x.is_in_progress(), all_events))
     result_events = list(filter(lambda x: is_event_requires_finish(x), events_on_progress))
+    if len(result_events) == 0:
+        return
     if len(result_events) == 1:
         event = result_events[0]
         msg = f'❗️Матч {event.team_1} – {event.team_2} требует завершения.'
         msg += '\n'
         msg += event.uuid
-        for user_id in get_maintainer_ids():
-            bot.send_message(user_id, text=msg)
-    elif len(result_events) > 1:
+    else:
         msg = f'❗{len(result_events)} матча требуют завершения.'
-        for user_id in get_maintainer_ids():
-            bot.send_message(user_id, text=msg)
+    # Раз в час: каждое завершение матча меняет календарь, и планировщик прогоняет задачу вдогонку
+    # в том же окне hh:10 – hh:20 — ключ часа не даёт повторить алерт.
+    queue_reminder_if_required(
+        key=f'unfinished_events:{utc_time.strftime('%Y-%m-%dT%H')}',
+        build_messages=lambda: [(user_id, msg) for user_id in get_maintainer_ids()],
+    )
 
 
 def is_event_requires_finish(unfinished_event: Event) -> bool:
@@ -2750,8 +2946,31 @@ def is_event_requires_finish(unfinished_event: Event) -> bool:
 
 
 scheduler_thread = threading.Thread(target=run_scheduler)
-scheduler_thread.start()
+reminder_scheduler = create_reminder_scheduler()
+reminder_thread = threading.Thread(target=reminder_scheduler.run_forever, daemon=True)
 
 
 if __name__ == '__main__':
-    bot.infinity_polling()
+    # Подготовка хранилища — до старта планировщика и приёма апдейтов, чтобы никто не читал ставки
+    # посреди переноса в коллекцию bets.
+    database.ensure_indexes()
+    database.ensure_bets_storage()
+    if not database.is_users_statistic_built():
+        rebuild_users_statistic()
+    database.log_query_plans()
+    membership_cache.seed({x.id: x.last_interaction for x in database.get_all_users()})
+    # Правка календаря (новый матч, результат, перенос) сразу пересчитывает план напоминаний.
+    database.events_cache.subscribe(reminder_scheduler.notify)
+    reminder_thread.start()
+    metrics_utils.count_telegram_calls(task_metrics)
+    metrics_port = os.environ.get(constants.ENV_METRICS_PORT, '').strip()
+    if metrics_port:
+        metrics_utils.start_metrics_server(task_metrics, port=int(metrics_port))
+    bot_runtime = os.environ.get(constants.ENV_BOT_RUNTIME, '').strip() or constants.BOT_RUNTIME_THREADS
+    if bot_runtime == constants.BOT_RUNTIME_ASYNCIO:
+        async_runtime.run(bot=bot, jobs=get_scheduled_jobs(), allowed_updates=ALLOWED_UPDATES)
+    elif bot_runtime == constants.BOT_RUNTIME_THREADS:
+        scheduler_thread.start()
+        bot.infinity_polling(allowed_updates=ALLOWED_UPDATES)
+    else:
+        raise ValueError(f'Unknown {constants.ENV_BOT_RUNTIME} value: {bot_runtime}')
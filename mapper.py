@@ -129,6 +129,7 @@ def parse_user(user_dict: dict) -> UserModel:
         created_at=user_dict['created_at'],
         scores=user_dict['scores'],
         bets=list(map(lambda x: parse_bet(x), user_dict['bets'])),
+        statistic=user_dict.get('statistic'),
     )
 
 
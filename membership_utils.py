@@ -0,0 +1,69 @@
+import threading
+import time
+from datetime import datetime
+from typing import Callable
+
+# Участие в общем чате меняется редко, а проверяется на каждое нажатие кнопки.
+DEFAULT_TTL_SECONDS = 10 * 60
+# «Не участник» кэшируем коротко: только что вступивший не должен долго получать отказ.
+DEFAULT_NEGATIVE_TTL_SECONDS = 60
+
+
+class MembershipCache:
+    # user_id -> (участник ли, момент истечения по time.time()). Потокобезопасен.
+    def __init__(
+            self,
+            ttl_seconds: float = DEFAULT_TTL_SECONDS,
+            negative_ttl_seconds: float = DEFAULT_NEGATIVE_TTL_SECONDS,
+            clock: Callable[[], float] = time.time,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_check(self, user_id: int, check: Callable[[int], bool]) -> bool:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > self._clock():
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        is_member = check(user_id)
+        self.put(user_id=user_id, is_member=is_member)
+        return is_member
+
+    def put(self, user_id: int, is_member: bool):
+        ttl = self.ttl_seconds if is_member else self.negative_ttl_seconds
+        with self._lock:
+            self._entries[user_id] = (is_member, self._clock() + ttl)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def seed(self, last_interactions: dict[int, datetime]):
+        # После рестарта: кто недавно пользовался ботом, тот прошёл проверку участия — считаем его
+        # участником до last_interaction + TTL. Более свежие записи в кэше не перетираются.
+        with self._lock:
+            for user_id, last_interaction in last_interactions.items():
+                if last_interaction is None:
+                    continue
+                expires_at = last_interaction.timestamp() + self.ttl_seconds
+                if expires_at <= self._clock() or user_id in self._entries:
+                    continue
+                self._entries[user_id] = (True, expires_at)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            now = self._clock()
+            live = [x for x in self._entries.values() if x[1] > now]
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'members': sum(1 for x in live if x[0]),
+                'non_members': sum(1 for x in live if not x[0]),
+            }
@@ -0,0 +1,244 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from pymongo import monitoring
+from telebot import apihelper
+
+# Метрики плановых задач: длительность прогона, число запросов к MongoDB и вызовов Telegram Bot API
+# за прогон, перцентили по последним прогонам, «переборы» (прогон дольше интервала задачи) и отставание
+# от расписания. Запросы считаются в потоке, где идёт задача: рассылки через broadcaster уходят в его
+# пуле и сюда не попадают (их видно по логам рассылок).
+
+# Сколько последних прогонов задачи держим для p50/p95/p99.
+WINDOW_SIZE = 256
+QUANTILES = (0.5, 0.95, 0.99)
+METRICS_HOST = '127.0.0.1'  # только локально: снаружи метрики не нужны
+
+
+class TaskStats:
+    # Не потокобезопасна — синхронизацию обеспечивает TaskMetrics.
+    def __init__(self, interval_seconds: float | None = None):
+        self.interval_seconds = interval_seconds
+        self.durations = deque(maxlen=WINDOW_SIZE)
+        self.runs = 0
+        self.errors = 0
+        self.overruns = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.db_queries = 0
+        self.telegram_calls = 0
+        self.last_db_queries = 0
+        self.last_telegram_calls = 0
+        self.max_lag_seconds = 0.0  # насколько прогон начался позже «предыдущий старт + интервал»
+        self.last_started = None
+
+    def get_percentile(self, fraction: float) -> float | None:
+        if len(self.durations) == 0:
+            return None
+        ordered = sorted(self.durations)
+        return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+    def copy(self) -> 'TaskStats':
+        result = TaskStats(self.interval_seconds)
+        result.__dict__.update(self.__dict__)
+        result.durations = deque(self.durations, maxlen=WINDOW_SIZE)
+        return result
+
+
+class _RunCounters:
+    def __init__(self):
+        self.db_queries = 0
+        self.telegram_calls = 0
+
+
+class TaskMetrics:
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tasks = {}  # имя задачи -> TaskStats
+        self._local = threading.local()  # счётчики текущего прогона в этом потоке
+
+    def run(self, name: str, task: Callable, interval_seconds: float | None = None):
+        # Выполняет task и записывает прогон. Исключение задачи пробрасывается (прогон считается ошибочным).
+        counters = _RunCounters()
+        outer = getattr(self._local, 'counters', None)
+        self._local.counters = counters
+        started = self._clock()
+        error = True
+        try:
+            result = task()
+            error = False
+            return result
+        finally:
+            elapsed = self._clock() - started
+            self._local.counters = outer
+            if outer is not None:  # вложенный прогон — его запросы входят и во внешний
+                outer.db_queries += counters.db_queries
+                outer.telegram_calls += counters.telegram_calls
+            self._record(name, interval_seconds, started, elapsed, counters, error)
+
+    def record_db_query(self):
+        counters = getattr(self._local, 'counters', None)
+        if counters is not None:
+            counters.db_queries += 1
+
+    def record_telegram_call(self):
+        counters = getattr(self._local, 'counters', None)
+        if counters is not None:
+            counters.telegram_calls += 1
+
+    def get_stats(self) -> dict[str, TaskStats]:
+        with self._lock:
+            return {name: stats.copy() for name, stats in self._tasks.items()}
+
+    def _record(self, name: str, interval_seconds: float | None, started: float, elapsed: float,
+                counters: _RunCounters, error: bool):
+        with self._lock:
+            stats = self._tasks.get(name)
+            if stats is None:
+                stats = TaskStats(interval_seconds)
+                self._tasks[name] = stats
+            if interval_seconds is not None and stats.last_started is not None:
+                lag = started - stats.last_started - interval_seconds
+                stats.max_lag_seconds = max(stats.max_lag_seconds, lag)
+            stats.last_started = started
+            stats.runs += 1
+            stats.errors += int(error)
+            stats.durations.append(elapsed)
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            stats.db_queries += counters.db_queries
+            stats.telegram_calls += counters.telegram_calls
+            stats.last_db_queries = counters.db_queries
+            stats.last_telegram_calls = counters.telegram_calls
+            overrun = interval_seconds is not None and elapsed > interval_seconds
+            if overrun:
+                stats.overruns += 1
+        if overrun:
+            logging.warning(f'Scheduled task {name} took {elapsed:.1f} s, longer than its interval '
+                            f'{interval_seconds} s: next runs are late')
+
+
+class DbCommandCounter(monitoring.CommandListener):
+    # Передаётся в MongoClient(event_listeners=...); started вызывается в потоке, который выполняет запрос.
+    def __init__(self, metrics: TaskMetrics):
+        self._metrics = metrics
+
+    def started(self, event):
+        self._metrics.record_db_query()
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def count_telegram_calls(metrics: TaskMetrics):
+    # Все вызовы Bot API идут через apihelper._make_request; без своих настроек повторов (RETRY_ON_ERROR)
+    # он шлёт запрос через _get_req_session().request — то же делаем и мы, добавив подсчёт.
+    previous_sender = apihelper.CUSTOM_REQUEST_SENDER
+
+    def send(method, url, **kwargs):
+        metrics.record_telegram_call()
+        if previous_sender is not None:
+            return previous_sender(method, url, **kwargs)
+        return apihelper._get_req_session().request(method, url, **kwargs)
+
+    apihelper.CUSTOM_REQUEST_SENDER = send
+
+
+def format_task_stats(stats_by_task: dict[str, TaskStats]) -> str:
+    if len(stats_by_task) == 0:
+        return 'Плановые задачи ещё не запускались'
+    lines = []
+    for name in sorted(stats_by_task.keys()):
+        stats = stats_by_task[name]
+        percentiles = ', '.join(
+            f'p{int(fraction * 100)} {_format_seconds(stats.get_percentile(fraction))}' for fraction in QUANTILES
+        )
+        lines.append(f'{name}: {stats.runs} прогонов, ошибок {stats.errors}, {percentiles}, '
+                     f'макс. {_format_seconds(stats.max_seconds)}')
+        details = (f'  запросов к БД {stats.db_queries} (последний прогон {stats.last_db_queries}), '
+                   f'вызовов Telegram {stats.telegram_calls} (последний {stats.last_telegram_calls})')
+        if stats.interval_seconds is not None:
+            details += (f', интервал {stats.interval_seconds} с, переборов {stats.overruns}, '
+                        f'макс. отставание {_format_seconds(max(0.0, stats.max_lag_seconds))}')
+        lines.append(details)
+    return '\n'.join(lines)
+
+
+def format_prometheus(stats_by_task: dict[str, TaskStats]) -> str:
+    # Текстовый формат Prometheus (exposition format 0.0.4).
+    metrics = [
+        ('totalizator_task_duration_seconds', 'summary', 'Wall time of scheduled task runs.'),
+        ('totalizator_task_errors_total', 'counter', 'Scheduled task runs that raised.'),
+        ('totalizator_task_overruns_total', 'counter', 'Scheduled task runs longer than the task interval.'),
+        ('totalizator_task_db_queries_total', 'counter', 'MongoDB commands sent by scheduled tasks.'),
+        ('totalizator_task_telegram_calls_total', 'counter', 'Telegram Bot API calls made by scheduled tasks.'),
+        ('totalizator_task_max_lag_seconds', 'gauge', 'Worst delay of a run against previous start + interval.'),
+    ]
+    lines = []
+    for metric, metric_type, help_text in metrics:
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {metric_type}')
+        for name in sorted(stats_by_task.keys()):
+            stats = stats_by_task[name]
+            label = f'task="{_escape_label(name)}"'
+            match metric:
+                case 'totalizator_task_duration_seconds':
+                    for fraction in QUANTILES:
+                        value = stats.get_percentile(fraction)
+                        lines.append(f'{metric}{{{label},quantile="{fraction}"}} '
+                                     f'{"NaN" if value is None else repr(value)}')
+                    lines.append(f'{metric}_sum{{{label}}} {stats.total_seconds!r}')
+                    lines.append(f'{metric}_count{{{label}}} {stats.runs}')
+                case 'totalizator_task_errors_total':
+                    lines.append(f'{metric}{{{label}}} {stats.errors}')
+                case 'totalizator_task_overruns_total':
+                    lines.append(f'{metric}{{{label}}} {stats.overruns}')
+                case 'totalizator_task_db_queries_total':
+                    lines.append(f'{metric}{{{label}}} {stats.db_queries}')
+                case 'totalizator_task_telegram_calls_total':
+                    lines.append(f'{metric}{{{label}}} {stats.telegram_calls}')
+                case 'totalizator_task_max_lag_seconds':
+                    lines.append(f'{metric}{{{label}}} {max(0.0, stats.max_lag_seconds)!r}')
+    return '\n'.join(lines) + '\n'
+
+
+def start_metrics_server(metrics: TaskMetrics, port: int, host: str = METRICS_HOST) -> ThreadingHTTPServer:
+    # GET /metrics на localhost в фоновом потоке; возвращает сервер (server_address — фактический порт).
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = format_prometheus(metrics.get_stats()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(f'metrics: {format % args}')
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logging.info(f'Prometheus metrics are served at http://{host}:{server.server_address[1]}/metrics')
+    return server
+
+
+def _format_seconds(value: float | None) -> str:
+    if value is None:
+        return '—'
+    return f'{value * 1000:.0f} мс' if value < 1 else f'{value:.1f} с'
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
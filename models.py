@@ -100,6 +100,7 @@ class UserModel:
                  created_at: datetime,
                  scores: int,
                  bets: list,
+                 statistic: dict | None = None,
                  ):
         self.id = id
         self.username = username
@@ -109,6 +110,8 @@ class UserModel:
         self.created_at = created_at
         self.scores = scores
         self.bets = bets
+        # Счётчики DetailedStatistic по завершённым матчам (users.statistic), см. DETAILED_STATISTIC_COUNTERS.
+        self.statistic = statistic or {}
 
     def get_full_name(self) -> str:
         if self.last_name:
@@ -145,6 +148,21 @@ class GuessedEvent(Enum):
     EXACT_SCORE = 4
 
 
+# Счётчики DetailedStatistic, которые хранятся в users.statistic и наращиваются при расчёте матча.
+DETAILED_STATISTIC_COUNTERS = (
+    'guessed_total_score_count',
+    'guessed_goal_difference_count',
+    'guessed_draw_count',
+    'guessed_only_winner_count',
+    'guessed_who_has_gone_through_count',
+    'one_goal_from_total_score_count_with_winner_consider',
+    'one_goal_from_total_score_count_exclude_winner',
+    'triggered_jokers_count',
+    'joker_bets_count',
+    'joker_bonus_scores',
+)
+
+
 class DetailedStatistic:
     def __init__(self, user_model: UserModel,
                  guessed_total_score_count: int,
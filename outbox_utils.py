@@ -0,0 +1,57 @@
+import logging
+from datetime import datetime, timedelta
+
+from broadcast_utils import Broadcast, Broadcaster
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BASE_BACKOFF_SECONDS = 30
+OUTBOX_MAX_BACKOFF_SECONDS = 60 * 60
+# Аренда пачки на время доставки: с запасом больше худшего случая рассылки 50 сообщений с паузами 429.
+OUTBOX_LEASE = timedelta(minutes=10)
+
+
+def get_backoff(attempts: int) -> timedelta:
+    # 30 с, 1 мин, 2 мин, ... — не больше часа.
+    return timedelta(seconds=min(OUTBOX_BASE_BACKOFF_SECONDS * 2 ** (attempts - 1), OUTBOX_MAX_BACKOFF_SECONDS))
+
+
+def drain_outbox(database, broadcaster: Broadcaster) -> int:
+    # Один проход диспетчера: арендовать пачку, поставить её в рассылку и сразу вернуться.
+    # Исходы записываются по завершении рассылки (в потоке пула): доставленные — sent, временные
+    # ошибки — повтор с экспоненциальной паузой, 400/403 и исчерпанные попытки — failed.
+    # Возвращает размер пачки.
+    messages = database.lease_due_outbox_messages(limit=OUTBOX_BATCH_SIZE, lease=OUTBOX_LEASE)
+    if len(messages) == 0:
+        return 0
+
+    def record_outcomes(broadcast: Broadcast):
+        record_outbox_outcomes(database=database, messages=messages, broadcast=broadcast)
+
+    broadcaster.broadcast(
+        name='outbox',
+        messages=[(x['chat_id'], x['text']) for x in messages],
+        on_complete=record_outcomes,
+    )
+    return len(messages)
+
+
+def record_outbox_outcomes(database, messages: list[dict], broadcast: Broadcast):
+    now = datetime.now()
+    delivered = []
+    for outcome in broadcast.outcomes:
+        message = messages[outcome.index]
+        if outcome.delivered:
+            delivered.append(message['_id'])
+            continue
+        attempts = message['attempts'] + 1
+        give_up = not outcome.retryable or attempts >= OUTBOX_MAX_ATTEMPTS
+        database.record_outbox_failure(
+            message_id=message['_id'],
+            error=outcome.error,
+            next_attempt_at=None if give_up else now + get_backoff(attempts),
+        )
+    database.mark_outbox_delivered(delivered)
+    keys = sorted({x['key'] for x in messages})
+    for key in database.complete_reminders(keys):
+        logging.info(f'Reminder {key} delivered')
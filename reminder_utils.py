@@ -0,0 +1,140 @@
+import heapq
+import logging
+import threading
+import zoneinfo
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Callable, Iterable
+
+import datetime_utils
+
+# Планировщик напоминаний по календарю матчей. Вместо периодического прохода по всем проверкам каждая
+# задача сама говорит, когда ей в следующий раз есть что делать (старт матча минус порог, старт плей-офф
+# минус N часов, 20:40 МСК), а поток спит до ближайшего такого момента. План пересчитывается, только когда
+# меняется календарь (версия events_cache); тогда же все задачи один раз прогоняются «вдогонку» — они
+# идемпотентны (ключи напоминаний), поэтому лишний прогон ничего не шлёт повторно.
+
+# Даже без изменений календаря просыпаемся не реже этого — страховка от потерянного notify и скачков часов.
+MAX_SLEEP_SECONDS = 10 * 60
+MOSCOW_ZONE = zoneinfo.ZoneInfo('Europe/Moscow')
+
+
+# planner(events, after) -> ближайший момент строго позже after, когда задаче пора работать; None — не пора
+# никогда (при текущем календаре).
+Planner = Callable[[list, datetime], datetime | None]
+
+
+class ReminderScheduler:
+    # run_pending вызывается из одного потока (run_forever); notify — из любого.
+    def __init__(
+            self,
+            load_events: Callable[[], list],
+            get_calendar_version: Callable[[], int],
+            clock: Callable[[], datetime] = datetime_utils.get_utc_time,
+            run_task: Callable[[str, Callable], object] = lambda name, task: task(),
+    ):
+        # run_task(имя, задача) — обёртка прогона (например, metrics_utils.TaskMetrics.run).
+        self._load_events = load_events
+        self._run_task = run_task
+        self._get_calendar_version = get_calendar_version
+        self._clock = clock
+        self._jobs = {}  # имя -> (planner, task)
+        self._heap = []  # (срок, имя); записи со сроком, отличным от _due[имя], устарели
+        self._due = {}  # имя -> актуальный срок
+        self._events = []
+        self._calendar_version = None
+        self._wakeup = threading.Event()
+
+    def add(self, name: str, planner: Planner, task: Callable):
+        self._jobs[name] = (planner, task)
+        self._calendar_version = None  # новая задача — перепланировать всё на следующем прогоне
+
+    def notify(self):
+        # Календарь поменялся: разбудить run_forever, чтобы план пересчитался сразу.
+        self._wakeup.set()
+
+    def get_schedule(self) -> list[tuple[datetime, str]]:
+        return sorted((due, name) for name, due in self._due.items())
+
+    def run_pending(self) -> float | None:
+        # Выполняет всё, чему пришёл срок. Возвращает секунды до ближайшего срока (None — задач нет).
+        now = self._clock()
+        calendar_version = self._get_calendar_version()
+        if calendar_version != self._calendar_version:
+            self._replan(calendar_version, now)
+        while len(self._heap) > 0 and self._heap[0][0] <= now:
+            due, name = heapq.heappop(self._heap)
+            if self._due.get(name) != due:
+                continue
+            del self._due[name]
+            planner, task = self._jobs[name]
+            try:
+                self._run_task(name, task)
+            except Exception as e:
+                logging.exception(e)
+            self._plan(name, after=now)
+        if len(self._heap) == 0:
+            return None
+        return max(0.0, (self._heap[0][0] - self._clock()).total_seconds())
+
+    def run_forever(self, stop: threading.Event | None = None):
+        while stop is None or not stop.is_set():
+            try:
+                delay = self.run_pending()
+            except Exception as e:
+                logging.exception(e)
+                delay = None
+            timeout = MAX_SLEEP_SECONDS if delay is None else min(delay, MAX_SLEEP_SECONDS)
+            if self._wakeup.wait(timeout=timeout):
+                self._wakeup.clear()
+
+    def _replan(self, calendar_version: int, now: datetime):
+        # Версию читаем до загрузки: правка календаря во время загрузки вызовет ещё один пересчёт.
+        self._calendar_version = calendar_version
+        self._events = self._load_events()
+        self._heap = []
+        self._due = {}
+        for name in self._jobs:
+            self._set_due(name, now)  # прогон вдогонку: пороги, пройденные до рестарта или правки календаря
+        logging.info(f'Reminder schedule rebuilt for calendar version {calendar_version}')
+
+    def _plan(self, name: str, after: datetime):
+        planner, _ = self._jobs[name]
+        try:
+            due = planner(self._events, after)
+        except Exception as e:
+            logging.exception(e)  # до следующего изменения календаря задача не запланирована
+            return
+        if due is not None:
+            self._set_due(name, due)
+            logging.debug(f'Reminder job {name} is due at {due.isoformat()}')
+
+    def _set_due(self, name: str, due: datetime):
+        self._due[name] = due
+        heapq.heappush(self._heap, (due, name))
+
+
+def get_next_instant(instants: Iterable[datetime], after: datetime) -> datetime | None:
+    return min((x for x in instants if x > after), default=None)
+
+
+def get_next_threshold_instant(target: datetime | None, offsets: Iterable[timedelta], after: datetime) -> datetime | None:
+    # Ближайший из моментов target - offset (offset = 0 — сам target) строго позже after.
+    if target is None:
+        return None
+    return get_next_instant((target - offset for offset in offsets), after)
+
+
+def get_next_daily_instant(after: datetime, hour: int, minute: int, zone: tzinfo = MOSCOW_ZONE) -> datetime:
+    # Ближайшие hour:minute по местному времени zone строго позже after (aware); результат в UTC.
+    local = after.astimezone(zone)
+    candidate = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate <= local:
+        candidate += timedelta(days=1)
+    return candidate.astimezone(timezone.utc)
+
+
+def get_next_hourly_instant(after: datetime, minute: int) -> datetime:
+    candidate = after.replace(minute=minute, second=0, microsecond=0)
+    if candidate <= after:
+        candidate += timedelta(hours=1)
+    return candidate
@@ -0,0 +1,116 @@
+from typing import NamedTuple
+
+# Классификация ставки на сыгранный матч — общее ядро для расчёта матча и статистики участников (main)
+# и для скрипта analytics/analyze.py. Итог зависит только от счёта матча и счёта ставки, поэтому для
+# реалистичной сетки 0..MAX_TABLE_SCORE он посчитан заранее: классификация — одно обращение к таблице.
+# Счёт за пределами сетки считается напрямую теми же правилами.
+
+MAX_TABLE_SCORE = 15
+_GRID_SIZE = MAX_TABLE_SCORE + 1
+
+# Категории — по убыванию очков. Проверяются каскадом: точный счёт > ничья > разница мячей > победитель.
+EXACT_SCORE, GOAL_DIFFERENCE, DRAW, WINNER, MISS = range(5)
+CATEGORY_NAMES = ('exact', 'diff', 'draw', 'winner', None)  # так категории называет analytics
+# Очки за категорию по действующим правилам (без джокера) и за угаданный проход.
+CATEGORY_POINTS = (4, 3, 2, 1, 0)
+GONE_THROUGH_POINTS = 1
+
+
+class BetClassification(NamedTuple):
+    category: int
+    # В одном мяче от точного счёта с угаданным исходом.
+    near_miss_winner: bool
+    # В одном мяче от точного счёта в матче с 2+ голами, исход не важен.
+    near_miss_other: bool
+
+    @property
+    def is_guessed(self) -> bool:
+        return self.category != MISS
+
+    def get_points(self, category_points: tuple = CATEGORY_POINTS) -> int:
+        return category_points[self.category]
+
+
+def classify(result_1: int, result_2: int, bet_1: int, bet_2: int) -> BetClassification:
+    if 0 <= result_1 <= MAX_TABLE_SCORE and 0 <= result_2 <= MAX_TABLE_SCORE and \
+            0 <= bet_1 <= MAX_TABLE_SCORE and 0 <= bet_2 <= MAX_TABLE_SCORE:
+        return _TABLE[((result_1 * _GRID_SIZE + result_2) * _GRID_SIZE + bet_1) * _GRID_SIZE + bet_2]
+    return _intern(_calculate(result_1, result_2, bet_1, bet_2))
+
+
+def is_guessed_who_has_gone_through(result_team_1_has_gone_through: bool | None,
+                                    bet_team_1_will_go_through: bool | None) -> bool:
+    if result_team_1_has_gone_through is None or bet_team_1_will_go_through is None:
+        return False
+    return result_team_1_has_gone_through == bet_team_1_will_go_through
+
+
+def calculate_points(
+        result_1: int,
+        result_2: int,
+        bet_1: int,
+        bet_2: int,
+        result_team_1_has_gone_through: bool | None = None,
+        bet_team_1_will_go_through: bool | None = None,
+        category_points: tuple = CATEGORY_POINTS,
+        gone_through_points: int = GONE_THROUGH_POINTS,
+) -> int:
+    # Очки за ставку без джокера. Проход учитывается, только если он известен и в результате, и в ставке.
+    points = classify(result_1, result_2, bet_1, bet_2).get_points(category_points)
+    if is_guessed_who_has_gone_through(result_team_1_has_gone_through, bet_team_1_will_go_through):
+        points += gone_through_points
+    return points
+
+
+def _calculate(result_1: int, result_2: int, bet_1: int, bet_2: int) -> tuple[int, bool, bool]:
+    if result_1 == bet_1 and result_2 == bet_2:
+        category = EXACT_SCORE
+    elif result_1 == result_2 and bet_1 == bet_2:
+        category = DRAW
+    elif result_1 - result_2 == bet_1 - bet_2:
+        category = GOAL_DIFFERENCE
+    elif _is_same_winner(result_1, result_2, bet_1, bet_2):
+        category = WINNER
+    else:
+        category = MISS
+    if result_1 == bet_1:
+        one_goal_away = bet_2 in (result_2 - 1, result_2 + 1)
+    elif result_2 == bet_2:
+        one_goal_away = bet_1 in (result_1 - 1, result_1 + 1)
+    else:
+        one_goal_away = False
+    near_miss_winner = one_goal_away and _is_same_winner(result_1, result_2, bet_1, bet_2)
+    near_miss_other = one_goal_away and result_1 + result_2 >= 2
+    return category, near_miss_winner, near_miss_other
+
+
+def _is_same_winner(result_1: int, result_2: int, bet_1: int, bet_2: int) -> bool:
+    if result_1 > result_2:
+        return bet_1 > bet_2
+    if result_1 < result_2:
+        return bet_1 < bet_2
+    return bet_1 == bet_2
+
+
+# Различных классификаций всего 5 * 2 * 2 — в таблице лежат ссылки на общие неизменяемые экземпляры.
+_CLASSIFICATIONS = {
+    (category, near_miss_winner, near_miss_other): BetClassification(category, near_miss_winner, near_miss_other)
+    for category in range(len(CATEGORY_NAMES))
+    for near_miss_winner in (False, True)
+    for near_miss_other in (False, True)
+}
+
+
+def _intern(values: tuple[int, bool, bool]) -> BetClassification:
+    return _CLASSIFICATIONS[values]
+
+
+def _build_table() -> list[BetClassification]:
+    scores = range(_GRID_SIZE)
+    return [
+        _intern(_calculate(result_1, result_2, bet_1, bet_2))
+        for result_1 in scores for result_2 in scores for bet_1 in scores for bet_2 in scores
+    ]
+
+
+_TABLE = _build_table()
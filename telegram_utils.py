@@ -6,12 +6,15 @@ import constants
 
 def is_chat_member(bot: TeleBot, chat_id: int, user_id: int) -> bool:
     try:
-        status = bot.get_chat_member(chat_id=chat_id, user_id=user_id).status
-        return status == 'creator' or status == 'member' or status == 'administrator'
+        return is_member_status(bot.get_chat_member(chat_id=chat_id, user_id=user_id).status)
     except ApiTelegramException as e:
         return False
 
 
+def is_member_status(status: str) -> bool:
+    return status == 'creator' or status == 'member' or status == 'administrator'
+
+
 def safe_send_message(bot: TeleBot, chat_id: int, text: str):
     if len(text) > constants.TELEGRAM_MAX_MESSAGE_SIZE:
         messages = []
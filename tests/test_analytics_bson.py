@@ -0,0 +1,187 @@
+import datetime
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import bson
+
+_ANALYZE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'analytics', 'analyze.py')
+_spec = importlib.util.spec_from_file_location('analyze', _ANALYZE_PATH)
+analyze = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(analyze)
+
+KICKOFF = datetime.datetime(2026, 3, 11, 20, 0)
+
+
+def make_event_doc(uuid, result=True):
+    return {
+        'uuid': uuid,
+        'team_1': 'Реал',
+        'team_2': 'Бавария',
+        'time': KICKOFF,
+        'type': 'PLAY_OFF_SINGLE_MATCH',
+        'result': {'team_1': 2, 'team_2': 1, 'team_1_has_gone_through': True} if result else None,
+        'notes': 'x' * 1000,
+    }
+
+
+def make_user_doc(user_id, username, event_uuids):
+    return {
+        '_id': user_id,
+        'username': username,
+        'first_name': username.title(),
+        'last_name': None,
+        'scores': 7,
+        'last_interaction': KICKOFF,
+        'statistic': {'exact': 1, 'ratio': 0.5},
+        'bets': [{
+            'event_uuid': uuid,
+            'team_1_scores': 2,
+            'team_2_scores': 1,
+            'team_1_will_go_through': True,
+            'created_at': KICKOFF,
+            'is_joker': False,
+            'raw': bson.Binary(b'\x00' * 64),
+        } for uuid in event_uuids],
+    }
+
+
+class BsonReaderTest(unittest.TestCase):
+    decoder = 'python'
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, relative_path, docs):
+        path = os.path.join(self.dir.name, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            for doc in docs:
+                f.write(bson.encode(doc))
+        return path
+
+    def test_full_decode(self):
+        path = self.write('users.bson', [make_user_doc(1, 'ivan', ['e1', 'e2']), make_user_doc(2, 'oleg', [])])
+        docs = analyze.read_bson(path, decoder=self.decoder)
+        self.assertEqual([x['username'] for x in docs], ['ivan', 'oleg'])
+        self.assertEqual(docs[0]['statistic'], {'exact': 1, 'ratio': 0.5})
+        self.assertEqual(docs[0]['bets'][1]['event_uuid'], 'e2')
+        self.assertEqual(docs[0]['bets'][0]['raw'], b'\x00' * 64)
+        self.assertEqual(docs[0]['last_interaction'], KICKOFF)
+        self.assertIsNone(docs[0]['last_name'])
+
+    def test_projection_decodes_only_requested_fields(self):
+        path = self.write('users.bson', [make_user_doc(1, 'ivan', ['e1'])])
+        doc = next(analyze.iter_bson(path, analyze.USER_FIELDS, decoder=self.decoder))
+        self.assertEqual(set(doc.keys()), {'username', 'first_name', 'last_name', 'scores', 'bets'})
+        self.assertEqual(doc['bets'], [{
+            'event_uuid': 'e1', 'team_1_scores': 2, 'team_2_scores': 1,
+            'team_1_will_go_through': True, 'created_at': KICKOFF,
+        }])
+
+    def test_iter_is_lazy_and_handles_empty_dump(self):
+        path = self.write('events.bson', [make_event_doc(f'e{x}') for x in range(3)])
+        iterator = analyze.iter_bson(path, analyze.EVENT_FIELDS, decoder=self.decoder)
+        self.assertEqual(next(iterator)['uuid'], 'e0')
+        self.assertEqual([x['uuid'] for x in iterator], ['e1', 'e2'])
+        self.assertEqual(analyze.read_bson(self.write('empty.bson', []), decoder=self.decoder), [])
+
+    def test_load_season_with_projection(self):
+        self.write('2026/events.bson', [make_event_doc('e1'), make_event_doc('e2', result=False)])
+        self.write('2026/users.bson', [make_user_doc(1, 'ivan', ['e1', 'e2'])])
+        with mock.patch.object(analyze, 'BASE', self.dir.name), \
+                mock.patch.object(analyze, 'BSON_DECODER', self.decoder):
+            season = analyze.load_season('2026')
+        self.assertEqual(list(season['events'].keys()), ['e1'])
+        self.assertEqual(season['events']['e1']['rt1'], 2)
+        self.assertEqual(season['events']['e1']['phase'], 'knockout')
+        player = season['players']['ivan']
+        self.assertEqual(player['name'], 'Ivan')
+        self.assertEqual(player['stored_scores'], 7)
+        self.assertEqual(player['n_bets'], 1)
+        rows = analyze.per_match(season, 'ivan')
+        self.assertEqual([x['uuid'] for x in rows], ['e1'])
+        self.assertTrue(rows[0]['bet']['through'])
+
+
+class SeasonColumnsTest(unittest.TestCase):
+    # Колоночные метрики сверяются с поштучным подсчётом score_bet / category.
+    RESULTS = [(2, 1, True), (0, 0, None), (1, 3, False), (2, 2, False), (4, 0, None)]
+    BETS = {
+        'ivan': [(2, 1, True), (1, 1, None), (0, 2, True), (1, 1, False), (3, 0, None)],
+        'oleg': [(1, 0, False), (0, 1, None), (1, 3, False), (2, 2, True)],
+        'petr': [(0, 2, None)],
+    }
+
+    def make_season(self):
+        events = {}
+        for i, (rt1, rt2, through) in enumerate(self.RESULTS):
+            # в дампе события идут не по времени — колонки должны упорядочить ставки сами
+            events[f'e{i}'] = {
+                'uuid': f'e{i}', 't1': 'A', 't2': 'B', 'time': KICKOFF - datetime.timedelta(days=i),
+                'rt1': rt1, 'rt2': rt2, 'through': through, 'decisive': through is not None, 'phase': 'league',
+            }
+        player_bets = {u: {f'e{i}': bet for i, bet in enumerate(bets)} for u, bets in self.BETS.items()}
+        players = {u: {'username': u, 'name': u, 'stored_scores': 0, 'n_bets': len(b)} for u, b in self.BETS.items()}
+        return {'year': '2026', 'events': events, 'players': players, 'W': analyze.WEIGHTS['2026'],
+                'cols': analyze.build_columns(events, player_bets)}
+
+    def test_columns_match_per_bet_scoring(self):
+        season = self.make_season()
+        for W in (analyze.WEIGHTS['2025'], analyze.WEIGHTS['2026']):
+            for username, bets in self.BETS.items():
+                expected = []
+                for i in reversed(range(len(bets))):
+                    ev = season['events'][f'e{i}']
+                    t1, t2, through = bets[i]
+                    expected.append((f'e{i}', analyze.score_bet(ev, {'t1': t1, 't2': t2, 'through': through}, W)))
+                rows = analyze.per_match(season, username, W)
+                self.assertEqual([(x['uuid'], (x['cat'], x['score_pts'], x['adv'], x['total'])) for x in rows],
+                                 expected)
+                stats = analyze.analyze_player(season, username, W)
+                self.assertEqual(stats['total'], sum(x[1][3] for x in expected))
+                self.assertEqual(stats['n'], len(bets))
+
+    def test_current_weights_match_bot_points(self):
+        weights = analyze.WEIGHTS['2026']
+        self.assertEqual(tuple(weights[x] for x in analyze.CATS), analyze.scoring_utils.CATEGORY_POINTS)
+        self.assertEqual(weights['adv'], analyze.scoring_utils.GONE_THROUGH_POINTS)
+
+    def test_points_are_cached_per_weights(self):
+        season = self.make_season()
+        points = analyze.bet_points(season['cols'], analyze.WEIGHTS['2026'])
+        self.assertIs(analyze.bet_points(season['cols'], dict(analyze.WEIGHTS['2026'])), points)
+        self.assertIsNot(analyze.bet_points(season['cols'], analyze.WEIGHTS['2025']), points)
+
+    def test_collect_match_bets(self):
+        season = self.make_season()
+        match_bets, pmpts = analyze.collect_match_bets(season, ['ivan', 'petr'])
+        self.assertEqual(match_bets['e0'], {'ivan': (2, 1), 'petr': (0, 2)})
+        self.assertEqual(pmpts['e0']['ivan'], analyze.per_match(season, 'ivan')[-1]['total'])
+        self.assertNotIn('oleg', match_bets['e1'])
+
+
+@unittest.skipUnless(analyze._BSON_C, 'pymongo bson C extension is not available')
+class CBsonReaderTest(BsonReaderTest):
+    decoder = 'c'
+
+    def test_decoders_agree(self):
+        doc = make_user_doc(1, 'ivan', ['e1'])
+        doc.update({'_id': bson.ObjectId('65f0c0ffee0000000000beef'), 'big': bson.Int64(2 ** 40),
+                    'flags': [True, None, 1.5, 'строка']})
+        path = self.write('users.bson', [doc])
+        for fields in (None, analyze.USER_FIELDS, {'_id': True, 'big': True, 'statistic': {'exact': True}}):
+            expected = analyze.read_bson(path, fields, decoder='python')
+            self.assertEqual(analyze.read_bson(path, fields, decoder='c'), expected, fields)
+        self.assertEqual(expected[0]['_id'], 'OID:65f0c0ffee0000000000beef')
+
+    def test_unknown_decoder(self):
+        with self.assertRaises(ValueError):
+            analyze.get_bson_decoder('rust')
+
+
+if __name__ == '__main__':
+    unittest.main()
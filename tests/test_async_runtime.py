@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import async_runtime
+
+
+def make_update(update_id: int, chat_id: int):
+    return SimpleNamespace(
+        update_id=update_id,
+        message=SimpleNamespace(chat=SimpleNamespace(id=chat_id)),
+        callback_query=None,
+    )
+
+
+class RecordingBot:
+    def __init__(self, delays: dict[int, float]):
+        self.delays = delays
+        self.events = []
+        self.lock = threading.Lock()
+
+    def process_new_updates(self, updates):
+        update = updates[0]
+        with self.lock:
+            self.events.append(('start', update.update_id))
+        time.sleep(self.delays.get(update.update_id, 0))
+        with self.lock:
+            self.events.append(('end', update.update_id))
+
+
+class UpdateDispatcherTest(unittest.TestCase):
+    def run_dispatch(self, bot, updates):
+        async def scenario():
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                dispatcher = async_runtime.UpdateDispatcher(bot=bot, executor=executor)
+                for update in updates:
+                    dispatcher.dispatch(update)
+                await dispatcher.wait_idle()
+
+        asyncio.run(scenario())
+
+    def test_same_chat_is_processed_in_order(self):
+        bot = RecordingBot(delays={1: 0.05})
+        self.run_dispatch(bot, [make_update(1, chat_id=10), make_update(2, chat_id=10)])
+        self.assertEqual(bot.events, [('start', 1), ('end', 1), ('start', 2), ('end', 2)])
+
+    def test_slow_chat_does_not_block_other_chats(self):
+        bot = RecordingBot(delays={1: 0.2})
+        self.run_dispatch(bot, [make_update(1, chat_id=10), make_update(2, chat_id=20)])
+        self.assertLess(bot.events.index(('end', 2)), bot.events.index(('end', 1)))
+
+    def test_handler_error_does_not_stop_chat_queue(self):
+        bot = RecordingBot(delays={})
+        original = bot.process_new_updates
+
+        def failing(updates):
+            if updates[0].update_id == 1:
+                raise RuntimeError('handler failed')
+            original(updates)
+
+        bot.process_new_updates = failing
+        with self.assertLogs(level='ERROR'):
+            self.run_dispatch(bot, [make_update(1, chat_id=10), make_update(2, chat_id=10)])
+        self.assertEqual(bot.events, [('start', 2), ('end', 2)])
+
+    def test_callback_query_is_keyed_by_user(self):
+        update = SimpleNamespace(message=None, callback_query=SimpleNamespace(from_user=SimpleNamespace(id=42)))
+        self.assertEqual(async_runtime.get_update_chat_key(update), 42)
+
+
+class RunPeriodicTest(unittest.TestCase):
+    def test_runs_at_start_and_survives_errors(self):
+        calls = []
+
+        def task():
+            calls.append(1)
+            raise RuntimeError('task failed')
+
+        async def scenario():
+            job = asyncio.create_task(async_runtime.run_periodic(0.05, task, run_at_start=True))
+            await asyncio.sleep(0.13)
+            job.cancel()
+
+        with self.assertLogs(level='ERROR'):
+            asyncio.run(scenario())
+        self.assertGreaterEqual(len(calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import threading
+import unittest
+
+from telebot.apihelper import ApiTelegramException
+
+import broadcast_utils
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.lock = threading.Lock()
+        self.sleeps = []
+
+    def time(self) -> float:
+        with self.lock:
+            return self.now
+
+    def sleep(self, seconds: float):
+        with self.lock:
+            self.sleeps.append(seconds)
+            self.now += seconds
+
+
+def make_api_error(error_code: int, description: str, retry_after: int | None = None) -> ApiTelegramException:
+    result_json = {'ok': False, 'error_code': error_code, 'description': description}
+    if retry_after is not None:
+        result_json['parameters'] = {'retry_after': retry_after}
+    return ApiTelegramException('sendMessage', None, result_json)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_waits_after_burst(self):
+        clock = FakeClock()
+        bucket = broadcast_utils.TokenBucket(rate=1, capacity=2, clock=clock.time)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 1.0)
+        self.assertAlmostEqual(bucket.reserve(), 2.0)
+        clock.now += 3
+        self.assertEqual(bucket.reserve(), 0.0)
+
+
+class BroadcasterTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.sent = []
+        self.failures = {}  # chat_id -> список исключений на очередные попытки
+
+    def send(self, chat_id, text):
+        errors = self.failures.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((chat_id, text))
+
+    def make_broadcaster(self, workers=2):
+        return broadcast_utils.Broadcaster(send=self.send, workers=workers, clock=self.clock.time,
+                                           sleep=self.clock.sleep)
+
+    def test_reports_outcome_per_recipient(self):
+        self.failures[2] = [make_api_error(403, 'Forbidden: bot was blocked by the user')]
+        broadcaster = self.make_broadcaster()
+
+        with self.assertLogs(level='WARNING') as logs:
+            broadcast = broadcaster.broadcast('reminder', [(1, 'a'), (2, 'b'), (3, 'c')])
+            self.assertTrue(broadcast.wait(timeout=5))
+
+        outcomes = {x.chat_id: x for x in broadcast.outcomes}
+        self.assertTrue(outcomes[1].delivered)
+        self.assertFalse(outcomes[2].delivered)
+        self.assertEqual(outcomes[2].attempts, 1)  # 403 не повторяем
+        self.assertEqual(broadcast.delivered_count, 2)
+        self.assertIn('delivered 2/3', logs.output[0])
+
+    def test_retries_after_too_many_requests(self):
+        self.failures[1] = [make_api_error(429, 'Too Many Requests', retry_after=7)]
+        broadcaster = self.make_broadcaster(workers=1)
+
+        broadcast = broadcaster.broadcast('reminder', [(1, 'a')])
+
+        self.assertTrue(broadcast.wait(timeout=5))
+        self.assertEqual(broadcast.outcomes[0].attempts, 2)
+        self.assertTrue(broadcast.outcomes[0].delivered)
+        self.assertIn(7, [round(x) for x in self.clock.sleeps])
+
+    def test_private_chat_is_limited_to_one_message_per_second(self):
+        broadcaster = self.make_broadcaster(workers=1)
+
+        broadcast = broadcaster.broadcast('alerts', [(1, 'a'), (1, 'b'), (1, 'c')])
+
+        self.assertTrue(broadcast.wait(timeout=5))
+        self.assertEqual([x[1] for x in self.sent], ['a', 'b', 'c'])
+        self.assertAlmostEqual(self.clock.now, 2.0)
+
+    def test_idle_chat_bucket_is_dropped(self):
+        broadcaster = self.make_broadcaster(workers=1)
+        self.assertTrue(broadcaster.broadcast('first', [(1, 'a'), (-100, 'b')]).wait(timeout=5))
+        self.assertEqual(set(broadcaster._chat_buckets), {1, -100})
+
+        self.clock.now += broadcast_utils.CHAT_BUCKET_EVICTION_SECONDS
+        self.assertTrue(broadcaster.broadcast('second', [(2, 'c')]).wait(timeout=5))
+
+        self.assertEqual(set(broadcaster._chat_buckets), {2})
+
+    def test_join_waits_for_all_broadcasts(self):
+        broadcaster = self.make_broadcaster()
+        broadcaster.broadcast('first', [(1, 'a')])
+        broadcaster.broadcast('second', [(2, 'b')])
+        self.assertTrue(broadcaster.join(timeout=5))
+        self.assertEqual(sorted(self.sent), [(1, 'a'), (2, 'b')])
+
+    def test_empty_broadcast_is_done(self):
+        self.assertTrue(self.make_broadcaster().broadcast('nobody', []).wait(timeout=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
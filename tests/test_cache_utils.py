@@ -0,0 +1,75 @@
+import threading
+import unittest
+
+from cache_utils import CollectionCache
+
+
+class CollectionCacheTest(unittest.TestCase):
+    def test_loads_once_until_invalidated(self):
+        cache = CollectionCache('events')
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return [len(calls)]
+
+        self.assertEqual(cache.get(loader), [1])
+        self.assertEqual(cache.get(loader), [1])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        cache.invalidate()
+        self.assertEqual(cache.get(loader), [2])
+        self.assertEqual(len(calls), 2)
+
+    def test_caches_none_value(self):
+        # Отсутствующий турнир — тоже ответ: второй раз в базу не ходим.
+        cache = CollectionCache('tournament')
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return None
+
+        self.assertIsNone(cache.get(loader))
+        self.assertIsNone(cache.get(loader))
+        self.assertEqual(len(calls), 1)
+
+    def test_invalidation_during_load_discards_stale_snapshot(self):
+        cache = CollectionCache('users')
+        loading = threading.Event()
+        release = threading.Event()
+
+        def slow_loader():
+            loading.set()
+            release.wait(timeout=5)
+            return ['stale']
+
+        thread = threading.Thread(target=lambda: cache.get(slow_loader))
+        thread.start()
+        loading.wait(timeout=5)
+        cache.invalidate()  # запись, пришедшая во время загрузки
+        release.set()
+        thread.join(timeout=5)
+
+        self.assertIsNone(cache.peek())
+        self.assertEqual(cache.get(lambda: ['fresh']), ['fresh'])
+
+    def test_version_grows_on_invalidate(self):
+        cache = CollectionCache('events')
+        version = cache.version
+        cache.invalidate()
+        self.assertGreater(cache.version, version)
+
+    def test_listeners_are_notified_on_invalidate(self):
+        cache = CollectionCache('events')
+        seen_versions = []
+        cache.subscribe(lambda: seen_versions.append(cache.version))
+        cache.get(lambda: ['a'])
+        cache.invalidate()
+        cache.invalidate()
+        self.assertEqual(seen_versions, [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
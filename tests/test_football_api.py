@@ -180,6 +180,112 @@ class FetchMatchesTest(unittest.TestCase):
         self.assertIsNone(result)
 
 
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class PollStateTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.state = football_api.PollState(clock=self.clock)
+        self.date_from = datetime(2026, 6, 15).date()
+        self.date_to = datetime(2026, 6, 16).date()
+
+    def make_response(self, status_code: int = 200, headers: dict = None, body: bytes = b'{"matches": []}',
+                      payload: dict = None):
+        response = mock.Mock()
+        response.status_code = status_code
+        response.headers = headers or {}
+        response.content = body
+        response.json.return_value = payload if payload is not None else {'matches': []}
+        response.text = ''
+        return response
+
+    def fetch(self, response):
+        with mock.patch.object(football_api.requests, 'get', return_value=response) as mock_get:
+            result = football_api.fetch_matches('token', self.date_from, self.date_to, state=self.state)
+        return result, mock_get
+
+    def test_not_modified_returns_cached_matches(self):
+        payload = {'matches': [make_match_dict('Spain', 'Germany', score=regular_score(2, 0))]}
+        first, _ = self.fetch(self.make_response(headers={'ETag': '"v1"'}, payload=payload))
+        self.assertEqual(len(first), 1)
+
+        response = self.make_response(status_code=304)
+        second, mock_get = self.fetch(response)
+        self.assertIs(second, first)
+        self.assertEqual(mock_get.call_args.kwargs['headers'], {'X-Auth-Token': 'token', 'If-None-Match': '"v1"'})
+        response.json.assert_not_called()
+
+    def test_same_body_is_not_reparsed(self):
+        payload = {'matches': [make_match_dict('Spain', 'Germany', score=regular_score(2, 0))]}
+        first, _ = self.fetch(self.make_response(body=b'same', payload=payload))
+        response = self.make_response(body=b'same', payload=payload)
+        second, _ = self.fetch(response)
+        self.assertIs(second, first)
+        response.json.assert_not_called()
+
+        third, _ = self.fetch(self.make_response(body=b'changed', payload={'matches': []}))
+        self.assertEqual(third, [])
+
+    def test_minute_budget_is_respected(self):
+        for _ in range(football_api.REQUESTS_PER_MINUTE):
+            self.fetch(self.make_response())
+        with self.assertLogs(level='INFO'):
+            result, mock_get = self.fetch(self.make_response())
+        self.assertIsNone(result)
+        mock_get.assert_not_called()
+        self.clock.now += 61
+        result, mock_get = self.fetch(self.make_response())
+        mock_get.assert_called_once()
+
+    def test_exhausted_server_counter_blocks_until_reset(self):
+        self.fetch(self.make_response(headers={'X-Requests-Available-Minute': '0', 'X-RequestCounter-Reset': '20'}))
+        with self.assertLogs(level='INFO'):
+            _, mock_get = self.fetch(self.make_response())
+        mock_get.assert_not_called()
+        self.clock.now += 21
+        _, mock_get = self.fetch(self.make_response(headers={'X-Requests-Available-Minute': '9'}))
+        mock_get.assert_called_once()
+
+    def test_response_without_counter_does_not_restore_block(self):
+        self.fetch(self.make_response(headers={'X-Requests-Available-Minute': '0', 'X-RequestCounter-Reset': '20'}))
+        self.clock.now += 21
+        self.fetch(self.make_response())  # ответ без счётчика запросов
+        _, mock_get = self.fetch(self.make_response())
+        mock_get.assert_called_once()
+
+    def test_poll_interval_follows_match_state(self):
+        kickoff = datetime(2026, 6, 15, 19, 0, tzinfo=timezone.utc)
+        event = make_event('Испания', 'Германия', time=kickoff)
+        self.assertEqual(football_api.get_poll_interval([event], kickoff + timedelta(minutes=10)),
+                         timedelta(minutes=5))
+        self.assertEqual(football_api.get_poll_interval([event], kickoff + timedelta(minutes=60)),
+                         timedelta(minutes=2))
+        self.assertEqual(football_api.get_poll_interval([event], kickoff + timedelta(minutes=110)), timedelta(0))
+
+    def test_is_due(self):
+        kickoff = datetime(2026, 6, 15, 19, 0, tzinfo=timezone.utc)
+        event = make_event('Испания', 'Германия', time=kickoff)
+        now = kickoff + timedelta(minutes=10)
+        self.assertTrue(self.state.is_due([event], now))
+        self.fetch(self.make_response())
+        self.clock.now += 60
+        self.assertFalse(self.state.is_due([event], now))
+        self.clock.now += 4 * 60
+        self.assertTrue(self.state.is_due([event], now))
+
+        # API сказал последнее слово по единственному матчу — опрос останавливается.
+        self.state.stop_tracking(event.uuid)
+        self.assertFalse(self.state.is_due([event], kickoff + timedelta(minutes=110)))
+        self.state.forget(event.uuid)
+        self.assertTrue(self.state.is_due([event], kickoff + timedelta(minutes=110)))
+
+
 class FindApiMatchForEventTest(unittest.TestCase):
     def parse_one(self, match_dict: dict):
         return football_api.parse_matches_response({'matches': [match_dict]})[0]
@@ -252,6 +358,49 @@ class FindApiMatchForEventTest(unittest.TestCase):
         self.assertIsNone(found)
         self.assertEqual(reason, 'ambiguous')
 
+    def test_index_matches_linear_scan(self):
+        # Индекс — только ускорение: результат и reason те же, что у полного перебора окна.
+        teams = [('Spain', 'Испания'), ('Germany', 'Германия'), ('France', 'Франция'), ('Brazil', 'Бразилия')]
+        api_matches = []
+        for day in (15, 16):
+            for hour, minute in ((18, 50), (19, 0), (19, 14), (19, 16), (22, 0)):
+                for home_index, (home, _) in enumerate(teams):
+                    away = teams[(home_index + day + hour) % len(teams)][0]
+                    if away == home:
+                        continue
+                    api_matches.append(self.parse_one(make_match_dict(
+                        home, away, utc_date=f'2026-06-{day}T{hour:02d}:{minute:02d}:00Z',
+                        score=regular_score(1, 0))))
+        index = football_api.ApiMatchIndex(api_matches)
+        for team_1 in teams:
+            for team_2 in teams:
+                if team_1 == team_2:
+                    continue
+                for kickoff in (datetime(2026, 6, 15, 19, 0, tzinfo=timezone.utc),
+                                datetime(2026, 6, 16, 22, 10, tzinfo=timezone.utc),
+                                datetime(2026, 6, 17, 19, 0, tzinfo=timezone.utc)):
+                    event = make_event(team_1[1], team_2[1], time=kickoff)
+                    for tolerance in (timedelta(minutes=15), timedelta(minutes=40)):
+                        expected = self.find_by_linear_scan(event, api_matches, tolerance)
+                        self.assertEqual(football_api.find_api_match_for_event(event, index, tolerance), expected,
+                                         (team_1, team_2, kickoff, tolerance))
+
+    @staticmethod
+    def find_by_linear_scan(event, api_matches, tolerance):
+        team_1_keys = football_api.team_names.get_api_keys(event.team_1)
+        team_2_keys = football_api.team_names.get_api_keys(event.team_2)
+        candidates = []
+        for api_match in api_matches:
+            straight = (team_1_keys & api_match.home_team_keys) and (team_2_keys & api_match.away_team_keys)
+            swapped = (team_1_keys & api_match.away_team_keys) and (team_2_keys & api_match.home_team_keys)
+            if (straight or swapped) and abs(api_match.utc_date - event.get_time_in_utc()) <= tolerance:
+                candidates.append(api_match)
+        if len(candidates) == 0:
+            return None, 'not_found'
+        if len(candidates) > 1:
+            return None, 'ambiguous'
+        return candidates[0], ''
+
 
 class BuildEventResultTest(unittest.TestCase):
     def parse_one(self, match_dict: dict):
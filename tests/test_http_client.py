@@ -0,0 +1,142 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import football_api
+import http_client
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.connections.add(self.client_address)
+            server.requests += 1
+            status = server.statuses.pop(0) if len(server.statuses) > 0 else 200
+        body = b'{"matches": []}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        with self.server.lock:
+            self.server.requests += 1
+            status = self.server.statuses.pop(0) if len(self.server.statuses) > 0 else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.connections = set()
+        self.server.requests = 0
+        self.server.statuses = []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/v4/competitions/WC/matches'
+        self.client = http_client.HttpClient()
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class HttpClientTest(StubServerTestCase):
+    def test_connection_is_reused(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.server.requests, 5)
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_gateway_errors_are_retried_for_get_only(self):
+        self.server.statuses = [503]
+        with mock.patch.object(http_client, 'RETRY_BACKOFF_FACTOR', 0):
+            client = http_client.HttpClient()
+        self.assertEqual(client.get(self.url).status_code, 200)
+        self.assertEqual(self.server.requests, 2)
+
+        self.server.statuses = [503]
+        self.assertEqual(client.post(self.url, data={'chat_id': 1}).status_code, 503)
+        self.assertEqual(self.server.requests, 3)
+        client.close()
+
+    def test_latency_histogram_per_host(self):
+        self.client.get(self.url)
+        self.server.statuses = [404]
+        self.client.get(self.url)
+        histograms = self.client.get_latency_histograms()
+        self.assertEqual(list(histograms.keys()), ['127.0.0.1'])
+        self.assertEqual(histograms['127.0.0.1'].count, 2)
+        self.assertEqual(histograms['127.0.0.1'].errors, 0)  # 4xx — ответ сервера, а не сбой
+        self.assertIn('127.0.0.1: 2 запросов', http_client.format_latency_stats(histograms))
+
+    def test_network_error_is_counted(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with mock.patch.object(http_client, 'RETRY_BACKOFF_FACTOR', 0):
+            client = http_client.HttpClient(timeout=(0.5, 0.5))
+        with self.assertRaises(Exception):
+            client.get(self.url)
+        self.assertEqual(client.get_latency_histograms()['127.0.0.1'].errors, 1)
+        client.close()
+
+    def test_fetch_matches_goes_through_client(self):
+        with mock.patch.object(football_api, 'MATCHES_URL', self.url):
+            for _ in range(3):
+                matches = football_api.fetch_matches('token', football_api.date(2026, 6, 15),
+                                                     football_api.date(2026, 6, 16), client=self.client)
+                self.assertEqual(matches, [])
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_retried_request_is_charged_to_poll_budget(self):
+        # 503 и повтор внутри сессии — два запроса к API, и минутный бюджет PollState должен увидеть оба.
+        self.server.statuses = [503]
+        state = football_api.PollState()
+        with mock.patch.object(http_client, 'RETRY_BACKOFF_FACTOR', 0):
+            client = http_client.HttpClient()
+        with mock.patch.object(football_api, 'MATCHES_URL', self.url):
+            matches = football_api.fetch_matches('token', football_api.date(2026, 6, 15),
+                                                 football_api.date(2026, 6, 16), state=state, client=client)
+            self.assertEqual(matches, [])
+            self.assertEqual(self.server.requests, 2)
+            for _ in range(football_api.REQUESTS_PER_MINUTE - 2):
+                self.assertTrue(state.try_acquire_request())
+            self.assertFalse(state.try_acquire_request())
+        client.close()
+
+    def test_fetch_matches_uses_client_timeouts(self):
+        with mock.patch.object(self.client.session, 'request', wraps=self.client.session.request) as request:
+            football_api.fetch_matches('token', football_api.date(2026, 6, 15), football_api.date(2026, 6, 16),
+                                       client=self.client)
+        self.assertEqual(request.call_args.kwargs['timeout'],
+                         (http_client.CONNECT_TIMEOUT_SECONDS, http_client.READ_TIMEOUT_SECONDS))
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    def test_buckets_and_percentiles(self):
+        histogram = http_client.LatencyHistogram(buckets_ms=(10, 100))
+        self.assertIsNone(histogram.get_percentile(0.5))
+        for elapsed_ms in (5, 7, 50, 500):
+            histogram.observe(elapsed_ms)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.get_percentile(0.5), 10)
+        self.assertEqual(histogram.get_percentile(0.75), 100)
+        self.assertEqual(histogram.get_percentile(0.99), float('inf'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from datetime import datetime, timedelta
+
+from interaction_utils import InteractionTracker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = datetime(2024, 6, 14, 12, 0)
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+class InteractionTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tracker = InteractionTracker(clock=self.clock)
+        self.writes = []
+
+    def write(self, interactions):
+        self.writes.append(dict(interactions))
+
+    def test_touches_are_coalesced_per_user(self):
+        self.tracker.touch(user_id=1)
+        self.clock.now += timedelta(seconds=5)
+        self.tracker.touch(user_id=1)
+        self.tracker.touch(user_id=2)
+
+        self.assertEqual(self.tracker.flush(write=self.write), 2)
+        self.assertEqual(self.writes, [{1: self.clock.now, 2: self.clock.now}])
+        self.assertEqual(self.tracker.flush(write=self.write), 0)
+        self.assertEqual(len(self.writes), 1)
+
+    def test_touched_user_is_known(self):
+        self.assertFalse(self.tracker.is_known(1))
+        self.tracker.touch(user_id=1)
+        self.tracker.flush(write=self.write)
+        self.assertTrue(self.tracker.is_known(1))
+
+    def test_failed_flush_keeps_pending_without_overwriting_newer(self):
+        self.tracker.touch(user_id=1)
+        self.tracker.touch(user_id=2)
+        first = self.clock.now
+
+        def failing_write(interactions):
+            # Пока шла запись, пользователь 1 успел нажать ещё раз.
+            self.clock.now += timedelta(seconds=10)
+            self.tracker.touch(user_id=1)
+            raise ConnectionError('mongo is down')
+
+        with self.assertRaises(ConnectionError):
+            self.tracker.flush(write=failing_write)
+        self.assertEqual(self.tracker.pending_count, 2)
+
+        self.tracker.flush(write=self.write)
+        self.assertEqual(self.writes, [{1: first + timedelta(seconds=10), 2: first}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -178,6 +178,36 @@ class JokerUtilsTest(unittest.TestCase):
         self.assertEqual(joker_utils.calculate_scores_with_joker(base_scores=4, is_joker=True), 8)
         self.assertEqual(joker_utils.calculate_scores_with_joker(base_scores=3, is_joker=False), 3)
 
+    def test_batched_statuses_match_per_user_calculation(self):
+        group_1 = self.make_event('group-1', -24, EventType.GROUP_STAGE)
+        group_2 = self.make_event('group-2', 24, EventType.GROUP_STAGE)
+        playoff_1 = self.make_event('playoff-1', 72, EventType.PLAY_OFF_FIRST_MATCH)
+        playoff_2 = self.make_event('playoff-2', 96, EventType.PLAY_OFF_SECOND_MATCH)
+        events = [group_1, group_2, playoff_1, playoff_2]
+        deleted = self.make_event('deleted', 0, EventType.GROUP_STAGE)  # ставка на матч, которого уже нет
+        bets_by_user = {
+            1: [self.make_bet(group_1, True), self.make_bet(playoff_1, True), self.make_bet(playoff_2, False)],
+            2: [self.make_bet(group_2, False), self.make_bet(deleted, True)],
+            3: [],
+        }
+
+        statuses = joker_utils.calculate_joker_statuses(bets_by_user=bets_by_user, events=events,
+                                                        now_utc=self.base_time)
+
+        events_by_uuid = {event.uuid: event for event in events}
+        for user_id, bets in bets_by_user.items():
+            expected = joker_utils.calculate_joker_status(
+                bets_with_events=[(bet, events_by_uuid[bet.event_uuid]) for bet in bets
+                                  if bet.event_uuid in events_by_uuid],
+                events=events,
+                now_utc=self.base_time,
+            )
+            self.assertEqual(statuses[user_id], expected, user_id)
+        self.assertEqual(statuses[1].used_playoff, 1)
+        self.assertEqual(statuses[1].used_before_playoff, 1)
+        self.assertEqual(statuses[2].used_total, 0)
+        self.assertEqual(statuses[3].playoff_start, playoff_1.get_time_in_utc())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,68 @@
+import random
+import unittest
+
+from leaderboard_utils import Leaderboard
+
+
+def reference_snapshot(entries: dict[int, tuple[str, int]]) -> dict[int, dict]:
+    # Полная пересортировка — то, что Leaderboard поддерживает инкрементально.
+    result = {}
+    rank = 0
+    previous_score = None
+    for user_id, (name, score) in sorted(entries.items(), key=lambda x: (-x[1][1], x[1][0].casefold(), x[0])):
+        if score != previous_score:
+            rank += 1
+            previous_score = score
+        result[user_id] = {'name': name, 'score': score, 'rank': rank}
+    return result
+
+
+class LeaderboardTest(unittest.TestCase):
+    def test_dense_ranks_and_name_order_within_score(self):
+        leaderboard = Leaderboard.from_entries([(1, 'борис', 5), (2, 'Анна', 5), (3, 'Вера', 7), (4, 'Глеб', 0)])
+
+        snapshot = leaderboard.snapshot()
+
+        self.assertEqual(list(snapshot), [3, 2, 1, 4])
+        self.assertEqual([x['rank'] for x in snapshot.values()], [1, 2, 2, 3])
+        self.assertEqual(leaderboard.get_rank(1), 2)
+        self.assertEqual(leaderboard.get_rank(4), 3)
+        self.assertIsNone(leaderboard.get_rank(99))
+
+    def test_top_k_keeps_ranks(self):
+        leaderboard = Leaderboard.from_entries([(1, 'Анна', 5), (2, 'Борис', 5), (3, 'Вера', 7)])
+
+        self.assertEqual(leaderboard.snapshot(limit=2), {
+            3: {'name': 'Вера', 'score': 7, 'rank': 1},
+            1: {'name': 'Анна', 'score': 5, 'rank': 2},
+        })
+
+    def test_deltas_move_users_between_groups(self):
+        leaderboard = Leaderboard.from_entries([(1, 'Анна', 5), (2, 'Борис', 3)])
+
+        leaderboard.apply_deltas({2: 4, 99: 1})
+
+        self.assertEqual(leaderboard.get_rank(2), 1)
+        self.assertEqual(leaderboard.get_rank(1), 2)
+        self.assertNotIn(99, leaderboard)
+
+    def test_matches_full_resort_after_random_updates(self):
+        rng = random.Random(7)
+        entries = {}
+        leaderboard = Leaderboard()
+        for _ in range(500):
+            user_id = rng.randrange(30)
+            action = rng.random()
+            if action < 0.3 or user_id not in entries:
+                name = rng.choice(['Анна', 'анна', 'Борис', 'Вера'])
+                entries[user_id] = (name, rng.randrange(10))
+                leaderboard.upsert(user_id=user_id, name=name, score=entries[user_id][1])
+            else:
+                delta = rng.randrange(1, 5)
+                entries[user_id] = (entries[user_id][0], entries[user_id][1] + delta)
+                leaderboard.apply_deltas({user_id: delta})
+            self.assertEqual(leaderboard.snapshot(), reference_snapshot(entries))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,7 @@ import unittest
 from datetime import datetime, timedelta, timezone
 from types import SimpleNamespace
 from unittest import mock
+from zoneinfo import ZoneInfo
 
 os.environ.setdefault('TELEGRAM_BOT_TOKEN', '1:test')
 os.environ['TELEGRAM_TARGET_CHAT_ID'] = '-100500'
@@ -13,7 +14,7 @@ os.environ['TELEGRAM_MAINTAINER_IDS'] = '42'
 os.environ.setdefault('DATABASE_NAME', 'totalizator_test')
 os.environ['FOOTBALL_DATA_API_TOKEN'] = ''
 
-# При импорте main стартует поток планировщика — глушим Thread.start на время импорта.
+# Поток планировщика стартует в __main__, но любой поток, запущенный при импорте main, глушим.
 _original_thread_start = threading.Thread.start
 threading.Thread.start = lambda self: None
 try:
@@ -21,9 +22,17 @@ try:
 finally:
     threading.Thread.start = _original_thread_start
 
+import broadcast_utils
 import football_api
+from leaderboard_utils import Leaderboard
 from models import Bet, Event, EventResult, EventType, UserModel
 
+# Рассылки идут в пуле потоков; в тестах — без пауз под лимиты Telegram, ждём через broadcaster.join().
+main.broadcaster = broadcast_utils.Broadcaster(
+    send=lambda chat_id, text: main.bot.send_message(chat_id=chat_id, text=text),
+    sleep=lambda seconds: None,
+)
+
 TARGET_CHAT_ID = -100500
 MAINTAINER_ID = 42
 
@@ -44,10 +53,18 @@ class FakeDatabase:
         self.events = events or []
         self.users = users or []
         self.claimed = set()
+        self.settled = set()  # (event_uuid, user_id), как маркер settled_events в Mongo
+        self.finished_events = set()
+        self.get_all_users_calls = 0
+        self.missing_bets_calls = 0
+        self.outbox = []  # (chat_id, text), поставленные через enqueue_reminder
 
     def get_all_events(self):
         return list(self.events)
 
+    def find_events_in_time_range(self, from_inclusive, to_exclusive):
+        return [e for e in self.events if from_inclusive <= e.get_time_in_utc() < to_exclusive]
+
     def get_event_by_uuid(self, uuid):
         return next((e for e in self.events if e.uuid == uuid), None)
 
@@ -59,26 +76,80 @@ class FakeDatabase:
         raise ValueError('Event does not exist')
 
     def get_all_users(self):
+        self.get_all_users_calls += 1
         return list(self.users)
 
+    def get_leaderboard_snapshot(self, limit=None):
+        return Leaderboard.from_users(self.users).snapshot(limit=limit)
+
+    def get_leaderboard_rank(self, user_id):
+        return Leaderboard.from_users(self.users).get_rank(user_id)
+
     def find_bet(self, user_id, event_uuid):
         user = next((u for u in self.users if u.id == user_id), None)
         if user is None:
             return None
         return next((b for b in user.bets if b.event_uuid == event_uuid), None)
 
+    def get_bets_for_event(self, event_uuid):
+        return self.get_bets_for_events([event_uuid])[event_uuid]
+
+    def get_bets_for_events(self, event_uuids):
+        result = {event_uuid: [] for event_uuid in event_uuids}
+        for user in self.users:
+            for bet in user.bets:
+                if bet.event_uuid in result:
+                    result[bet.event_uuid].append(bet)
+        return result
+
+    def get_user_ids_without_bets(self, event_uuids):
+        self.missing_bets_calls += 1
+        bets_by_event = self.get_bets_for_events(event_uuids)
+        return {event_uuid: {u.id for u in self.users} - {b.user_id for b in bets}
+                for event_uuid, bets in bets_by_event.items()}
+
     def add_scores_to_user(self, user_id, amount):
         user = next((u for u in self.users if u.id == user_id), None)
         if user is None:
             raise ValueError('User does not exist')
         user.scores = max(user.scores + amount, 0)
 
+    def settle_event(self, event, scores_by_user, statistic_by_user=None):
+        if event.uuid in self.finished_events:
+            return False
+        self.finished_events.add(event.uuid)
+        statistic_by_user = statistic_by_user or {}
+        for user_id in scores_by_user.keys() | statistic_by_user.keys():
+            if (event.uuid, user_id) in self.settled:
+                continue
+            self.settled.add((event.uuid, user_id))
+            self.add_scores_to_user(user_id, scores_by_user.get(user_id, 0))
+            user = next(u for u in self.users if u.id == user_id)
+            for key, value in statistic_by_user.get(user_id, {}).items():
+                user.statistic[key] = user.statistic.get(key, 0) + value
+        self.update_event(event)
+        return True
+
+    def replace_users_statistic(self, statistic_by_user):
+        for user in self.users:
+            user.statistic = dict(statistic_by_user.get(user.id, {}))
+
     def claim_reminder(self, key):
         if key in self.claimed:
             return False
         self.claimed.add(key)
         return True
 
+    def is_reminder_claimed(self, key):
+        return key in self.claimed
+
+    def enqueue_reminder(self, key, messages):
+        if key in self.claimed:
+            return False
+        self.claimed.add(key)
+        self.outbox.extend(messages)
+        return True
+
     def register_user_if_required(self, **kwargs):
         return False
 
@@ -157,6 +228,7 @@ class CheckApiResultsTest(unittest.TestCase):
         main.bot = FakeBot()
         main.database = FakeDatabase(events=[self.event])
         main.api_poll_logged_states.clear()  # события в тестах делят один uuid
+        main.api_poll_state = football_api.PollState()
 
     def test_exception_never_escapes(self):
         # Инвариант: сбой авто-завершения не должен срывать остальные проверки тика.
@@ -189,6 +261,7 @@ class CheckApiResultsTest(unittest.TestCase):
         self.assertEqual(len(group_messages), 1)
         self.assertIn('Матч Испания – Германия завершился (2:1)', group_messages[0])
         # Личных сообщений мейнтейнеру при успешном авто-завершении не шлём.
+        main.broadcaster.join(timeout=5)
         self.assertEqual(main.bot.messages_to(MAINTAINER_ID), [])
 
     def test_second_tick_does_not_refinish(self):
@@ -231,12 +304,39 @@ class CheckApiResultsTest(unittest.TestCase):
         self.assertTrue(warning_lines[0].startswith('WARNING:'))
         self.assertIsNone(self.event.result)
 
+    def test_finished_match_without_score_is_polled_again(self):
+        # FINISHED без счёта — пробел в данных API, а не окончательный отказ: следующий опрос завершает матч.
+        with mock.patch.dict(os.environ, {'FOOTBALL_DATA_API_TOKEN': 'token'}):
+            with mock.patch.object(main.football_api, 'fetch_matches',
+                                   return_value=make_api_match_with_status(self.event, 'FINISHED')):
+                with self.assertLogs(level='WARNING') as logs:
+                    main.check_api_results()
+            self.assertTrue(any('no_full_time' in line for line in logs.output))
+            self.assertIsNone(self.event.result)
+            with mock.patch.object(main.football_api, 'fetch_matches',
+                                   return_value=make_finished_api_match(self.event)):
+                main.check_api_results()
+        self.assertIsNotNone(self.event.result)
+
+    def test_unfinished_event_alert_is_sent_once_per_hour(self):
+        # Завершение другого матча в hh:10 – hh:20 запускает задачу вдогонку — алерт не должен повториться.
+        check_time = (datetime.now(timezone.utc) - timedelta(hours=1)).replace(minute=12, second=0, microsecond=0)
+        self.event.time = check_time - timedelta(hours=3)
+        for minutes in (0, 5, 60):
+            with mock.patch.object(main.datetime_utils, 'get_utc_time',
+                                   return_value=check_time + timedelta(minutes=minutes)):
+                main.check_for_unfinished_events()
+        alerts = [text for chat_id, text in main.database.outbox if chat_id == MAINTAINER_ID]
+        self.assertEqual(len(alerts), 2)
+        self.assertIn('требует завершения', alerts[0])
+
     def test_unmapped_team_alerts_maintainer_once(self):
         self.event.team_1 = 'Нарния'
         with mock.patch.object(main.football_api, 'fetch_matches', return_value=[]):
             with mock.patch.dict(os.environ, {'FOOTBALL_DATA_API_TOKEN': 'token'}):
                 main.check_api_results()
                 main.check_api_results()
+        main.broadcaster.join(timeout=5)
         maintainer_messages = main.bot.messages_to(MAINTAINER_ID)
         self.assertEqual(len(maintainer_messages), 1)
         self.assertIn('Нарния', maintainer_messages[0])
@@ -266,6 +366,7 @@ class FinishEventAndAnnounceTest(unittest.TestCase):
         finished = main.finish_event_and_announce(event=self.event, result=EventResult(2, 1, None))
         self.assertTrue(finished)
         self.assertIsNotNone(main.database.get_event_by_uuid(self.event.uuid).result)
+        main.broadcaster.join(timeout=5)
         maintainer_messages = main.bot.messages_to(MAINTAINER_ID)
         self.assertTrue(any('не отправились в группу' in text for text in maintainer_messages))
 
@@ -349,6 +450,55 @@ class FinishEventAndAnnounceTest(unittest.TestCase):
         self.assertNotIn('Движение в таблице:', group_message)
 
 
+class EventSettlementTest(unittest.TestCase):
+    def setUp(self):
+        self.event = make_event(event_type=EventType.PLAY_OFF_SINGLE_MATCH)
+
+    def test_computes_scores_with_joker_and_go_through_in_memory(self):
+        exact_with_joker = make_user(101, 'Анна')
+        winner_only = make_user(102, 'Борис')
+        missed = make_user(103, 'Вера')
+        no_bet = make_user(104, 'Глеб')
+        go_through_bet = make_bet(102, self.event, 3, 0)
+        go_through_bet.team_1_will_go_through = True
+        bets = [
+            make_bet(101, self.event, 2, 1, is_joker=True),
+            go_through_bet,
+            make_bet(103, self.event, 0, 1),
+        ]
+
+        self.event.result = EventResult(2, 1, True)
+        guessers, scores_by_user = main.calculate_event_settlement(
+            event=self.event, users=[exact_with_joker, winner_only, missed, no_bet], bets=bets)
+
+        self.assertEqual(scores_by_user, {101: 8, 102: 2})
+        self.assertEqual(guessers.guessed_total_score, [exact_with_joker])
+        self.assertEqual(guessers.guessed_only_winner, [winner_only])
+        self.assertEqual(guessers.guessed_who_has_gone_through, [winner_only])
+        self.assertEqual(guessers.triggered_jokers, [exact_with_joker])
+
+    def test_after_snapshot_is_built_from_deltas(self):
+        leader = make_user(101, 'Анна', scores=5, bets=[make_bet(101, self.event, 0, 0)])
+        chaser = make_user(102, 'Борис', scores=3, bets=[make_bet(102, self.event, 2, 1)])
+        before = main.build_leaderboard_snapshot([leader, chaser])
+
+        after = main.apply_scores_to_snapshot(before, {102: 4})
+
+        chaser.scores += 4
+        self.assertEqual(after, main.build_leaderboard_snapshot([leader, chaser]))
+        self.assertEqual(after[102]['rank'], 1)
+
+    def test_finish_reads_users_once(self):
+        user = make_user(101, 'Анна', bets=[make_bet(101, self.event, 2, 1)])
+        main.database = FakeDatabase(events=[self.event], users=[user])
+        main.bot = FakeBot()
+
+        self.assertTrue(main.finish_event_and_announce(event=self.event, result=EventResult(2, 1, True)))
+
+        self.assertEqual(main.database.get_all_users_calls, 1)
+        self.assertEqual(user.scores, 4)
+
+
 class LeaderboardMovementFactsTest(unittest.TestCase):
     def make_snapshot(self, users):
         return main.build_leaderboard_snapshot(users)
@@ -435,6 +585,16 @@ class LeaderboardMovementFactsTest(unittest.TestCase):
 
         self.assertEqual(fact, 'Топ-5 теперь разделяют всего 2 очка.')
 
+    def test_place_text_uses_dense_rank(self):
+        main.database = FakeDatabase(users=[
+            make_user(101, 'Анна', scores=10),
+            make_user(102, 'Борис', scores=10),
+            make_user(103, 'Вера', scores=4),
+        ])
+
+        self.assertEqual(main.get_leaderboard_place_text(user_id=103), 'Место в таблице: 2-е')
+        self.assertIsNone(main.get_leaderboard_place_text(user_id=999))
+
 
 class ManualResultCommandTest(unittest.TestCase):
     # Инвариант рефакторинга: ручной /result ведёт себя как раньше —
@@ -507,6 +667,7 @@ class DetailedAnalyticsTest(unittest.TestCase):
             users=[user],
         )
 
+        self.assertEqual(main.rebuild_users_statistic(), 1)
         statistic = main.get_user_detailed_statistic(user_model=user)
         text = main.get_user_statistic_formatted_text(statistic=statistic)
 
@@ -515,6 +676,102 @@ class DetailedAnalyticsTest(unittest.TestCase):
         self.assertEqual(statistic.joker_bonus_scores, 7)
         self.assertIn('Джокеры: 2/3, бонус: +7 очков', text)
 
+    def test_settlement_increments_match_rebuild(self):
+        first_event = self.make_pending_event('first')
+        second_event = self.make_pending_event('second')
+        anna = make_user(101, 'Анна', bets=[
+            make_bet(101, first_event, 2, 1, is_joker=True),
+            make_bet(101, second_event, 1, 1),
+        ])
+        boris = make_user(102, 'Борис', bets=[make_bet(102, first_event, 3, 1)])
+        main.database = FakeDatabase(events=[first_event, second_event], users=[anna, boris])
+        main.bot = FakeBot()
+
+        main.finish_event_and_announce(event=first_event, result=EventResult(2, 1, None))
+        main.finish_event_and_announce(event=second_event, result=EventResult(0, 0, None))
+        incremental = {x.id: dict(x.statistic) for x in (anna, boris)}
+        main.rebuild_users_statistic()
+
+        self.assertEqual(incremental, {x.id: x.statistic for x in (anna, boris)})
+        self.assertEqual(anna.statistic['guessed_total_score_count'], 1)
+        self.assertEqual(anna.statistic['guessed_draw_count'], 1)
+        self.assertEqual(boris.statistic['guessed_only_winner_count'], 1)
+
+
+class ComingSoonRemindersTest(unittest.TestCase):
+    def setUp(self):
+        self.kickoff = datetime(2026, 4, 7, 19, 0, tzinfo=timezone.utc)
+        event = Event(uuid='soon-uuid', team_1='Реал', team_2='Бавария', time=self.kickoff.replace(tzinfo=None),
+                      event_type=EventType.PLAY_OFF_FIRST_MATCH)
+        anna = make_user(101, 'Анна', bets=[make_bet(101, event, 1, 0)])
+        boris = make_user(102, 'Борис')
+        main.database = FakeDatabase(events=[event], users=[anna, boris])
+        main.bot = FakeBot()
+
+    def run_at(self, before_kickoff: timedelta):
+        with mock.patch.object(main.datetime_utils, 'get_utc_time', return_value=self.kickoff - before_kickoff):
+            main.check_coming_soon_events()
+        return [text for chat_id, text in main.database.outbox if chat_id == TARGET_CHAT_ID]
+
+    def test_planner_wakes_at_thresholds(self):
+        events = main.database.get_all_events()
+        after = self.kickoff - timedelta(hours=3)
+        self.assertEqual(main.plan_coming_soon_events(events, after), self.kickoff - timedelta(hours=1, minutes=50))
+        after = self.kickoff - timedelta(hours=1, minutes=50)
+        self.assertEqual(main.plan_coming_soon_events(events, after), self.kickoff - timedelta(minutes=15))
+        self.assertIsNone(main.plan_coming_soon_events(events, self.kickoff - timedelta(minutes=15)))
+
+    def test_each_threshold_is_sent_once_to_users_without_bet(self):
+        self.assertEqual(self.run_at(timedelta(hours=3)), [])
+        messages = self.run_at(timedelta(hours=1, minutes=50))
+        self.assertEqual(len(messages), 1)
+        self.assertIn('начнётся в', messages[0])
+        self.assertIn('@борис', messages[0])
+        self.assertNotIn('@анна', messages[0])
+        self.assertEqual(len(self.run_at(timedelta(hours=1, minutes=49))), 1)  # прогон вдогонку не дублирует
+
+        messages = self.run_at(timedelta(minutes=15))
+        self.assertEqual(len(messages), 2)
+        self.assertIn('LAST CALL', messages[1])
+
+    def test_simultaneous_kickoffs_share_one_missing_bets_query(self):
+        second = Event(uuid='soon-uuid-2', team_1='Интер', team_2='Арсенал', time=self.kickoff.replace(tzinfo=None),
+                       event_type=EventType.PLAY_OFF_FIRST_MATCH)
+        main.database.events.append(second)
+        main.database.users[1].bets.append(make_bet(102, second, 0, 0))
+
+        messages = self.run_at(timedelta(hours=1, minutes=50))
+
+        self.assertEqual(main.database.missing_bets_calls, 1)
+        self.assertEqual(len(messages), 2)
+        self.assertIn('@борис', messages[0])
+        self.assertIn('@анна', messages[1])
+        self.assertNotIn('@борис', messages[1])
+
+    def test_night_reminder_is_queued_once_per_day(self):
+        night_event = Event(uuid='night-uuid', team_1='Интер', team_2='Арсенал', time=datetime(2026, 4, 7, 23, 0),
+                            event_type=EventType.GROUP_STAGE)
+        main.database.events = [night_event]
+        check_time = datetime(2026, 4, 7, 17, 45, tzinfo=timezone.utc)  # 20:45 по Москве
+        with mock.patch.object(main.datetime_utils, 'get_utc_time', return_value=check_time), \
+                mock.patch.object(main.datetime_utils, 'get_moscow_time',
+                                  return_value=check_time.astimezone(ZoneInfo('Europe/Moscow'))):
+            main.check_for_night_events()
+            main.check_for_night_events()  # прогон вдогонку после изменения календаря
+
+        messages = [text for chat_id, text in main.database.outbox if chat_id == TARGET_CHAT_ID]
+        self.assertEqual(len(messages), 1)
+        self.assertIn('ночные матчи', messages[0])
+        self.assertIn('@анна', messages[0])
+        self.assertEqual(main.bot.messages_to(TARGET_CHAT_ID), [])  # доставляет outbox, не сама задача
+
+    def test_after_downtime_only_most_urgent_threshold_is_sent(self):
+        messages = self.run_at(timedelta(minutes=10))
+        self.assertEqual(len(messages), 1)
+        self.assertIn('LAST CALL', messages[0])
+        self.assertEqual(self.run_at(timedelta(minutes=5)), messages)
+        self.assertEqual(self.run_at(-timedelta(minutes=1)), messages)  # после начала матча уже не напоминаем
+
 
 if __name__ == '__main__':
     unittest.main()
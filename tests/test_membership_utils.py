@@ -0,0 +1,71 @@
+import unittest
+from datetime import datetime, timezone
+
+from membership_utils import MembershipCache
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class MembershipCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1_000_000.0)
+        self.cache = MembershipCache(ttl_seconds=600, negative_ttl_seconds=60, clock=self.clock)
+        self.checks = []
+
+    def check(self, result: bool):
+        def checker(user_id):
+            self.checks.append(user_id)
+            return result
+        return checker
+
+    def test_positive_result_is_cached_for_ttl(self):
+        self.assertTrue(self.cache.get_or_check(1, self.check(True)))
+        self.clock.now += 599
+        self.assertTrue(self.cache.get_or_check(1, self.check(False)))
+        self.assertEqual(self.checks, [1])
+        self.clock.now += 2
+        self.assertFalse(self.cache.get_or_check(1, self.check(False)))
+        self.assertEqual(self.checks, [1, 1])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_negative_result_expires_sooner(self):
+        self.assertFalse(self.cache.get_or_check(1, self.check(False)))
+        self.clock.now += 61
+        self.assertTrue(self.cache.get_or_check(1, self.check(True)))
+        self.assertEqual(self.checks, [1, 1])
+
+    def test_chat_member_update_overrides_cached_value(self):
+        self.cache.get_or_check(1, self.check(True))
+        self.cache.put(user_id=1, is_member=False)
+        self.assertFalse(self.cache.get_or_check(1, self.check(True)))
+        self.cache.invalidate(1)
+        self.assertTrue(self.cache.get_or_check(1, self.check(True)))
+
+    def test_seed_from_recent_interactions_only(self):
+        self.cache.seed({
+            1: datetime.fromtimestamp(self.clock.now - 300, timezone.utc),
+            2: datetime.fromtimestamp(self.clock.now - 3600, timezone.utc),
+            3: None,
+        })
+        self.assertTrue(self.cache.get_or_check(1, self.check(False)))
+        self.assertFalse(self.cache.get_or_check(2, self.check(False)))
+        self.assertEqual(self.checks, [2])
+        self.clock.now += 301
+        self.cache.get_or_check(1, self.check(True))
+        self.assertEqual(self.checks, [2, 1])
+
+    def test_stats(self):
+        self.cache.get_or_check(1, self.check(True))
+        self.cache.get_or_check(2, self.check(False))
+        self.cache.get_or_check(1, self.check(True))
+        self.assertEqual(self.cache.get_stats(), {'hits': 1, 'misses': 2, 'members': 1, 'non_members': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
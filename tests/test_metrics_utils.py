@@ -0,0 +1,138 @@
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+
+import metrics_utils
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TaskMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.metrics = metrics_utils.TaskMetrics(clock=self.clock)
+        self.db_counter = metrics_utils.DbCommandCounter(self.metrics)
+
+    def make_task(self, seconds: float, db_queries: int = 0, telegram_calls: int = 0, error: bool = False):
+        def task():
+            for _ in range(db_queries):
+                self.db_counter.started(event=None)
+            for _ in range(telegram_calls):
+                self.metrics.record_telegram_call()
+            self.clock.now += seconds
+            if error:
+                raise RuntimeError('boom')
+        return task
+
+    def test_records_duration_and_counters_per_run(self):
+        self.metrics.run('drain_outbox', self.make_task(0.2, db_queries=3, telegram_calls=2))
+        self.metrics.run('drain_outbox', self.make_task(0.4, db_queries=1))
+
+        stats = self.metrics.get_stats()['drain_outbox']
+        self.assertEqual(stats.runs, 2)
+        self.assertEqual(stats.db_queries, 4)
+        self.assertEqual(stats.last_db_queries, 1)
+        self.assertEqual(stats.telegram_calls, 2)
+        self.assertAlmostEqual(stats.max_seconds, 0.4)
+        self.assertAlmostEqual(stats.get_percentile(0.5), 0.2)
+
+    def test_queries_outside_task_are_not_counted(self):
+        self.db_counter.started(event=None)
+        self.metrics.run('task', self.make_task(0.1))
+        self.assertEqual(self.metrics.get_stats()['task'].db_queries, 0)
+
+    def test_error_is_recorded_and_reraised(self):
+        with self.assertRaises(RuntimeError):
+            self.metrics.run('task', self.make_task(0.1, error=True))
+        self.assertEqual(self.metrics.get_stats()['task'].errors, 1)
+
+    def test_overrun_and_lag(self):
+        self.metrics.run('check_api_results', self.make_task(1), interval_seconds=30)
+        with self.assertLogs(level='WARNING'):
+            self.metrics.run('check_api_results', self.make_task(45), interval_seconds=30)
+        self.clock.now += 20  # следующий тик — через 30 с после конца долгого прогона
+        self.metrics.run('check_api_results', self.make_task(1), interval_seconds=30)
+
+        stats = self.metrics.get_stats()['check_api_results']
+        self.assertEqual(stats.overruns, 1)
+        self.assertAlmostEqual(stats.max_lag_seconds, 35)
+
+    def test_nested_run_counts_into_outer(self):
+        def outer():
+            self.db_counter.started(event=None)
+            self.metrics.run('inner', self.make_task(0.1, db_queries=2))
+
+        self.metrics.run('outer', outer)
+        stats = self.metrics.get_stats()
+        self.assertEqual(stats['outer'].db_queries, 3)
+        self.assertEqual(stats['inner'].db_queries, 2)
+
+    def test_percentiles_use_rolling_window(self):
+        for _ in range(metrics_utils.WINDOW_SIZE):
+            self.metrics.run('task', self.make_task(10))
+        for _ in range(metrics_utils.WINDOW_SIZE):
+            self.metrics.run('task', self.make_task(1))
+        stats = self.metrics.get_stats()['task']
+        self.assertEqual(stats.get_percentile(0.99), 1)
+        self.assertEqual(stats.max_seconds, 10)
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        clock = FakeClock()
+        self.metrics = metrics_utils.TaskMetrics(clock=clock)
+
+        def task():
+            clock.now += 0.25
+
+        self.metrics.run('drain_outbox', task, interval_seconds=10)
+
+    def test_prometheus_text(self):
+        text = metrics_utils.format_prometheus(self.metrics.get_stats())
+        self.assertIn('# TYPE totalizator_task_duration_seconds summary', text)
+        self.assertIn('totalizator_task_duration_seconds{task="drain_outbox",quantile="0.95"} 0.25', text)
+        self.assertIn('totalizator_task_duration_seconds_count{task="drain_outbox"} 1', text)
+        self.assertIn('totalizator_task_overruns_total{task="drain_outbox"} 0', text)
+        self.assertTrue(text.endswith('\n'))
+
+    def test_maintainer_text(self):
+        text = metrics_utils.format_task_stats(self.metrics.get_stats())
+        self.assertIn('drain_outbox: 1 прогонов, ошибок 0, p50 250 мс', text)
+        self.assertIn('интервал 10 с, переборов 0', text)
+        self.assertEqual(metrics_utils.format_task_stats({}), 'Плановые задачи ещё не запускались')
+
+    def test_local_endpoint(self):
+        server = metrics_utils.start_metrics_server(self.metrics, port=0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = f'http://127.0.0.1:{server.server_address[1]}'
+        with urllib.request.urlopen(f'{base}/metrics', timeout=5) as response:
+            self.assertTrue(response.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
+            self.assertIn(b'totalizator_task_errors_total{task="drain_outbox"} 0', response.read())
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(f'{base}/', timeout=5)
+
+
+class TelegramCounterTest(unittest.TestCase):
+    def test_counts_calls_and_delegates(self):
+        metrics = metrics_utils.TaskMetrics()
+        calls = []
+        with mock.patch.object(metrics_utils.apihelper, 'CUSTOM_REQUEST_SENDER',
+                               lambda method, url, **kwargs: calls.append((method, url)) or 'response'):
+            metrics_utils.count_telegram_calls(metrics)
+            sender = metrics_utils.apihelper.CUSTOM_REQUEST_SENDER
+            result = metrics.run('task', lambda: sender('post', 'https://api.telegram.org/botX/sendMessage'))
+        self.assertEqual(result, 'response')
+        self.assertEqual(calls, [('post', 'https://api.telegram.org/botX/sendMessage')])
+        self.assertEqual(metrics.get_stats()['task'].telegram_calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+from datetime import datetime, timedelta
+
+from telebot.apihelper import ApiTelegramException
+
+import broadcast_utils
+import outbox_utils
+
+
+class FakeOutboxDatabase:
+    # Повторяет контракт методов outbox в Database поверх словарей.
+    def __init__(self):
+        self.outbox = {}
+        self.reminders = {}
+
+    def enqueue_reminder(self, key, messages):
+        for chat_id, text in messages:
+            self.outbox.setdefault(f'{key}:{chat_id}', {
+                '_id': f'{key}:{chat_id}', 'key': key, 'chat_id': chat_id, 'text': text,
+                'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.now(),
+            })
+        if key in self.reminders:
+            return False
+        self.reminders[key] = 'queued' if len(messages) > 0 else 'sent'
+        return True
+
+    def lease_due_outbox_messages(self, limit, lease):
+        now = datetime.now()
+        due = [x for x in self.outbox.values() if x['status'] == 'pending' and x['next_attempt_at'] <= now][:limit]
+        result = [dict(x) for x in due]
+        for message in due:
+            message['next_attempt_at'] = now + lease
+        return result
+
+    def mark_outbox_delivered(self, message_ids):
+        for message_id in message_ids:
+            self.outbox[message_id]['status'] = 'sent'
+            self.outbox[message_id]['attempts'] += 1
+
+    def record_outbox_failure(self, message_id, error, next_attempt_at):
+        message = self.outbox[message_id]
+        message['attempts'] += 1
+        message['last_error'] = error
+        if next_attempt_at is None:
+            message['status'] = 'failed'
+        else:
+            message['next_attempt_at'] = next_attempt_at
+
+    def complete_reminders(self, keys):
+        completed = []
+        for key in keys:
+            if any(x['key'] == key and x['status'] == 'pending' for x in self.outbox.values()):
+                continue
+            if self.reminders.get(key) == 'queued':
+                self.reminders[key] = 'sent'
+                completed.append(key)
+        return completed
+
+
+class DrainOutboxTest(unittest.TestCase):
+    def setUp(self):
+        self.database = FakeOutboxDatabase()
+        self.sent = []
+        self.errors = {}  # chat_id -> исключение на каждую попытку
+        self.broadcaster = broadcast_utils.Broadcaster(send=self.send, sleep=lambda seconds: None)
+
+    def send(self, chat_id, text):
+        if chat_id in self.errors:
+            raise self.errors[chat_id]
+        self.sent.append((chat_id, text))
+
+    def drain(self) -> int:
+        count = outbox_utils.drain_outbox(database=self.database, broadcaster=self.broadcaster)
+        self.assertTrue(self.broadcaster.join(timeout=5))
+        return count
+
+    def test_reminder_is_complete_only_after_delivery(self):
+        self.database.enqueue_reminder('playoff_joker:24', [(1, 'a'), (-100, 'group')])
+        self.assertEqual(self.database.reminders['playoff_joker:24'], 'queued')
+
+        self.assertEqual(self.drain(), 2)
+
+        self.assertEqual(sorted(self.sent), [(-100, 'group'), (1, 'a')])
+        self.assertEqual(self.database.reminders['playoff_joker:24'], 'sent')
+        self.assertEqual(self.drain(), 0)  # доставленное повторно не уходит
+
+    def test_enqueue_is_idempotent_per_recipient(self):
+        self.assertTrue(self.database.enqueue_reminder('key', [(1, 'a')]))
+        self.assertFalse(self.database.enqueue_reminder('key', [(1, 'a')]))
+        self.drain()
+        self.assertEqual(self.sent, [(1, 'a')])
+
+    def test_transient_error_is_retried_with_backoff(self):
+        self.errors[1] = ConnectionError('telegram is slow')
+        self.database.enqueue_reminder('key', [(1, 'a')])
+
+        with self.assertLogs(level='WARNING'):
+            self.drain()
+
+        message = self.database.outbox['key:1']
+        self.assertEqual(message['status'], 'pending')
+        self.assertEqual(message['attempts'], 1)
+        self.assertGreater(message['next_attempt_at'], datetime.now() + timedelta(seconds=20))
+        self.assertEqual(self.database.reminders['key'], 'queued')
+
+        del self.errors[1]
+        message['next_attempt_at'] = datetime.now()
+        self.drain()
+        self.assertEqual(self.sent, [(1, 'a')])
+        self.assertEqual(self.database.reminders['key'], 'sent')
+
+    def test_blocked_recipient_is_not_retried(self):
+        self.errors[1] = ApiTelegramException('sendMessage', None, {
+            'ok': False, 'error_code': 403, 'description': 'Forbidden: bot was blocked by the user'})
+        self.database.enqueue_reminder('key', [(1, 'a'), (2, 'b')])
+
+        with self.assertLogs(level='WARNING'):
+            self.drain()
+
+        self.assertEqual(self.database.outbox['key:1']['status'], 'failed')
+        self.assertEqual(self.database.outbox['key:2']['status'], 'sent')
+        self.assertEqual(self.database.reminders['key'], 'sent')
+
+    def test_backoff_grows_and_is_capped(self):
+        self.assertEqual(outbox_utils.get_backoff(1), timedelta(seconds=30))
+        self.assertEqual(outbox_utils.get_backoff(3), timedelta(minutes=2))
+        self.assertEqual(outbox_utils.get_backoff(20), timedelta(hours=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import reminder_utils
+
+START = datetime(2026, 4, 7, 12, 0, tzinfo=timezone.utc)
+
+
+class FakeClock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+class ReminderSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(START)
+        self.events = [START + timedelta(hours=2)]  # «календарь» — просто моменты начала матчей
+        self.calendar_version = 0
+        self.loads = 0
+        self.runs = []
+        self.scheduler = reminder_utils.ReminderScheduler(
+            load_events=self.load_events,
+            get_calendar_version=lambda: self.calendar_version,
+            clock=self.clock,
+        )
+
+    def load_events(self):
+        self.loads += 1
+        return list(self.events)
+
+    def add_threshold_job(self, name, offsets):
+        self.scheduler.add(
+            name,
+            lambda events, after: min(filter(None, (
+                reminder_utils.get_next_threshold_instant(x, offsets, after) for x in events)), default=None),
+            lambda: self.runs.append((name, self.clock.now)),
+        )
+
+    def test_catch_up_then_sleeps_until_next_threshold(self):
+        self.add_threshold_job('soon', [timedelta(hours=1), timedelta(minutes=10)])
+
+        delay = self.scheduler.run_pending()
+
+        self.assertEqual(self.runs, [('soon', START)])  # прогон вдогонку при первом планировании
+        self.assertEqual(delay, timedelta(hours=1).total_seconds())
+        self.assertEqual(self.scheduler.get_schedule(), [(START + timedelta(hours=1), 'soon')])
+
+        self.clock.now = START + timedelta(minutes=59)
+        self.scheduler.run_pending()
+        self.assertEqual(len(self.runs), 1)
+
+        self.clock.now = START + timedelta(hours=1, seconds=1)
+        self.assertEqual(self.scheduler.run_pending(), timedelta(minutes=49, seconds=59).total_seconds())
+        self.clock.now = START + timedelta(hours=2)
+        self.assertIsNone(self.scheduler.run_pending())
+        self.assertEqual([x[1] for x in self.runs],
+                         [START, START + timedelta(hours=1, seconds=1), START + timedelta(hours=2)])
+        self.assertEqual(self.loads, 1)  # без изменений календаря события не перечитываются
+
+    def test_replans_when_calendar_changes(self):
+        self.add_threshold_job('soon', [timedelta(minutes=10)])
+        self.scheduler.run_pending()
+        self.events = [START + timedelta(minutes=30)]  # матч перенесли раньше
+        self.calendar_version += 1
+
+        self.clock.now = START + timedelta(minutes=1)
+        self.scheduler.run_pending()
+
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(len(self.runs), 2)  # снова вдогонку
+        self.assertEqual(self.scheduler.get_schedule(), [(START + timedelta(minutes=20), 'soon')])
+
+    def test_failing_task_does_not_stop_others(self):
+        def fail():
+            raise RuntimeError('boom')
+
+        self.scheduler.add('broken', lambda events, after: after + timedelta(minutes=5), fail)
+        self.add_threshold_job('soon', [timedelta(minutes=10)])
+
+        with self.assertLogs(level='ERROR'):
+            self.scheduler.run_pending()
+
+        self.assertEqual(self.runs, [('soon', START)])
+        self.assertEqual([name for _, name in self.scheduler.get_schedule()], ['broken', 'soon'])
+
+
+class InstantHelpersTest(unittest.TestCase):
+    def test_next_daily_instant_in_moscow(self):
+        # 20:40 МСК = 17:40 UTC
+        self.assertEqual(reminder_utils.get_next_daily_instant(START, hour=20, minute=40),
+                         datetime(2026, 4, 7, 17, 40, tzinfo=timezone.utc))
+        self.assertEqual(reminder_utils.get_next_daily_instant(datetime(2026, 4, 7, 17, 40, tzinfo=timezone.utc),
+                                                               hour=20, minute=40),
+                         datetime(2026, 4, 8, 17, 40, tzinfo=timezone.utc))
+
+    def test_next_hourly_instant(self):
+        self.assertEqual(reminder_utils.get_next_hourly_instant(START + timedelta(minutes=5), minute=10),
+                         START + timedelta(minutes=10))
+        self.assertEqual(reminder_utils.get_next_hourly_instant(START + timedelta(minutes=10), minute=10),
+                         START + timedelta(hours=1, minutes=10))
+
+    def test_next_threshold_instant(self):
+        offsets = [timedelta(hours=24), timedelta(hours=6), timedelta()]
+        self.assertEqual(reminder_utils.get_next_threshold_instant(START, offsets, START - timedelta(hours=7)),
+                         START - timedelta(hours=6))
+        self.assertIsNone(reminder_utils.get_next_threshold_instant(START, offsets, START))
+        self.assertIsNone(reminder_utils.get_next_threshold_instant(None, offsets, START))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import itertools
+import unittest
+
+import scoring_utils
+
+
+def classify_reference(result_1, result_2, bet_1, bet_2):
+    # Прежняя поштучная логика бота (calculate_if_user_guessed_result и is_one_goal_from_total_score_*).
+    def is_same_winner():
+        if result_1 > result_2:
+            return bet_1 > bet_2
+        if result_1 < result_2:
+            return bet_1 < bet_2
+        return bet_1 == bet_2
+
+    def is_one_goal_away():
+        if result_1 == bet_1:
+            return bet_2 in [result_2 - 1, result_2 + 1]
+        if result_2 == bet_2:
+            return bet_1 in [result_1 - 1, result_1 + 1]
+        return False
+
+    if result_1 == bet_1 and result_2 == bet_2:
+        category = scoring_utils.EXACT_SCORE
+    elif result_1 == result_2 and bet_1 == bet_2:
+        category = scoring_utils.DRAW
+    elif result_1 - result_2 == bet_1 - bet_2:
+        category = scoring_utils.GOAL_DIFFERENCE
+    elif is_same_winner():
+        category = scoring_utils.WINNER
+    else:
+        category = scoring_utils.MISS
+    near_miss_winner = is_same_winner() and is_one_goal_away()
+    near_miss_other = result_1 + result_2 >= 2 and is_one_goal_away()
+    return category, near_miss_winner, near_miss_other
+
+
+class ClassifyTest(unittest.TestCase):
+    def test_table_matches_reference_on_whole_grid(self):
+        scores = range(scoring_utils.MAX_TABLE_SCORE + 1)
+        for values in itertools.product(scores, repeat=4):
+            self.assertEqual(tuple(scoring_utils.classify(*values)), classify_reference(*values), values)
+
+    def test_scores_outside_grid(self):
+        for values in [(16, 0, 16, 0), (20, 1, 19, 1), (3, 17, 1, 16), (0, 0, 30, 30)]:
+            self.assertEqual(tuple(scoring_utils.classify(*values)), classify_reference(*values), values)
+
+    def test_classifications_are_shared(self):
+        self.assertIs(scoring_utils.classify(2, 1, 3, 2), scoring_utils.classify(1, 0, 2, 1))
+        self.assertIs(scoring_utils.classify(20, 1, 19, 0), scoring_utils.classify(2, 1, 1, 0))
+
+    def test_calculate_points(self):
+        self.assertEqual(scoring_utils.calculate_points(2, 1, 2, 1), 4)
+        self.assertEqual(scoring_utils.calculate_points(1, 1, 2, 2, True, True), 3)
+        self.assertEqual(scoring_utils.calculate_points(1, 1, 2, 2, None, True), 2)
+        self.assertEqual(scoring_utils.calculate_points(0, 2, 3, 0, False, False), 1)
+        self.assertEqual(scoring_utils.calculate_points(3, 1, 2, 0, category_points=(3, 2, 2, 1, 0)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()